@@ -0,0 +1,140 @@
+"""
+Benchmark del fan-out dell'aggregatore input AI.
+Avvia server HTTP locali che simulano NASA POWER e Open-Meteo con latenza
+iniettata e confronta get_inputs (chiamate in sequenza) con get_inputs_async
+(chiamate in parallelo con deadline complessiva).
+
+Uso:
+    python benchmarks/bench_aggregator_async.py --plants 20 --latency 0.3 --slow 1.5 --deadline 1.0
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+# Aggiungi la root del backend al path per importare i moduli
+sys.path.append(str(Path(__file__).parent.parent))
+
+
+NASA_BODY = {"properties": {"parameter": {
+    "T2M": {"d": 21.4}, "T2M_MIN": {"d": 14.2}, "T2M_MAX": {"d": 27.9},
+    "RH2M": {"d": 58.0}, "WS2M": {"d": 2.1},
+    "ALLSKY_SFC_SW_DWN": {"d": 19.5}, "PRECTOTCORR": {"d": 0.4},
+}}}
+
+
+def open_meteo_body(query: dict) -> dict:
+    """Risposta forecast con le sole variabili richieste (meteo e/o suolo)"""
+    hourly = query.get("hourly", [""])[0].split(",")
+    times = [f"2026-01-01T{h:02d}:00" for h in range(24)]
+    series = {
+        "temperature_2m": [22.0] * 24, "relativehumidity_2m": [55.0] * 24,
+        "precipitation": [0.1] * 24, "windspeed_10m": [7.0] * 24,
+        "soil_moisture_0_to_7cm": [0.27] * 24, "soil_moisture_7_to_28cm": [0.31] * 24,
+    }
+    body = {"hourly": {"time": times, **{k: v for k, v in series.items() if k in hourly}}}
+    if query.get("current_weather"):
+        body["current_weather"] = {"temperature": 22.0}
+    if query.get("daily"):
+        body["daily"] = {"temperature_2m_min": [13.0], "temperature_2m_max": [28.0], "precipitation_sum": [1.2]}
+    return body
+
+
+# Richieste ricevute dallo stub, per provider
+UPSTREAM_CALLS = {"nasa": 0, "openmeteo": 0}
+
+
+def make_handler(latency: float, slow: float):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            UPSTREAM_CALLS["nasa" if url.path.startswith("/api/temporal") else "openmeteo"] += 1
+            if url.path.startswith("/api/temporal"):
+                time.sleep(slow)  # NASA volutamente lenta
+                body = NASA_BODY
+            else:
+                time.sleep(latency)
+                body = open_meteo_body(parse_qs(url.query))
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            try:
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # client che ha annullato la richiesta alla deadline
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_stub(latency: float, slow: float) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(latency, slow))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def plants(n: int, offset: float) -> list:
+    """Coordinate in celle native distinte (NASA POWER 0.5x0.625°) per forzare chiamate reali"""
+    return [{"species": "tomato", "stage": "medio",
+             "geoLat": -40.0 + offset + i * 0.7, "geoLng": -100.0 + offset + i * 0.7}
+            for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregatore input AI: sequenziale vs fan-out async")
+    parser.add_argument("--plants", type=int, default=20, help="Numero di piante (default: 20)")
+    parser.add_argument("--latency", type=float, default=0.3, help="Latenza Open-Meteo in s (default: 0.3)")
+    parser.add_argument("--slow", type=float, default=1.5, help="Latenza NASA POWER in s (default: 1.5)")
+    parser.add_argument("--deadline", type=float, default=1.0, help="Deadline fan-out in s (default: 1.0)")
+    args = parser.parse_args()
+
+    server = start_stub(args.latency, args.slow)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    # Le URL dei provider sono lette all'import dei servizi
+    os.environ["NASA_POWER_BASE_URL"] = base
+    os.environ["OPEN_METEO_BASE_URL"] = base
+
+    import httpx
+    from utils.ai_inputs_aggregator import get_inputs, get_inputs_async
+
+    seq_plants = plants(args.plants, 0.0)
+    t0 = time.perf_counter()
+    for p in seq_plants:
+        get_inputs(p)
+    t_seq = (time.perf_counter() - t0) / args.plants
+
+    async def run_async(batch, deadline):
+        async with httpx.AsyncClient() as client:
+            t0 = time.perf_counter()
+            out = [await get_inputs_async(p, client=client, deadline=deadline) for p in batch]
+            return (time.perf_counter() - t0) / len(batch), out
+
+    t_full, _ = asyncio.run(run_async(plants(args.plants, 15.0), args.slow + 1.0))
+    t_dead, out = asyncio.run(run_async(plants(args.plants, 30.0), args.deadline))
+    partial = sum(1 for v in out if v.get("partial"))
+
+    server.shutdown()
+
+    print(f"Piante: {args.plants} | latenza OM: {args.latency}s | latenza NASA: {args.slow}s")
+    print(f"Sequenziale (get_inputs):                 {t_seq * 1000:8.0f} ms/pianta")
+    print(f"Fan-out async (senza deadline effettiva): {t_full * 1000:8.0f} ms/pianta")
+    print(f"Fan-out async (deadline {args.deadline}s):          {t_dead * 1000:8.0f} ms/pianta "
+          f"-> {partial}/{args.plants} parziali")
+    print(f"Richieste upstream: NASA {UPSTREAM_CALLS['nasa']} | Open-Meteo {UPSTREAM_CALLS['openmeteo']} "
+          f"(su {3 * args.plants} celle)")
+
+
+if __name__ == "__main__":
+    main()
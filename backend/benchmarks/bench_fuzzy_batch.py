@@ -0,0 +1,121 @@
+"""
+Benchmark del motore fuzzy batch (ai_irrigation_service.compute_batch).
+Confronta un ciclo su compute() con compute_batch(detail=False) e verifica che i
+risultati coincidano (azione, confidenza, motivazione, segnali). Con detail=True
+compute_batch usa lo stesso ciclo su compute(): costruire i dettagli per pianta
+costa quanto la valutazione scalare e la versione vettoriale era più lenta (x0.9).
+
+Uso:
+    python benchmarks/bench_fuzzy_batch.py --plants 20000
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Aggiungi la root del backend al path per importare i moduli
+sys.path.append(str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from utils.ai_irrigation_service import compute, compute_batch, fuzzify_inputs, evaluate_rules, \
+    aggregate_scores, choose_action, fuzzy_batch
+
+# Valori sui breakpoint delle membership, per coprire i casi limite
+EDGES = {
+    "soil": [0, 15, 30, 35, 45, 55, 70, 75, 80, 100],
+    "rain": [0, 1.5, 2.0, 2.5, 3.5, 4.0, 5.0, 6.0, 10.0, 20.0],
+    "temp": [-5, 0, 10, 15, 22, 26, 28, 30, 36, 42],
+    "et0": [0.0, 1.5, 2.0, 3.0, 4.0, 4.5, 5.0, 7.0, 9.0],
+}
+STAGES = ["semina", "crescita", "fioritura", "raccolta", None]
+
+
+def pick(rnd: random.Random, key: str, lo: float, hi: float):
+    """Valore realistico, a volte su un breakpoint, intero o mancante"""
+    r = rnd.random()
+    if r < 0.08:
+        return None
+    if r < 0.20:
+        return rnd.choice(EDGES[key])
+    if r < 0.25:
+        return int(rnd.uniform(lo, hi))
+    return rnd.uniform(lo, hi)
+
+
+def generate(n: int, now: datetime, seed: int = 7):
+    rnd = random.Random(seed)
+    plants, weathers = [], []
+    for _ in range(n):
+        plant = {"stage": rnd.choice(STAGES)}
+        if rnd.random() < 0.6:
+            plant["wateringIntervalDays"] = rnd.randint(1, 7)
+        if rnd.random() < 0.85:
+            plant["lastWateredAt"] = now - timedelta(days=rnd.randint(0, 12), hours=rnd.randint(0, 23))
+        weather = None
+        if rnd.random() < 0.97:
+            weather = {
+                "soilMoisture0to7cm" if rnd.random() < 0.7 else "soilMoistureApprox": pick(rnd, "soil", 0, 100),
+                "rainNext24h": pick(rnd, "rain", 0, 15),
+                "temp": pick(rnd, "temp", -2, 40),
+                "humidity": rnd.uniform(20, 95),
+                "et0": pick(rnd, "et0", 0, 8),
+            }
+            if rnd.random() < 0.01:
+                weather["temp"] = float("nan")  # fuori dal percorso vettoriale
+        plants.append(plant)
+        weathers.append(weather)
+    return plants, weathers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fuzzy scalare vs batch")
+    parser.add_argument("--plants", type=int, default=20000, help="Numero di piante (default: 20000)")
+    args = parser.parse_args()
+
+    now = datetime(2026, 6, 1, 7, 0)
+    plants, weathers = generate(args.plants, now)
+
+    t0 = time.perf_counter()
+    scalar = [compute(plant=p, weather=w, now=now) for p, w in zip(plants, weathers)]
+    t_scalar = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    batch = compute_batch(plants, weathers, now, detail=False)
+    t_lean = time.perf_counter() - t0
+
+    # Solo inferenza (fuzzify → regole → azione) su colonne già pronte
+    rnd = np.random.default_rng(7)
+    cols = {name: col for name, col in zip(("soilMoisture", "rainNext24h", "ratio", "temp", "et0"), [rnd.uniform(0, 100, args.plants), rnd.uniform(0, 15, args.plants), rnd.uniform(0, 3, args.plants),
+            rnd.uniform(-2, 40, args.plants), rnd.uniform(0, 8, args.plants)])}
+    rows = [dict(zip(cols, r)) for r in zip(*(c.tolist() for c in cols.values()))]
+    t0 = time.perf_counter()
+    for sig in rows:
+        choose_action(aggregate_scores(evaluate_rules(fuzzify_inputs(sig))))
+    t_inf_scalar = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    fuzzy_batch(cols)
+    t_inf_batch = time.perf_counter() - t0
+
+    lean_scalar = [{k: v for k, v in r.items() if k != "tech"} for r in scalar]
+    mismatches = [i for i, (a, b) in enumerate(zip(lean_scalar, batch)) if a != b]
+
+    print(f"Piante: {args.plants}")
+    print(f"Scalare (ciclo su compute):        {t_scalar:.3f}s -> {args.plants / t_scalar:,.0f} piante/s")
+    print(f"Batch senza dettagli (detail=False): {t_lean:.3f}s -> {args.plants / t_lean:,.0f} piante/s")
+    print(f"Speedup: x{t_scalar / t_lean:.1f}")
+    print(f"Solo inferenza: scalare {t_inf_scalar:.3f}s | fuzzy_batch {t_inf_batch:.4f}s "
+          f"-> x{t_inf_scalar / t_inf_batch:.0f}")
+    print(f"Risultati diversi: {len(mismatches)}")
+    if mismatches:
+        i = mismatches[0]
+        print(f"Prime righe divergenti: {mismatches[:10]}")
+        print(f"scalare: {lean_scalar[i]}\nbatch:   {batch[i]}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
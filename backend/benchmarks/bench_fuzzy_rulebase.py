@@ -0,0 +1,164 @@
+"""
+Microbenchmark della base di regole compilata (utils/fuzzy_rulebase) contro
+l'implementazione precedente, con regole e membership scritte a mano.
+Verifica anche che le due diano lo stesso risultato (azione, confidenza,
+motivazione, membership e regole attivate).
+
+Uso:
+    python benchmarks/bench_fuzzy_rulebase.py --samples 50000
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+# Aggiungi la root del backend al path per importare i moduli
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.fuzzy_rulebase import tri, trap, clamp01
+from utils.ai_irrigation_service import RULEBASE
+
+
+# Implementazione precedente (riferimento)
+
+def legacy_fuzzify(signals):
+    soil = signals.get("soilMoisture")
+    rain = signals.get("rainNext24h")
+    ratio = signals.get("ratio")
+    temp = signals.get("temp")
+    et0 = signals.get("et0")
+    out = {
+        "soil": {"dry": trap(soil, 0, 15, 30, 45), "moist": tri(soil, 35, 55, 75), "wet": trap(soil, 70, 80, 100, 110)},
+        "rain": {"low": trap(rain, -1, 0, 1.5, 2.5), "medium": tri(rain, 2.0, 3.5, 5.0),
+                 "high": trap(rain, 4.0, 6.0, 10.0, 20.0)},
+        "ratio": {"early": trap(ratio, -0.1, 0.0, 0.6, 0.8), "due": tri(ratio, 0.8, 1.0, 1.2),
+                  "overdue": trap(ratio, 1.0, 1.3, 2.0, 3.0)},
+        "temp": {"low": trap(temp, -5, 0, 10, 15), "moderate": tri(temp, 15, 22, 28),
+                 "high": trap(temp, 26, 30, 36, 42)},
+    }
+    if isinstance(et0, (int, float)):
+        out["et0"] = {"low": trap(et0, -0.1, 0.0, 1.5, 2.0), "moderate": tri(et0, 1.5, 3.0, 4.5),
+                      "high": trap(et0, 4.0, 5.0, 7.0, 9.0)}
+    else:
+        out["et0"] = {}
+    for grp in out.values():
+        for k, v in list(grp.items()):
+            grp[k] = clamp01(v)
+    return out
+
+
+def legacy_rules(deg):
+    soil, rain, ratio, temp, et0 = (deg.get(k, {}) for k in ("soil", "rain", "ratio", "temp", "et0"))
+    rules = []
+
+    def add(rid, action, w, because):
+        if w > 0:
+            rules.append({"id": rid, "action": action, "weight": w, "because": because})
+
+    not_wet = 1.0 - soil.get("wet", 0)
+    add("R1", "skip", max(rain.get("high", 0), soil.get("wet", 0)), "Pioggia alta o suolo già bagnato")
+    add("R2", "irrigate_tomorrow", min(rain.get("medium", 0), soil.get("moist", 0)),
+        "Pioggia media e suolo umido → meglio rimandare")
+    add("R3", "irrigate_today", min(ratio.get("overdue", 0), rain.get("low", 0), not_wet),
+        "Intervallo superato, poca pioggia e suolo non bagnato")
+    add("R4", "irrigate_tomorrow", min(ratio.get("due", 0), rain.get("low", 0), not_wet),
+        "Intervallo in arrivo, poca pioggia e suolo non bagnato")
+    add("R5", "irrigate_today", min(temp.get("high", 0), soil.get("dry", 0)), "Fa caldo e il suolo è secco")
+    if et0:
+        add("R6", "irrigate_today", min(et0.get("high", 0), soil.get("dry", 0)),
+            "Evapotraspirazione elevata e suolo secco")
+    if not rules:
+        rules.append({"id": "R0", "action": "skip", "weight": 0.2, "because": "Nessuna condizione critica"})
+    rules.sort(key=lambda r: r["weight"], reverse=True)
+    return rules
+
+
+def legacy_decide(rules):
+    scores = {"irrigate_today": 0.0, "irrigate_tomorrow": 0.0, "skip": 0.0}
+    for r in rules:
+        scores[r["action"]] = max(scores[r["action"]], r["weight"])
+    pairs = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+    best_action, best_w = pairs[0]
+    confidence = float(round(best_w / (best_w + pairs[1][1] + 1e-9), 3))
+    reason = next((r["because"] for r in rules if r["action"] == best_action),
+                  "Regole neutre → nessun intervento urgente")
+    return best_action, confidence, reason, scores
+
+
+def legacy(signals):
+    deg = legacy_fuzzify(signals)
+    rules = legacy_rules(deg)
+    action, conf, reason, scores = legacy_decide(rules)
+    return action, conf, reason, deg, rules, scores
+
+
+def compiled(signals):
+    mu, present = RULEBASE.fuzzify(signals)
+    weights = RULEBASE.weights(mu)
+    scores, best, conf, reason = RULEBASE.decide(weights)
+    return best, conf, reason, mu, present, weights, scores
+
+
+def compiled_detail(out):
+    """Converte l'uscita compilata nelle strutture della versione precedente."""
+    best, conf, reason, mu, present, weights, scores = out
+    return (RULEBASE.actions[best], conf, RULEBASE.reason_text(reason, best), RULEBASE.memberships(mu, present),
+            RULEBASE.fired(weights), dict(zip(RULEBASE.actions, scores)))
+
+
+def generate(n: int, seed: int = 7):
+    rnd = random.Random(seed)
+
+    def val(lo, hi, edges):
+        r = rnd.random()
+        if r < 0.08:
+            return None
+        if r < 0.25:
+            return rnd.choice(edges)
+        return rnd.uniform(lo, hi)
+
+    return [{
+        "soilMoisture": val(0, 100, [0, 15, 30, 35, 45, 55, 70, 75, 80, 100]),
+        "rainNext24h": val(0, 15, [0, 1.5, 2.0, 2.5, 3.5, 4.0, 5.0, 6.0, 10.0]),
+        "ratio": val(0, 3, [0.0, 0.6, 0.8, 1.0, 1.2, 1.3, 2.0]),
+        "temp": val(-2, 40, [0, 10, 15, 22, 26, 28, 30, 36]),
+        "et0": val(0, 8, [0.0, 1.5, 2.0, 3.0, 4.5, 5.0, 7.0]),
+    } for _ in range(n)]
+
+
+def timed(fn, samples):
+    t0 = time.perf_counter()
+    out = [fn(s) for s in samples]
+    return time.perf_counter() - t0, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regole fuzzy: compilate vs scritte a mano")
+    parser.add_argument("--samples", type=int, default=50000, help="Numero di input (default: 50000)")
+    args = parser.parse_args()
+
+    samples = generate(args.samples)
+    t_legacy, ref = timed(legacy, samples)
+    t_compiled, out = timed(compiled, samples)
+    t_detail, _ = timed(lambda s: compiled_detail(compiled(s)), samples)
+
+    mismatches = [i for i, (a, b) in enumerate(zip(ref, out)) if a != compiled_detail(b)]
+
+    n = args.samples
+    print(f"Regole: {len(RULEBASE.rules)} | slot membership: {len(RULEBASE.fuzzify(samples[0])[0])} ({RULEBASE.source})")
+    print(f"Precedente (dict + stringhe):     {t_legacy:.3f}s -> {n / t_legacy:,.0f} valutazioni/s")
+    print(f"Compilata (solo decisione):       {t_compiled:.3f}s -> {n / t_compiled:,.0f} valutazioni/s "
+          f"(x{t_legacy / t_compiled:.1f})")
+    print(f"Compilata + dettagli tecnici:     {t_detail:.3f}s -> {n / t_detail:,.0f} valutazioni/s "
+          f"(x{t_legacy / t_detail:.1f})")
+    print(f"Risultati diversi: {len(mismatches)}")
+    if mismatches:
+        i = mismatches[0]
+        print(f"input: {samples[i]}\nprecedente: {ref[i]}\ncompilata:  {compiled_detail(out[i])}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
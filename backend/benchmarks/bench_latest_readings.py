@@ -0,0 +1,133 @@
+"""
+Latenza di GET /api/sensors/latest su una collezione time-series popolata
+(default 2 milioni di letture, in un database separato):
+  - precedente:   distinct(sensor_type) + un find_one ordinato per tipo (N+1 query)
+  - aggregazione: una sola $sort/$group con $first (indice idx_location_type_ts)
+  - tabella:      tabella in memoria aggiornata all'ingestione (nessuna query)
+
+Uso:
+    python benchmarks/bench_latest_readings.py --readings 2000000 --repeat 50 [--reuse] [--drop]
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Aggiungi la root del backend al path per importare i moduli
+sys.path.append(str(Path(__file__).parent.parent))
+
+import controllers.sensor_controller as sensor_controller
+from database import client, async_client
+from utils.sensor_series import SENSOR_SERIES, series_doc, flatten_reading, meta_query, ensure_sensor_series
+
+TYPES = {"temperature": "°C", "humidity": "%", "soil_moisture": "%", "ph": "pH", "light": "lux"}
+LOCATIONS = [f"garden_zone_{i}" for i in range(1, 9)]
+
+
+def seed(database, n: int, batch_size: int = 10000):
+    """Letture a intervalli di un minuto per 5 sensori (uno per tipo) in ogni posizione."""
+    sensors = [(f"{t}_{loc}", t, loc) for loc in LOCATIONS for t in TYPES]
+    start = datetime.utcnow() - timedelta(minutes=n // len(sensors) + 1)
+    rnd = random.Random(3)
+    series = database[SENSOR_SERIES]
+    batch = []
+    for i in range(n):
+        sensor_id, sensor_type, location = sensors[i % len(sensors)]
+        batch.append(series_doc({
+            "sensor_id": sensor_id, "sensor_type": sensor_type, "location": location,
+            "value": round(rnd.uniform(0, 100), 2), "unit": TYPES[sensor_type],
+            "timestamp": start + timedelta(minutes=i // len(sensors)),
+        }))
+        if len(batch) >= batch_size:
+            series.insert_many(batch, ordered=False)
+            batch = []
+            if (i + 1) % (batch_size * 50) == 0:
+                print(f"  {i + 1} letture inserite")
+    if batch:
+        series.insert_many(batch, ordered=False)
+
+
+async def legacy_latest(location=None) -> dict:
+    """Implementazione precedente (riferimento)"""
+    coll = sensor_controller.sensor_readings
+    query = meta_query(location=location)
+    out = {}
+    for sensor_type in await coll.distinct("meta.sensor_type", query):
+        reading = await coll.find_one({**query, "meta.sensor_type": sensor_type}, sort=[("timestamp", -1)])
+        if reading:
+            out[sensor_type] = flatten_reading(reading)
+    return out
+
+
+async def aggregation_latest(location=None) -> dict:
+    return sensor_controller._latest_by_type(await sensor_controller._aggregate_latest(meta_query(location=location)))
+
+
+async def table_latest(location=None) -> dict:
+    return await sensor_controller.get_latest_readings(location)
+
+
+async def timed(fn, repeat: int, location=None):
+    latencies, out = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = await fn(location)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1], out
+
+
+def _ids(result: dict) -> dict:
+    return {t: r["_id"] for t, r in result.items()}
+
+
+async def run(repeat: int):
+    await sensor_controller.latest_table.refresh_if_stale()  # primo riallineamento, fuori dalla misura
+    rows = []
+    for location in (None, LOCATIONS[0]):
+        ref = None
+        for name, fn in (("precedente", legacy_latest), ("aggregazione", aggregation_latest),
+                         ("tabella", table_latest)):
+            p50, p95, out = await timed(fn, repeat, location)
+            ref = ref or _ids(out)
+            rows.append((location or "tutte", name, p50, p95, _ids(out) == ref))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ultime letture: N+1 query vs aggregazione vs tabella in memoria")
+    parser.add_argument("--readings", type=int, default=2000000, help="Letture da inserire (default: 2000000)")
+    parser.add_argument("--repeat", type=int, default=50, help="Ripetizioni per misura (default: 50)")
+    parser.add_argument("--db", default="homegardening_bench", help="Database di prova (default: homegardening_bench)")
+    parser.add_argument("--reuse", action="store_true", help="Non reinserire se la collezione è già popolata")
+    parser.add_argument("--drop", action="store_true", help="Elimina il database di prova alla fine")
+    args = parser.parse_args()
+
+    database = client[args.db]
+    if not (args.reuse and database[SENSOR_SERIES].estimated_document_count() >= args.readings):
+        database.drop_collection(SENSOR_SERIES)
+        ensure_sensor_series(database)
+        t0 = time.perf_counter()
+        seed(database, args.readings)
+        print(f"Inserite {args.readings} letture in {time.perf_counter() - t0:.1f}s")
+
+    sensor_controller.sensor_readings = async_client[args.db][SENSOR_SERIES]
+    try:
+        rows = asyncio.run(run(args.repeat))
+    finally:
+        if args.drop:
+            client.drop_database(args.db)
+
+    print(f"Letture: {args.readings} | ripetizioni: {args.repeat}")
+    print(f"{'posizione':<15}{'metodo':<15}{'p50 ms':>10}{'p95 ms':>10}  stesso risultato")
+    for location, name, p50, p95, same in rows:
+        print(f"{location:<15}{name:<15}{p50:>10.2f}{p95:>10.2f}  {'sì' if same else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark della modalità batch della pipeline.
+Confronta PipelineManager.process_batch con un ciclo su PipelineManager.process
+e verifica che i risultati coincidano (a meno dei timestamp).
+
+Uso:
+    python benchmarks/bench_pipeline_batch.py --rows 5000 --plant tomato
+"""
+
+import argparse
+import contextlib
+import io
+import random
+import sys
+import time
+from pathlib import Path
+
+# Aggiungi la root del backend al path per importare i moduli
+sys.path.append(str(Path(__file__).parent.parent))
+
+from pipeline.pipeline_manager import PipelineManager
+
+
+# Campi che dipendono dall'istante di esecuzione e non dai dati
+TIME_FIELDS = {"started_at", "completed_at", "timestamp", "generated_at", "next_window", "duration_ms"}
+SOILS = ["universale", "sabbioso", "argilloso", "torboso", "franco"]
+
+
+def generate_rows(n: int, seed: int = 42) -> list:
+    """Genera letture realistiche, con una quota di valori sporchi/mancanti"""
+    rnd = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        row = {
+            "soil_moisture": rnd.uniform(25, 85),
+            "temperature": rnd.uniform(8, 34),
+            "humidity": rnd.uniform(30, 90),
+            "light": rnd.uniform(0, 60000),
+            "rainfall": rnd.choice([0.0, 0.0, rnd.uniform(0, 20)]),
+            "soil": rnd.choice(SOILS),
+            "plant_type": rnd.choice(["tomato", "peach", "vite", "generic"]),
+            "water_added_24h": rnd.choice([0.0, rnd.uniform(0, 12)]),
+        }
+        dirty = rnd.random()
+        if dirty < 0.03:
+            row["humidity"] = "n/d"
+        elif dirty < 0.05:
+            row["temperature"] = float("nan")
+        elif dirty < 0.08:
+            row["soil_moisture"] = rnd.uniform(-10, 120)
+        elif dirty < 0.10:
+            del row["light"]
+        elif dirty < 0.11:
+            row["soil"] = None  # fuori dal percorso vettoriale
+        rows.append(row)
+    return rows
+
+
+def strip_times(obj):
+    """Rimuove ricorsivamente i campi temporali per il confronto"""
+    if isinstance(obj, dict):
+        return {k: strip_times(v) for k, v in obj.items() if k not in TIME_FIELDS}
+    if isinstance(obj, list):
+        return [strip_times(v) for v in obj]
+    return obj
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline scalare vs batch")
+    parser.add_argument("--rows", type=int, default=5000, help="Numero di righe (default: 5000)")
+    parser.add_argument("--plant", type=str, default="tomato", help="Tipo pianta (default: tomato)")
+    args = parser.parse_args()
+
+    rows = generate_rows(args.rows)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        pipeline = PipelineManager(plant_type=args.plant)
+
+        t0 = time.perf_counter()
+        scalar = [pipeline.process(row) for row in rows]
+        t_scalar = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        batch = pipeline.process_batch(rows)
+        t_batch = time.perf_counter() - t0
+
+    mismatches = [i for i, (a, b) in enumerate(zip(scalar, batch)) if strip_times(a) != strip_times(b)]
+
+    print(f"Righe: {len(rows)} | pianta: {args.plant}")
+    print(f"Scalare (ciclo su process): {t_scalar:.3f}s -> {len(rows) / t_scalar:,.0f} righe/s")
+    print(f"Batch (process_batch):      {t_batch:.3f}s -> {len(rows) / t_batch:,.0f} righe/s")
+    print(f"Speedup: x{t_scalar / t_batch:.1f}")
+    print(f"Risultati diversi: {len(mismatches)}")
+    if mismatches:
+        print(f"Prime righe divergenti: {mismatches[:10]}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
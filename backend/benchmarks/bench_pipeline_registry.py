@@ -0,0 +1,121 @@
+"""
+Load test di POST /api/pipeline/process con richieste concorrenti.
+Confronta la pipeline condivisa dal registry con la vecchia strategia
+"un PipelineManager nuovo per ogni richiesta".
+
+Uso:
+    python benchmarks/bench_pipeline_registry.py --requests 2000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# Aggiungi la root del backend al path per importare i moduli
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+from fastapi import FastAPI
+
+import controllers.pipelineController as pipeline_controller
+from pipeline.base import ProcessorBase
+from pipeline.pipeline_manager import PipelineManager
+from pipeline.registry import get_pipeline
+from routers import pipelineRouter
+
+
+PAYLOADS = [
+    {"sensor_data": {"soil_moisture": 45.0, "temperature": 24.5, "humidity": 62.0, "light": 15000.0, "rainfall": 0.0},
+     "plant_type": plant, "soil_type": soil}
+    for plant, soil in [("tomato", "argilloso"), ("grape", "sabbioso"), ("peach", None), ("generic", "torboso")]
+]
+
+
+def build_app() -> FastAPI:
+    """App minimale con il solo router della pipeline"""
+    app = FastAPI()
+    app.include_router(pipelineRouter.router)
+    return app
+
+
+async def run_load(app: FastAPI, n_requests: int, concurrency: int) -> list:
+    """Invia n_requests richieste con al massimo 'concurrency' in volo; ritorna le latenze (s)"""
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int, client: httpx.AsyncClient):
+        async with sem:
+            t0 = time.perf_counter()
+            r = await client.post("/api/pipeline/process", json=PAYLOADS[i % len(PAYLOADS)])
+            latencies.append(time.perf_counter() - t0)
+            r.raise_for_status()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        await asyncio.gather(*(one(i, client) for i in range(n_requests)))
+    return latencies
+
+
+def measure(mode: str, factory, n_requests: int, concurrency: int) -> dict:
+    pipeline_controller.get_pipeline = factory
+    app = build_app()
+
+    # Conta i processori costruiti durante il test
+    built = {"count": 0}
+    original_init = ProcessorBase.__init__
+
+    def counting_init(self, name):
+        built["count"] += 1
+        original_init(self, name)
+
+    ProcessorBase.__init__ = counting_init
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            latencies = asyncio.run(run_load(app, n_requests, concurrency))
+            elapsed = time.perf_counter() - t0
+
+            # Secondo passaggio (più lento) solo per misurare la memoria allocata
+            tracemalloc.start()
+            asyncio.run(run_load(app, min(n_requests, 500), concurrency))
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    finally:
+        ProcessorBase.__init__ = original_init
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "rps": n_requests / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "processors": built["count"],
+        "peak_kb": peak / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test pipeline: registry vs istanza per richiesta")
+    parser.add_argument("--requests", type=int, default=2000, help="Numero di richieste (default: 2000)")
+    parser.add_argument("--concurrency", type=int, default=50, help="Richieste in volo (default: 50)")
+    args = parser.parse_args()
+
+    results = [
+        measure("per-richiesta", lambda pt: PipelineManager(plant_type=pt), args.requests, args.concurrency),
+        measure("registry", get_pipeline, args.requests, args.concurrency),
+    ]
+
+    print(f"Richieste: {args.requests} | concorrenza: {args.concurrency}")
+    print(f"{'modalità':<15}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'processori':>12}{'picco KB':>12}")
+    for r in results:
+        print(f"{r['mode']:<15}{r['rps']:>10.0f}{r['p50']:>10.2f}{r['p95']:>10.2f}{r['processors']:>12}{r['peak_kb']:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Throughput di ingestione letture sensori (letture/s) su MongoDB reale (MONGO_URI):
+  - singola:   POST /api/sensors/data, una lettura per richiesta
+  - batch:     POST /api/sensors/data/batch, array JSON di --batch-size letture
+  - ndjson:    come batch, ma con corpo NDJSON
+  - buffer:    singola con buffer di scrittura lato server (SENSOR_WRITE_BUFFER)
+
+Le letture del benchmark usano sensor_id 'bench_*' e vengono eliminate alla fine
+(--keep per conservarle).
+
+Uso:
+    python benchmarks/bench_sensor_ingest.py --readings 20000 --batch-size 500 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Aggiungi la root del backend al path per importare i moduli
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+from fastapi import FastAPI
+
+import controllers.sensor_controller as sensor_controller
+from database import db
+from routers import sensorRouter
+from utils.sensor_series import SENSOR_SERIES, ensure_sensor_series
+
+
+def build_app() -> FastAPI:
+    """App minimale con il solo router dei sensori"""
+    app = FastAPI()
+    app.include_router(sensorRouter.router)
+    return app
+
+
+def generate(n: int) -> list:
+    start = datetime.utcnow() - timedelta(seconds=n)
+    return [{
+        "sensor_id": f"bench_{i % 20}",
+        "sensor_type": "soil_moisture" if i % 2 else "temperature",
+        "value": float(i % 100),
+        "unit": "%" if i % 2 else "°C",
+        "timestamp": (start + timedelta(seconds=i)).isoformat(),
+        "location": f"bench_zone_{i % 4}",
+    } for i in range(n)]
+
+
+async def post_all(app: FastAPI, requests: list, concurrency: int):
+    """Invia (path, kwargs) con al massimo 'concurrency' richieste in volo"""
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(client: httpx.AsyncClient, path: str, kwargs: dict):
+        async with sem:
+            r = await client.post(path, **kwargs)
+            r.raise_for_status()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=120) as client:
+        await asyncio.gather(*(one(client, path, kwargs) for path, kwargs in requests))
+        await sensor_controller.sensor_buffer.flush()
+
+
+async def measure(mode: str, readings: list, batch_size: int, concurrency: int, buffered: bool = False) -> dict:
+    if mode == "singola":
+        requests = [("/api/sensors/data", {"json": r}) for r in readings]
+    else:
+        chunks = [readings[i:i + batch_size] for i in range(0, len(readings), batch_size)]
+        if mode == "ndjson":
+            requests = [("/api/sensors/data/batch", {
+                "content": "\n".join(json.dumps(r) for r in chunk),
+                "headers": {"Content-Type": "application/x-ndjson"},
+            }) for chunk in chunks]
+        else:
+            requests = [("/api/sensors/data/batch", {"json": chunk}) for chunk in chunks]
+
+    sensor_controller.SENSOR_WRITE_BUFFER = buffered
+    before = db[SENSOR_SERIES].count_documents({"meta.sensor_id": {"$regex": "^bench_"}})
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        await post_all(build_app(), requests, concurrency)
+        elapsed = time.perf_counter() - t0
+    after = db[SENSOR_SERIES].count_documents({"meta.sensor_id": {"$regex": "^bench_"}})
+    return {
+        "mode": f"{mode}{' + buffer' if buffered else ''}",
+        "requests": len(requests),
+        "rate": len(readings) / elapsed,
+        "stored": after - before,
+    }
+
+
+async def run_all(readings: list, batch_size: int, concurrency: int) -> list:
+    # un solo event loop: il client asincrono resta legato al loop in cui si connette
+    return [
+        await measure("singola", readings, batch_size, concurrency),
+        await measure("singola", readings, batch_size, concurrency, buffered=True),
+        await measure("batch", readings, batch_size, concurrency),
+        await measure("ndjson", readings, batch_size, concurrency),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestione letture sensori: singola vs batch")
+    parser.add_argument("--readings", type=int, default=20000, help="Letture per modalità (default: 20000)")
+    parser.add_argument("--batch-size", type=int, default=500, help="Letture per richiesta batch (default: 500)")
+    parser.add_argument("--concurrency", type=int, default=50, help="Richieste in volo (default: 50)")
+    parser.add_argument("--keep", action="store_true", help="Non eliminare le letture del benchmark")
+    args = parser.parse_args()
+
+    ensure_sensor_series(db)
+    readings = generate(args.readings)
+    try:
+        results = asyncio.run(run_all(readings, args.batch_size, args.concurrency))
+    finally:
+        sensor_controller.SENSOR_WRITE_BUFFER = False
+        if not args.keep:
+            db[SENSOR_SERIES].delete_many({"meta.sensor_id": {"$regex": "^bench_"}})
+
+    base = results[0]["rate"]
+    print(f"Letture: {args.readings} | batch: {args.batch_size} | concorrenza: {args.concurrency}")
+    print(f"{'modalità':<20}{'richieste':>10}{'letture/s':>12}{'x':>7}{'salvate':>10}")
+    for r in results:
+        print(f"{r['mode']:<20}{r['requests']:>10}{r['rate']:>12,.0f}{r['rate'] / base:>7.1f}{r['stored']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Report di deduplicazione delle richieste meteo sulla collezione 'piante'.
+Per le piante georeferenziate confronta le chiavi distinte con la vecchia
+chiave arrotondata (ex AI_AGGR_GRID_PRECISION) e con le celle native di
+NASA POWER e Open-Meteo (utils/spatial_grid).
+
+Uso:
+    python benchmarks/grid_dedup_report.py [--legacy-precision 2] [--json]
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Aggiungi la root del backend al path per importare i moduli
+sys.path.append(str(Path(__file__).parent.parent))
+
+from database import db
+from utils.spatial_grid import dedup_report
+
+
+def load_points(collection) -> list:
+    """Coordinate delle piante con geoLat/geoLng numerici"""
+    cursor = collection.find(
+        {"geoLat": {"$type": "number"}, "geoLng": {"$type": "number"}},
+        {"_id": 0, "geoLat": 1, "geoLng": 1},
+    )
+    return [(d["geoLat"], d["geoLng"]) for d in cursor]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dedup ratio delle fetch meteo per cella nativa")
+    parser.add_argument("--legacy-precision", type=int, default=2,
+                        help="Decimali della vecchia chiave lat/lng (default: 2)")
+    parser.add_argument("--json", action="store_true", help="Stampa il report in JSON")
+    args = parser.parse_args()
+
+    points = load_points(db["piante"])
+    report = dedup_report(points, legacy_precision=args.legacy_precision)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Piante georeferenziate: {report['points']}")
+    print(f"{'chiave':<28}{'chiavi distinte':>18}{'piante/fetch':>15}")
+    rows = [
+        (f"legacy (round {args.legacy_precision})", report["legacy"]),
+        ("NASA POWER {}x{}°".format(*report["nasaPower"]["cellDeg"]), report["nasaPower"]),
+        ("Open-Meteo {}x{}°".format(*report["openMeteo"]["cellDeg"]), report["openMeteo"]),
+    ]
+    for label, r in rows:
+        ratio = f"{r['dedupRatio']:.2f}" if r["dedupRatio"] is not None else "-"
+        print(f"{label:<28}{r['distinctKeys']:>18}{ratio:>15}")
+
+
+if __name__ == "__main__":
+    main()
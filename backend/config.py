@@ -23,6 +23,12 @@ PORT = int(os.getenv("PORT", 8000))  # Porta di default 8000 se non impostata
 MONGO_URI = os.getenv("MONGO_URI")
 MONGO_DB = os.getenv("MONGO_DB", "homegardening")
 
+# Pool del client asincrono (ingestione sensori ad alta frequenza)
+MONGO_ASYNC_MAX_POOL = int(os.getenv("MONGO_ASYNC_MAX_POOL", 200))
+MONGO_ASYNC_MIN_POOL = int(os.getenv("MONGO_ASYNC_MIN_POOL", 10))
+MONGO_ASYNC_MAX_CONNECTING = int(os.getenv("MONGO_ASYNC_MAX_CONNECTING", 8))
+MONGO_ASYNC_WAIT_QUEUE_MS = int(os.getenv("MONGO_ASYNC_WAIT_QUEUE_MS", 5000))
+
 # AUTENTICAZIONE
 JWT_SECRET = os.getenv("JWT_SECRET")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
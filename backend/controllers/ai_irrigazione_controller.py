@@ -1,11 +1,30 @@
+import os
+import json
+import asyncio
 from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+from bson import ObjectId
+from bson.errors import InvalidId
 from fastapi import HTTPException
 
-from utils.ai_inputs_aggregator import get_inputs as aggregate_inputs
+from database import async_db
+from utils.ai_inputs_aggregator import get_inputs as aggregate_inputs, get_inputs_async as aggregate_inputs_async, \
+    cell_key
 from utils.ai_irrigation_service import compute as compute_irrigation
-from utils.weather_service import get_weather  
+from utils.weather_service import get_weather, get_weather_async
 from utils.ai_explainer_service import explain_irrigation  
 
+# Piante elaborate in parallelo da compute_batch_stream (fetch upstream + LLM)
+AI_BATCH_CONCURRENCY = int(os.getenv("AI_BATCH_CONCURRENCY", "8"))
+AI_BATCH_MAX_PLANTS = int(os.getenv("AI_BATCH_MAX_PLANTS", "200"))
+
+# client asincrono: compute_batch_stream gira nell'event loop e non deve bloccarlo
+plants_collection = async_db["piante"]
+
+_NO_LLM = {"text": None, "usedLLM": False, "model": None, "tokens": None}
+
 
 def compute_for_plant(plant: dict):
     """
@@ -36,6 +55,18 @@ def compute_for_plant(plant: dict):
         fallback = get_weather(plant["geoLat"], plant["geoLng"]) or {}
         wx = {**wx, **fallback}
 
+    # 3) Decisione fuzzy + 4) spiegazione LLM (non blocca: se fallisce → fallback interno)
+    decision = compute_irrigation(plant=plant, weather=wx, now=now) or {}
+    try:
+        llm = explain_irrigation(plant=plant, agg=agg, decision=decision, now=now) or {}
+    except Exception:
+        llm = dict(_NO_LLM)
+
+    return _build_result(plant, agg, wx, decision, llm, now)
+
+
+def _build_result(plant: dict, agg: dict, wx: dict, decision: dict, llm: dict, now: datetime) -> dict:
+    """Risposta per il frontend (stessa forma per la singola pianta e per il batch)."""
     # Chiavi base per la Card
     card_weather = {
         "temp": wx.get("temp"),
@@ -47,16 +78,6 @@ def compute_for_plant(plant: dict):
     
     meta_weather = {**wx, **card_weather}
 
-    # 3) Decisione fuzzy (usa wx normalizzato)
-    decision = compute_irrigation(plant=plant, weather=wx, now=now) or {}
-
-    # 4) Spiegazione LLM (non blocca: se fallisce → fallback interno)
-    try:
-        llm = explain_irrigation(plant=plant, agg=agg, decision=decision, now=now) or {}
-    except Exception:
-        llm = {"text": None, "usedLLM": False, "model": None, "tokens": None}
-
-    # 5) Risposta per il frontend
     result = {
         "recommendation": decision.get("recommendation"),
         "reason": decision.get("reason"),
@@ -138,4 +159,102 @@ def compute_batch(plants: list):
                 "id": pid,
                 "error": str(e)
             })
-    return results
\ No newline at end of file
+    return results
+
+async def compute_for_plant_async(plant: dict, client: Optional[httpx.AsyncClient] = None,
+                                  now: Optional[datetime] = None, explain: bool = True) -> dict:
+    """
+    Come compute_for_plant, non bloccante: input e fallback meteo sull'AsyncClient
+    condiviso, spiegazione LLM in un thread (saltata con explain=False).
+    """
+    now = now or datetime.utcnow()
+    agg = await aggregate_inputs_async(plant, now=now, client=client) or {}
+
+    wx = agg.get("weather") or {}
+    if not wx and plant.get("geoLat") is not None and plant.get("geoLng") is not None:
+        fallback = await get_weather_async(plant["geoLat"], plant["geoLng"], client=client) or {}
+        wx = {**wx, **fallback}
+
+    decision = compute_irrigation(plant=plant, weather=wx, now=now) or {}
+    llm = dict(_NO_LLM)
+    if explain:
+        try:
+            llm = await asyncio.to_thread(explain_irrigation, plant=plant, agg=agg, decision=decision, now=now) or {}
+        except Exception:
+            pass
+
+    return _build_result(plant, agg, wx, decision, llm, now)
+
+
+def _plant_cell(plant: dict) -> Optional[str]:
+    lat, lng = plant.get("geoLat"), plant.get("geoLng")
+    if isinstance(lat, (int, float)) and isinstance(lng, (int, float)):
+        return cell_key(lat, lng)
+    return None
+
+
+async def compute_batch_stream(plant_ids: List[str], user_id: str, explain: bool = True,
+                               concurrency: int = AI_BATCH_CONCURRENCY) -> AsyncIterator[str]:
+    """
+    Consiglio AI per più piante dell'utente, come righe NDJSON in ordine di completamento:
+      { id, ...risultato } | { id, error }
+    Le piante sono lette con una sola query $in (filtrata per userId); per ogni
+    cella meteo distinta gli input vengono richiesti una volta sola, poi le piante
+    della cella procedono in parallelo (al massimo 'concurrency' alla volta).
+    """
+    def _line(obj: dict) -> str:
+        return json.dumps(obj, ensure_ascii=False, default=str) + "\n"
+
+    ids, oids = [], []
+    for pid in dict.fromkeys(plant_ids or []):  # senza duplicati, ordine preservato
+        try:
+            oids.append(ObjectId(pid))
+            ids.append(pid)
+        except (InvalidId, TypeError):
+            yield _line({"id": pid, "error": "ID pianta non valido"})
+
+    cursor = plants_collection.find({"_id": {"$in": oids}, "userId": ObjectId(user_id)})
+    plants = {str(p["_id"]): p async for p in cursor}
+    for pid in ids:
+        if pid not in plants:
+            yield _line({"id": pid, "error": "Pianta non trovata"})
+    if not plants:
+        return
+
+    now = datetime.utcnow()
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async with httpx.AsyncClient() as client:
+        # una richiesta per cella: la prima pianta fa da rappresentante
+        warm: Dict[str, asyncio.Task] = {}
+
+        async def _warm(plant: dict):
+            async with sem:
+                try:
+                    await aggregate_inputs_async(plant, now=now, client=client)
+                except Exception as e:
+                    print(f"[WARN] batch warm {_plant_cell(plant)}: {e}")
+
+        for p in plants.values():
+            cell = _plant_cell(p)
+            if cell is not None and cell not in warm:
+                warm[cell] = asyncio.create_task(_warm(p))
+
+        async def _one(pid: str, plant: dict) -> dict:
+            cell = _plant_cell(plant)
+            if cell is not None:
+                await warm[cell]
+            async with sem:
+                try:
+                    return {"id": pid, **await compute_for_plant_async(plant, client=client, now=now, explain=explain)}
+                except Exception as e:
+                    return {"id": pid, "error": str(e)}
+
+        tasks = [asyncio.create_task(_one(pid, p)) for pid, p in plants.items()]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                yield _line(await fut)
+        finally:
+            # client disconnesso: annulla il lavoro rimasto
+            for t in [*tasks, *warm.values()]:
+                t.cancel()
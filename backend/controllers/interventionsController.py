@@ -1,19 +1,26 @@
-from datetime import datetime, timezone
-from typing import List, Optional, Union
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Union
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne, errors
 
 from database import db
 from models.interventionModel import (
-    InterventionCreate, InterventionUpdate, serialize_intervention
+    InterventionCreate, InterventionUpdate, InterventionBulkItem, serialize_intervention
 )
 
 interventions_collection = db["interventi"]
 plants_collection = db["piante"]
+ledger_collection = db["water_ledger"]  # litri di irrigazione per pianta e giorno (UTC)
 
 # Valori ammessi estendibili
 ALLOWED_TYPES = {"irrigazione", "concimazione", "potatura", "altro"}
 ALLOWED_STATUS = {"done", "planned", "skipped", "canceled"}
 
+# Elementi massimi per create_interventions_bulk
+INTERVENTIONS_BULK_MAX = int(os.getenv("INTERVENTIONS_BULK_MAX", "1000"))
+
 
 def _oid(val: str) -> ObjectId:
     return ObjectId(val)
@@ -46,6 +53,21 @@ def ensure_interventions_indexes():
             [("plantId", 1), ("status", 1), ("plannedAt", 1)],
             name="idx_plant_status_plannedAt"
         )
+        # bilancio idrico: irrigazioni di una pianta in una finestra temporale
+        interventions_collection.create_index(
+            [("plantId", 1), ("type", 1), ("executedAt", -1)],
+            name="idx_plant_type_executedAt"
+        )
+        ledger_collection.create_index(
+            [("plantId", 1), ("day", -1)],
+            unique=True,
+            name="uniq_plant_day"
+        )
+        # ultimo intervento per pianta (impronta del consiglio materializzato)
+        interventions_collection.create_index(
+            [("plantId", 1), ("_id", -1)],
+            name="idx_plant_id"
+        )
         interventions_collection.create_index(
             [("userId", 1), ("type", 1), ("createdAt", -1)],
             name="idx_user_type_created"
@@ -54,47 +76,271 @@ def ensure_interventions_indexes():
         print("[WARN] interventions indexes:", e)
 
 
+def water_added_since(plant_id: ObjectId, since: datetime) -> float:
+    """
+    Litri versati (interventi 'irrigazione' con executedAt >= since) per una pianta.
+    $match + $group lato Mongo, coperto da idx_plant_type_executedAt
+    ($sum ignora liters nulli o non numerici).
+    """
+    res = list(interventions_collection.aggregate([
+        {"$match": {"plantId": plant_id, "type": "irrigazione", "executedAt": {"$gte": since}}},
+        {"$group": {"_id": None, "liters": {"$sum": "$liters"}}},
+    ]))
+    return float(res[0]["liters"]) if res else 0.0
+
+
+def water_budgets(windows: Dict[ObjectId, int], now: Optional[datetime] = None) -> Dict[ObjectId, float]:
+    """
+    Variante batch di water_added_since: {plantId: giorni finestra} -> {plantId: litri}
+    in una sola aggregazione. Le piante con la stessa finestra condividono un ramo
+    dell'$or (ognuno usa l'indice); le piante senza irrigazioni valgono 0.0.
+    """
+    now = now or datetime.utcnow()
+    by_days: Dict[int, List[ObjectId]] = {}
+    for pid, days in windows.items():
+        by_days.setdefault(int(days), []).append(pid)
+    if not by_days:
+        return {}
+
+    branches = [
+        {"plantId": {"$in": pids}, "type": "irrigazione", "executedAt": {"$gte": now - timedelta(days=days)}}
+        for days, pids in by_days.items()
+    ]
+    out = {pid: 0.0 for pid in windows}
+    for row in interventions_collection.aggregate([
+        {"$match": {"$or": branches}},
+        {"$group": {"_id": "$plantId", "liters": {"$sum": "$liters"}}},
+    ]):
+        out[row["_id"]] = float(row["liters"])
+    return out
+
+
+# Registro giornaliero dei litri (water_ledger)
+#
+# Un documento per (pianta, giorno UTC) con litri e numero di irrigazioni,
+# aggiornato in modo incrementale da create/patch/delete_intervention: la somma
+# "litri negli ultimi N giorni" legge al più N+1 bucket, a prescindere dallo storico.
+# Il registro di una pianta vale solo con il flag waterLedgerReady: le piante nuove
+# nascono con il flag, quelle precedenti vengono ricostruite da migrate_water_ledger.py
+# e un $inc fallito lo rimuove. Senza flag la lettura usa water_added_since.
+
+def _day(dt: datetime) -> datetime:
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return datetime(dt.year, dt.month, dt.day)
+
+
+def _ledger_entry(doc: Optional[dict]):
+    """(plantId, giorno, litri) con cui l'intervento contribuisce al registro, o None."""
+    if not doc or doc.get("type") != "irrigazione":
+        return None
+    liters = doc.get("liters")
+    executed_at = _parse_dt(doc.get("executedAt"))
+    if not executed_at or not isinstance(liters, (int, float)) or isinstance(liters, bool):
+        return None
+    return doc["plantId"], _day(executed_at), float(liters)
+
+
+def _ledger_invalidate(plant_ids: List[ObjectId], error: Exception):
+    """Registro non più allineato: le piante tornano all'aggregazione fino alla ricostruzione."""
+    print("[WARN] water ledger:", error)
+    try:
+        plants_collection.update_many({"_id": {"$in": plant_ids}}, {"$unset": {"waterLedgerReady": ""}})
+    except Exception as e:
+        print("[WARN] water ledger invalidate:", e)
+
+
+def _ledger_apply(entry, sign: int):
+    if entry is None:
+        return
+    pid, day, liters = entry
+    try:
+        ledger_collection.update_one(
+            {"plantId": pid, "day": day},
+            {"$inc": {"liters": sign * liters, "count": sign}},
+            upsert=True,
+        )
+        if sign < 0:
+            ledger_collection.delete_one({"plantId": pid, "day": day, "count": {"$lte": 0}})
+    except Exception as e:
+        _ledger_invalidate([pid], e)
+
+
+def _ledger_update(old: Optional[dict], new: Optional[dict]):
+    """Sposta il contributo di un intervento da 'old' a 'new' (None = assente)."""
+    before, after = _ledger_entry(old), _ledger_entry(new)
+    if before == after:
+        return
+    _ledger_apply(before, -1)
+    _ledger_apply(after, +1)
+
+
+def _ledger_buckets(docs) -> Dict[tuple, List[float]]:
+    """{(plantId, giorno): [litri, irrigazioni]} per gli interventi che contribuiscono al registro."""
+    buckets: Dict[tuple, List[float]] = {}
+    for doc in docs:
+        entry = _ledger_entry(doc)
+        if entry:
+            b = buckets.setdefault(entry[:2], [0.0, 0])
+            b[0] += entry[2]
+            b[1] += 1
+    return buckets
+
+
+def _ledger_apply_many(docs: List[dict]):
+    """Contributo di molti interventi nuovi: un $inc per (pianta, giorno), un solo bulk_write."""
+    buckets = _ledger_buckets(docs)
+    if not buckets:
+        return
+    try:
+        ledger_collection.bulk_write([
+            UpdateOne({"plantId": pid, "day": day}, {"$inc": {"liters": liters, "count": count}}, upsert=True)
+            for (pid, day), (liters, count) in buckets.items()
+        ], ordered=False)
+    except Exception as e:
+        _ledger_invalidate(list({pid for pid, _ in buckets}), e)
+
+
+def rebuild_water_ledger(plant_id: ObjectId) -> int:
+    """
+    Ricostruisce il registro di una pianta dallo storico degli interventi con un
+    upsert $set per giorno (indice unico uniq_plant_day) e rimuove i giorni senza
+    irrigazioni; idempotente. Ritorna il numero di giorni scritti.
+    """
+    cursor = interventions_collection.find(
+        {"plantId": plant_id, "type": "irrigazione"},
+        {"plantId": 1, "type": 1, "executedAt": 1, "liters": 1},
+    )
+    buckets = _ledger_buckets(cursor)
+    if buckets:
+        ledger_collection.bulk_write([
+            UpdateOne({"plantId": pid, "day": day}, {"$set": {"liters": liters, "count": count}}, upsert=True)
+            for (pid, day), (liters, count) in buckets.items()
+        ], ordered=False)
+    ledger_collection.delete_many({"plantId": plant_id, "day": {"$nin": [day for _, day in buckets]}})
+    plants_collection.update_one({"_id": plant_id}, {"$set": {"waterLedgerReady": True}})
+    return len(buckets)
+
+
+def water_liters_last_days(plant: dict, days: int, now: Optional[datetime] = None) -> float:
+    """
+    Litri di irrigazione negli ultimi 'days' giorni dal registro giornaliero
+    (granularità: giorno UTC, a partire dal giorno di now - days). Senza
+    waterLedgerReady usa l'aggregazione sugli interventi (water_added_since, solo
+    executedAt salvati come data).
+    """
+    pid = plant["_id"]
+    since = (now or datetime.utcnow()) - timedelta(days=days)
+    if not plant.get("waterLedgerReady"):
+        return water_added_since(pid, since)
+    return float(sum(
+        b.get("liters", 0.0)
+        for b in ledger_collection.find({"plantId": pid, "day": {"$gte": _day(since)}}, {"liters": 1})
+    ))
+
+
+_DENORM_FIELDS = ("lastWateredAt", "lastFertilizedAt", "nextPlannedAt")
+
+
+def _naive_utc(dt: Optional[datetime]) -> Optional[datetime]:
+    if dt is not None and dt.tzinfo is not None:
+        return dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _denorm_values(plant_ids: List[ObjectId], uid: Optional[ObjectId] = None) -> Dict[ObjectId, dict]:
+    """
+    Campi derivati per più piante con una sola aggregazione:
+      - lastWateredAt / lastFertilizedAt: primo intervento 'done' ordinato per
+        executedAt, createdAt decrescenti (executedAt, fallback createdAt)
+      - nextPlannedAt: plannedAt minimo tra i 'planned' da adesso in poi
+    """
+    now = datetime.now(timezone.utc)
+    match = {
+        "plantId": {"$in": plant_ids},
+        "$or": [
+            {"status": "done", "type": {"$in": ["irrigazione", "concimazione"]}},
+            {"status": "planned", "plannedAt": {"$gte": now}},
+        ],
+    }
+    if uid is not None:
+        match["userId"] = uid
+
+    out = {pid: dict.fromkeys(_DENORM_FIELDS) for pid in plant_ids}
+    for row in interventions_collection.aggregate([
+        {"$match": match},
+        {"$addFields": {"kind": {"$cond": [{"$eq": ["$status", "planned"]}, "planned", "$type"]}}},
+        {"$sort": {"executedAt": -1, "createdAt": -1}},
+        {"$group": {
+            "_id": {"plantId": "$plantId", "kind": "$kind"},
+            "last": {"$first": {"$ifNull": ["$executedAt", "$createdAt"]}},
+            "next": {"$min": "$plannedAt"},
+        }},
+    ]):
+        pid, kind = row["_id"]["plantId"], row["_id"]["kind"]
+        if kind == "irrigazione":
+            out[pid]["lastWateredAt"] = row["last"]
+        elif kind == "concimazione":
+            out[pid]["lastFertilizedAt"] = row["last"]
+        else:
+            out[pid]["nextPlannedAt"] = row["next"]
+    return out
+
+
+def refresh_plant_denorm(plant_ids: List[ObjectId], uid: Optional[ObjectId] = None) -> int:
+    """
+    Ricalcola i campi derivati di più piante (es. dopo un import): una aggregazione
+    e un bulk_write. Ritorna il numero di piante aggiornate.
+    """
+    plant_ids = list(dict.fromkeys(plant_ids))
+    if not plant_ids:
+        return 0
+    updated_at = datetime.utcnow()
+    ops = [
+        UpdateOne(
+            {"_id": pid, **({"userId": uid} if uid is not None else {})},
+            {"$set": {**values, "updatedAt": updated_at}},
+        )
+        for pid, values in _denorm_values(plant_ids, uid).items()
+    ]
+    return plants_collection.bulk_write(ops, ordered=False).matched_count
+
+
 def _update_plant_denorm(user_id: str, plant_id: str):
     """
     Aggiorna alcuni campi derivati nella pianta:
       - lastWateredAt: ultimo intervento 'irrigazione' con status='done' (preferisce executedAt, fallback createdAt)
       - lastFertilizedAt: ultimo intervento 'concimazione' con status='done'
       - nextPlannedAt: intervento 'planned' più vicino nel futuro
+    Una sola aggregazione (vedi _denorm_values) al posto di tre find_one.
     """
-    uid = _oid(user_id)
-    pid = _oid(plant_id)
+    refresh_plant_denorm([_oid(plant_id)], _oid(user_id))
 
-    # Ultima irrigazione
-    last_irrig = interventions_collection.find_one(
-        {"userId": uid, "plantId": pid, "type": "irrigazione", "status": "done"},
-        sort=[("executedAt", -1), ("createdAt", -1)]
-    )
-    lastWateredAt = (last_irrig.get("executedAt") or last_irrig.get("createdAt")) if last_irrig else None
 
-    # Ultima concimazione
-    last_fert = interventions_collection.find_one(
-        {"userId": uid, "plantId": pid, "type": "concimazione", "status": "done"},
-        sort=[("executedAt", -1), ("createdAt", -1)]
-    )
-    lastFertilizedAt = (last_fert.get("executedAt") or last_fert.get("createdAt")) if last_fert else None
+def _apply_denorm_created(plant: dict, doc: dict):
+    """
+    Dopo un inserimento i campi derivati possono solo avanzare: $max sulle date
+    'done', nextPlannedAt solo se il nuovo 'planned' è più vicino. Nessuna lettura
+    aggiuntiva; se nextPlannedAt attuale è già passato si ricalcola tutto.
+    """
+    now = datetime.utcnow()
+    current_next = _naive_utc(plant.get("nextPlannedAt"))
+    if current_next is not None and current_next < now:
+        refresh_plant_denorm([plant["_id"]], plant["userId"])
+        return
 
-    # Prossimo pianificato (dall'ultima irrigazione in poi)
-    now = datetime.now(timezone.utc)
-    next_plan = interventions_collection.find_one(
-        {"userId": uid, "plantId": pid, "status": "planned", "plannedAt": {"$gte": now}},
-        sort=[("plannedAt", 1)]
-    )
-    nextPlannedAt = next_plan.get("plannedAt") if next_plan else None
-
-    plants_collection.update_one(
-        {"_id": pid, "userId": uid},
-        {"$set": {
-            "lastWateredAt": lastWateredAt,
-            "lastFertilizedAt": lastFertilizedAt,
-            "nextPlannedAt": nextPlannedAt,
-            "updatedAt": datetime.utcnow()
-        }}
-    )
+    update = {"$set": {"updatedAt": now}}
+    when = doc.get("executedAt") or doc.get("createdAt")
+    field = {"irrigazione": "lastWateredAt", "concimazione": "lastFertilizedAt"}.get(doc.get("type"))
+    if doc.get("status") == "done" and field and when:
+        update["$max"] = {field: when}
+
+    planned_at = _naive_utc(doc.get("plannedAt"))
+    if doc.get("status") == "planned" and planned_at and planned_at >= now:
+        if current_next is None or planned_at < current_next:
+            update["$set"]["nextPlannedAt"] = doc["plannedAt"]
+
+    plants_collection.update_one({"_id": plant["_id"], "userId": plant["userId"]}, update)
 
 
 def create_intervention(user_id: str, plant_id: str, data: InterventionCreate) -> Optional[dict]:
@@ -137,20 +383,123 @@ def create_intervention(user_id: str, plant_id: str, data: InterventionCreate) -
         "liters": data.liters,             
         "fertilizerType": data.fertilizerType,  
         "dose": data.dose,                 
-        "executedAt": now,
+        "executedAt": executed_at,
         "plannedAt": planned_at,
         "createdAt": now,
     }
 
     res = interventions_collection.insert_one(doc)
     doc["_id"] = res.inserted_id
+    _ledger_update(None, doc)
 
-    # aggiorna denormalizzati
-    _update_plant_denorm(user_id, plant_id)
+    # aggiorna denormalizzati (incrementale, dal documento inserito)
+    _apply_denorm_created(plant, doc)
 
     return serialize_intervention(doc)
 
 
+def _bulk_doc(uid: ObjectId, item: InterventionBulkItem, now: datetime):
+    """Documento da inserire per un elemento del batch, oppure (None, errore)."""
+    try:
+        pid = _oid(item.plantId)
+    except (InvalidId, TypeError):
+        return None, "plantId non valido"
+    if item.type not in ALLOWED_TYPES:
+        return None, f"Campo 'type' non valido. Ammessi: {sorted(ALLOWED_TYPES)}"
+    if item.status not in ALLOWED_STATUS:
+        return None, f"Campo 'status' non valido. Ammessi: {sorted(ALLOWED_STATUS)}"
+
+    executed_at = _parse_dt(item.executedAt)
+    planned_at = _parse_dt(item.plannedAt)
+    if (item.executedAt and not executed_at) or (item.plannedAt and not planned_at):
+        return None, "Data non valida (ISO 8601)"
+    if item.status == "done" and not executed_at:
+        executed_at = now
+
+    return {
+        "userId": uid,
+        "plantId": pid,
+        "type": item.type,
+        "status": item.status,
+        "notes": item.notes,
+        "liters": item.liters,
+        "fertilizerType": item.fertilizerType,
+        "dose": item.dose,
+        "executedAt": executed_at,
+        "plannedAt": planned_at,
+        "createdAt": now,
+    }, None
+
+
+def create_interventions_bulk(user_id: str, items: List[InterventionBulkItem], ordered: bool = False) -> dict:
+    """
+    Inserimento di molti interventi (es. eventi delle elettrovalvole):
+      - valida ogni elemento (type/status/date/plantId)
+      - verifica la proprietà di tutte le piante con una sola query $in
+      - inserisce con insert_many (ordered/unordered)
+      - aggiorna registro dei litri e campi denormalizzati una volta per pianta
+    Gli errori sono riportati per elemento ({index, error}) senza far fallire il batch.
+    Con ordered=True ci si ferma al primo elemento non valido o non inserito.
+    """
+    uid = _oid(user_id)
+    now = datetime.now(timezone.utc)
+
+    prepared, errors_out = [], []
+    for i, item in enumerate(items):
+        doc, err = _bulk_doc(uid, item, now)
+        if err:
+            errors_out.append({"index": i, "error": err})
+        else:
+            prepared.append((i, doc))
+
+    owned = set()
+    plant_ids = list({doc["plantId"] for _, doc in prepared})
+    if plant_ids:
+        owned = {p["_id"] for p in plants_collection.find({"_id": {"$in": plant_ids}, "userId": uid}, {"_id": 1})}
+
+    valid = []
+    for i, doc in prepared:
+        if doc["plantId"] in owned:
+            valid.append((i, doc))
+        else:
+            errors_out.append({"index": i, "error": "Pianta non trovata o non accessibile"})
+
+    if ordered and errors_out:
+        stop = min(e["index"] for e in errors_out)
+        errors_out += [{"index": i, "error": "Non eseguito: errore precedente nel batch"} for i, _ in valid if i > stop]
+        valid = [(i, doc) for i, doc in valid if i < stop]
+
+    inserted = []
+    if valid:
+        docs = [doc for _, doc in valid]
+        try:
+            res = interventions_collection.insert_many(docs, ordered=ordered)
+            for doc, oid in zip(docs, res.inserted_ids):
+                doc["_id"] = oid
+            inserted = valid
+        except errors.BulkWriteError as e:
+            failed = {w["index"]: w.get("errmsg", "Errore di scrittura") for w in e.details.get("writeErrors", [])}
+            first_failed = min(failed) if failed else len(valid)
+            for pos, (i, doc) in enumerate(valid):
+                if pos in failed:
+                    errors_out.append({"index": i, "error": failed[pos]})
+                elif ordered and pos > first_failed:
+                    errors_out.append({"index": i, "error": "Non eseguito: errore precedente nel batch"})
+                else:
+                    inserted.append((i, doc))
+
+    if inserted:
+        _ledger_apply_many([doc for _, doc in inserted])
+        refresh_plant_denorm([doc["plantId"] for _, doc in inserted], uid)
+
+    errors_out.sort(key=lambda e: e["index"])
+    return {
+        "inserted": len(inserted),
+        "items": [{"index": i, "id": str(doc["_id"])} for i, doc in inserted],
+        "errors": errors_out,
+    }
+
+
 def list_interventions(
     user_id: str,
     plant_id: str,
@@ -224,6 +573,7 @@ def patch_intervention(user_id: str, inter_id: str, data: InterventionUpdate) ->
 
     interventions_collection.update_one({"_id": iid, "userId": uid}, {"$set": patch})
     updated = interventions_collection.find_one({"_id": iid, "userId": uid})
+    _ledger_update(doc, updated)
 
     pid = str(updated["plantId"])
     _update_plant_denorm(user_id, pid)
@@ -241,6 +591,7 @@ def delete_intervention(user_id: str, inter_id: str) -> bool:
 
     res = interventions_collection.delete_one({"_id": iid, "userId": uid})
     if res.deleted_count == 1:
+        _ledger_update(doc, None)
         pid = str(doc["plantId"])
         _update_plant_denorm(user_id, pid)
         return True
@@ -4,10 +4,12 @@ Controller per la pipeline di processing.
 import logging
 from datetime import datetime
 from fastapi import HTTPException
-from pipeline.pipeline_manager import PipelineManager
+from pipeline.registry import get_pipeline
+from pipeline.metrics import stage_metrics
 from models.pipelineModel import (
     PipelineRequest, PipelineResponse, IrrigationSuggestion,
-    PipelineDetailsResponse, PipelineMetadataResponse, HealthCheckResponse
+    PipelineDetailsResponse, PipelineMetadataResponse, HealthCheckResponse,
+    PipelineMetricsResponse
 )
 
 logger = logging.getLogger(__name__)
@@ -42,8 +44,8 @@ class PipelineController:
                 # Iniettiamo anche il tipo pianta nei dati sensore per l'ActionGenerator
                 sensor_data["plant_type"] = request.plant_type
             
-            # 3. Esecuzione Pipeline
-            pipeline = PipelineManager(plant_type=request.plant_type)
+            # 3. Esecuzione Pipeline (istanza condivisa dal registry)
+            pipeline = get_pipeline(request.plant_type)
             result = pipeline.process(sensor_data)
             
             # 4. Formattazione Risposta
@@ -74,6 +76,7 @@ class PipelineController:
                 metadata=PipelineMetadataResponse(
                     started_at=result.get("metadata", {}).get("started_at"),
                     completed_at=result.get("metadata", {}).get("completed_at"),
+                    duration_ms=result.get("metadata", {}).get("duration_ms"),
                     errors=result.get("metadata", {}).get("errors", []),
                     warnings=result.get("metadata", {}).get("warnings", []),
                     stage_results=result.get("metadata", {}).get("stage_results", {})
@@ -92,6 +95,9 @@ class PipelineController:
                 )
             )
     
+    def get_metrics(self) -> PipelineMetricsResponse:
+        return PipelineMetricsResponse(**stage_metrics.snapshot())
+
     def get_health_check(self) -> HealthCheckResponse:
         return HealthCheckResponse(
             status="healthy",
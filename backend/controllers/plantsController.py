@@ -5,12 +5,13 @@ from bson import ObjectId
 from fastapi import HTTPException
 
 from config import settings
-from controllers.interventionsController import interventions_collection
+from controllers.interventionsController import water_liters_last_days
 from database import db
 from models.plantModel import PlantCreate, PlantUpdate, serialize_plant
 from utils.images import save_image_bytes
-from pipeline.pipeline_manager import PipelineManager
+from pipeline.registry import get_pipeline
 from controllers.weather_controller import weatherController
+from controllers import recommendation_store
 
 try:
     from utils.trefle_service import fetch_plant_by_id, derive_defaults_from_trefle_data
@@ -54,6 +55,7 @@ def create_plant(user_id: str, data: PlantCreate) -> dict:
         "geoLat": getattr(data, "geoLat", None), "geoLng": getattr(data, "geoLng", None),
         "placeId": getattr(data, "placeId", None), "addressLocality": getattr(data, "addressLocality", None),
         "createdAt": now, "updatedAt": now,
+        "waterLedgerReady": True,  # nessuno storico: il registro idrico è già completo
     }
     res = plants_collection.insert_one(base_doc)
     base_doc["_id"] = res.inserted_id
@@ -74,6 +76,8 @@ def update_plant(user_id: str, plant_id: str, data: PlantUpdate) -> Optional[dic
 
 def delete_plant(user_id: str, plant_id: str) -> bool:
     res = plants_collection.delete_one({"_id": _oid(plant_id), "userId": _oid(user_id)})
+    if res.deleted_count == 1:
+        recommendation_store.invalidate(_oid(plant_id))
     return res.deleted_count == 1
 
 def save_plant_image(user_id: str, plant_id: str, file_bytes: bytes) -> Optional[dict]:
@@ -90,13 +94,27 @@ def remove_plant_image(user_id: str, plant_id: str) -> Optional[dict]:
 
 # --- AI & METEO ---
 
-async def calculate_irrigation_for_plant(user_id: str, plant_id: str) -> Dict[str, Any]:
+async def calculate_irrigation_for_plant(user_id: str, plant_id: str, refresh: bool = False) -> Dict[str, Any]:
     try: obj_id = _oid(plant_id)
     except: raise HTTPException(status_code=400, detail="ID pianta non valido")
 
     plant = plants_collection.find_one({"_id": obj_id, "userId": _oid(user_id)})
     if not plant: raise HTTPException(status_code=404, detail="Pianta non trovata")
 
+    # Consiglio materializzato: riusato se gli input non sono cambiati
+    now = datetime.utcnow()
+    fp = recommendation_store.fingerprint(plant)
+    if not refresh:
+        stored = recommendation_store.get_fresh(obj_id, fp, now=now)
+        if stored:
+            return {**stored["result"], "freshness": {"computedAt": stored["computedAt"].isoformat() + "Z", "cached": True}}
+
+    result = await _compute_irrigation(plant)
+    recommendation_store.put(plant, fp, result, now=now)
+    return {**result, "freshness": {"computedAt": now.isoformat() + "Z", "cached": False}}
+
+
+async def _compute_irrigation(plant: dict) -> Dict[str, Any]:
     raw_species = plant.get("species", "generic") or "generic"
     soil_type = plant.get("soil", "universale") or "universale"
     location_name = plant.get("location") or plant.get("addressLocality")
@@ -106,34 +124,10 @@ async def calculate_irrigation_for_plant(user_id: str, plant_id: str) -> Dict[st
     interval_days = _safe_int(plant.get("wateringIntervalDays"), 3)
 
     
-    # Cerchiamo interventi fatti negli ultimi 'interval_days'
+    # Litri versati negli ultimi 'interval_days' (registro giornaliero, al più interval_days+1 bucket)
     water_added_in_cycle = 0.0
     try:
-        # Finestra temporale: Adesso - Giorni Intervallo
-        start_date = datetime.now(timezone.utc) - timedelta(days=interval_days)
-        
-        interventions = list(interventions_collection.find({
-            "plantId": obj_id, 
-            "type": "irrigazione"
-        }))
-        
-        for i in interventions:
-            exec_time = i.get("executedAt")
-            if not exec_time: continue
-            
-            # Parsing data sicuro
-            if isinstance(exec_time, str):
-                try: dt = datetime.fromisoformat(exec_time.replace("Z", "+00:00"))
-                except: continue
-            else: dt = exec_time
-            
-            if dt.tzinfo is None: dt = dt.replace(tzinfo=timezone.utc)
-            
-            
-            if dt >= start_date:
-                liters = float(i.get("liters", 0))
-                water_added_in_cycle += liters
-        
+        water_added_in_cycle = water_liters_last_days(plant, interval_days)
         print(f"Bilancio Idrico ({raw_species}): Intervallo {interval_days}gg. Versati {water_added_in_cycle:.1f}L nel periodo.")
 
     except Exception as e:
@@ -171,7 +165,7 @@ async def calculate_irrigation_for_plant(user_id: str, plant_id: str) -> Dict[st
     elif "uva" in pt or "grape" in pt: mapped = "grape"
     elif "peperone" in pt or "pepper" in pt: mapped = "pepper"
 
-    pipeline = PipelineManager(plant_type=mapped)
+    pipeline = get_pipeline(mapped)
     result = pipeline.process(sensor_data)
 
     details = result.get("details", {})
@@ -0,0 +1,86 @@
+"""
+Consiglio AI di irrigazione materializzato per pianta (collezione 'plant_recommendations').
+
+Ogni documento conserva l'ultima risposta calcolata, il momento del calcolo e
+l'impronta degli input da cui dipende:
+  - weatherKey:          cella Open-Meteo della pianta (o località, se senza coordinate)
+  - lastInterventionId:  ultimo intervento registrato per la pianta
+  - plantUpdatedAt:      updatedAt della pianta (aggiornato anche a ogni scrittura
+                         di interventi, vedi _update_plant_denorm)
+La risposta viene riusata finché l'impronta coincide e il calcolo ha meno di
+AI_RECO_TTL_SECONDS (default 3600: il meteo corrente cambia comunque).
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any
+
+from pymongo import errors
+
+from database import db
+from controllers.interventionsController import interventions_collection
+from utils.spatial_grid import OPEN_METEO_GRID
+
+
+RECO_TTL_SECONDS = int(os.getenv("AI_RECO_TTL_SECONDS", "3600"))
+
+store_collection = db["plant_recommendations"]
+
+
+def ensure_recommendation_store_indexes():
+    try:
+        store_collection.create_index([("plantId", 1)], unique=True, name="uniq_plant")
+        store_collection.create_index([("userId", 1), ("computedAt", -1)], name="idx_user_computed")
+    except errors.PyMongoError as e:
+        print(f"[WARN] plant_recommendations indexes: {e}")
+
+
+def weather_key(plant: Dict[str, Any]) -> Optional[str]:
+    lat, lng = plant.get("geoLat"), plant.get("geoLng")
+    if lat is not None and lng is not None:
+        return OPEN_METEO_GRID.key(float(lat), float(lng))
+    location = plant.get("location") or plant.get("addressLocality")
+    return f"city:{location.strip().lower()}" if location else None
+
+
+def fingerprint(plant: Dict[str, Any]) -> Dict[str, Any]:
+    """Impronta degli input del consiglio (una lettura indicizzata sugli interventi)."""
+    last = interventions_collection.find_one({"plantId": plant["_id"]}, {"_id": 1}, sort=[("_id", -1)])
+    return {
+        "weatherKey": weather_key(plant),
+        "lastInterventionId": last["_id"] if last else None,
+        "plantUpdatedAt": plant.get("updatedAt"),
+    }
+
+
+def get_fresh(plant_id, fp: Dict[str, Any], now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+    """Documento materializzato se l'impronta coincide e non è scaduto, altrimenti None."""
+    now = now or datetime.utcnow()
+    query = {"plantId": plant_id, "computedAt": {"$gte": now - timedelta(seconds=RECO_TTL_SECONDS)}}
+    query.update({f"fingerprint.{k}": v for k, v in fp.items()})
+    try:
+        return store_collection.find_one(query, {"_id": 0, "result": 1, "computedAt": 1})
+    except errors.PyMongoError as e:
+        print(f"[WARN] plant_recommendations read: {e}")
+        return None
+
+
+def put(plant: Dict[str, Any], fp: Dict[str, Any], result: Dict[str, Any], now: Optional[datetime] = None):
+    now = now or datetime.utcnow()
+    try:
+        store_collection.update_one(
+            {"plantId": plant["_id"]},
+            {"$set": {
+                "userId": plant.get("userId"),
+                "fingerprint": fp,
+                "computedAt": now,
+                "result": result,
+            }},
+            upsert=True,
+        )
+    except Exception as e:  # anche valori non serializzabili in BSON
+        print(f"[WARN] plant_recommendations write: {e}")
+
+
+def invalidate(plant_id):
+    store_collection.delete_one({"plantId": plant_id})
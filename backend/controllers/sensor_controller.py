@@ -1,15 +1,253 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
 from fastapi import HTTPException
-from database import db
-from models.sensorModel import SensorReading, SensorReadingResponse
-from datetime import datetime, timedelta
-from typing import List, Optional
+from bson import ObjectId
+from pydantic import TypeAdapter, ValidationError
+from pymongo import errors
+from database import async_db
+from models.sensorModel import SensorReading, SensorReadingResponse, SensorBatchResponse
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from utils.sensor_series import (
+    SENSOR_SERIES, ROLLUPS, SENSOR_ROLLUP_POINTS,
+    series_doc, flatten_reading, meta_query,
+    rollup_collection, rollup_ops, flatten_rollup, pick_resolution, bucket_start, keyset_filter,
+)
+
+logger = logging.getLogger(__name__)
+
+# Letture sensori: collezione time-series sul client asincrono (vedi utils/sensor_series)
+sensor_readings = async_db[SENSOR_SERIES]
+
+# Rollup 1m/1h/1d aggiornati a ogni scrittura
+sensor_rollups = {resolution: async_db[rollup_collection(resolution)] for resolution in ROLLUPS}
+
+# Letture massime per richiesta batch
+SENSOR_BATCH_MAX = int(os.getenv("SENSOR_BATCH_MAX", "5000"))
+
+# Buffer di scrittura lato server (disattivo di default): le letture vengono
+# accodate e scritte con un solo insert_many quando la coda raggiunge
+# SENSOR_BUFFER_SIZE letture o dopo SENSOR_BUFFER_FLUSH_MS dalla prima in coda.
+SENSOR_WRITE_BUFFER = os.getenv("SENSOR_WRITE_BUFFER", "0").lower() in ("1", "true", "yes")
+SENSOR_BUFFER_SIZE = int(os.getenv("SENSOR_BUFFER_SIZE", "1000"))
+SENSOR_BUFFER_FLUSH_MS = int(os.getenv("SENSOR_BUFFER_FLUSH_MS", "500"))
+
+# Tabella in memoria "ultima lettura per (posizione, tipo)": aggiornata a ogni
+# ingestione di questo processo e riallineata da MongoDB al più ogni
+# SENSOR_LATEST_RESYNC_SECONDS (letture scritte da altri worker o dal simulatore).
+SENSOR_LATEST_RESYNC_SECONDS = int(os.getenv("SENSOR_LATEST_RESYNC_SECONDS", "60"))
+
+# Documenti per batch del cursore (e per blocco scritto nella risposta) nell'export
+SENSOR_EXPORT_BATCH = int(os.getenv("SENSOR_EXPORT_BATCH", "2000"))
+
+# Finestra massima (ore) di un export con filtri non coperti da un indice
+# (meta, tempo): il server deve ordinare l'intera finestra prima della prima riga.
+SENSOR_EXPORT_UNINDEXED_MAX_HOURS = int(os.getenv("SENSOR_EXPORT_UNINDEXED_MAX_HOURS", "168"))
+
+_readings_adapter = TypeAdapter(List[SensorReading])
+
+
+async def update_rollups(docs: List[dict]):
+    """Aggiorna i rollup per documenti appena scritti (un bulk_write per risoluzione, in parallelo)."""
+    writes = []
+    for resolution, seconds in ROLLUPS.items():
+        ops = rollup_ops(docs, seconds)
+        if ops:
+            writes.append(sensor_rollups[resolution].bulk_write(ops, ordered=False))
+    try:
+        await asyncio.gather(*writes)
+    except errors.PyMongoError as e:
+        logger.warning(f"sensor rollups: {e}")
+
+
+class SensorWriteBuffer:
+    """
+    Coda in memoria delle letture, svuotata con insert_many non ordinato
+    (soglia di dimensione o di tempo). Gli _id sono assegnati all'accodamento,
+    quindi la risposta può già restituirli. La scrittura di un blocco gira in un
+    task protetto da asyncio.shield: l'annullamento della richiesta (o del timer)
+    che l'ha avviata non la interrompe. Le letture in coda vanno perse se il
+    processo termina senza passare da close() (vedi shutdown in main.py).
+    """
+
+    def __init__(self, max_size: int = SENSOR_BUFFER_SIZE, flush_ms: int = SENSOR_BUFFER_FLUSH_MS):
+        self.max_size = max(1, max_size)
+        self.flush_seconds = flush_ms / 1000
+        self._docs: List[dict] = []
+        self._timer: Optional[asyncio.Task] = None
+        self._writes: Set[asyncio.Task] = set()  # blocchi in scrittura
+        self.stats = {"written": 0, "failed": 0, "flushes": 0}
+
+    def __len__(self):
+        return len(self._docs)
+
+    async def add(self, docs: List[dict]):
+        self._docs.extend(docs)
+        if len(self._docs) >= self.max_size:
+            await self.flush()  # la richiesta che riempie la coda paga la scrittura
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_seconds)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self) -> int:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        docs, self._docs = self._docs, []
+        if not docs:
+            return 0
+        task = asyncio.create_task(self._write(docs))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+        return await asyncio.shield(task)
+
+    async def close(self):
+        """Scrive le letture in coda e attende i blocchi già in scrittura (shutdown)."""
+        await self.flush()
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    async def _write(self, docs: List[dict]) -> int:
+        self.stats["flushes"] += 1
+        written = len(docs)
+        try:
+            await sensor_readings.insert_many(docs, ordered=False)
+            await update_rollups(docs)
+        except errors.BulkWriteError as e:
+            written = e.details.get("nInserted", 0)
+            failed = {w["index"] for w in e.details.get("writeErrors", [])}
+            await update_rollups([d for i, d in enumerate(docs) if i not in failed])
+            logger.warning(f"sensor buffer: {len(docs) - written} letture non scritte")
+        except errors.PyMongoError as e:
+            written = 0
+            logger.warning(f"sensor buffer: {len(docs)} letture non scritte: {e}")
+        self.stats["written"] += written
+        self.stats["failed"] += len(docs) - written
+        return written
+
+
+sensor_buffer = SensorWriteBuffer()
+
+
+def _naive_utc(dt: datetime) -> datetime:
+    if dt.tzinfo is not None:
+        return dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+async def _aggregate_latest(query: Dict[str, Any]) -> List[dict]:
+    """
+    Ultima lettura per (posizione, tipo) con una sola aggregazione: $sort
+    compatibile con l'indice idx_location_type_ts e $group con $first.
+    """
+    cursor = await sensor_readings.aggregate([
+        {"$match": query},
+        {"$sort": {"meta.location": 1, "meta.sensor_type": 1, "timestamp": -1}},
+        {"$group": {
+            "_id": {"location": "$meta.location", "sensor_type": "$meta.sensor_type"},
+            "doc": {"$first": "$$ROOT"},
+        }},
+    ])
+    return [flatten_reading(row["doc"]) for row in await cursor.to_list(length=None)]
+
+
+def _latest_by_type(readings) -> Dict[str, dict]:
+    """Lettura più recente per tipo di sensore (tra tutte le posizioni)."""
+    out: Dict[str, dict] = {}
+    for r in readings:
+        cur = out.get(r["sensor_type"])
+        if cur is None or r["timestamp"] > cur["timestamp"]:
+            out[r["sensor_type"]] = r
+    return out
+
+
+def _log_resync_error(task: asyncio.Future):
+    """Recupera l'errore del riallineamento anche se tutti i chiamanti sono stati annullati."""
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"latest readings resync: {task.exception()!r}")
+
+
+class LatestReadingsTable:
+    """Ultima lettura per (location, sensor_type), in formato piatto delle API."""
+
+    def __init__(self, resync_seconds: int = SENSOR_LATEST_RESYNC_SECONDS):
+        self.resync_seconds = resync_seconds
+        self._rows: Dict[Tuple[str, str], dict] = {}
+        self._synced_at: Optional[float] = None
+        self._resync: Optional[asyncio.Future] = None
+
+    def _put(self, row: dict):
+        row["timestamp"] = _naive_utc(row["timestamp"])
+        key = (row.get("location"), row.get("sensor_type"))
+        cur = self._rows.get(key)
+        if cur is None or row["timestamp"] >= cur["timestamp"]:
+            self._rows[key] = row
+
+    def update(self, docs: List[dict]):
+        """Registra documenti time-series appena scritti (o accodati)."""
+        for doc in docs:
+            self._put(flatten_reading(doc))
+
+    def is_stale(self) -> bool:
+        return self._synced_at is None or time.monotonic() - self._synced_at > self.resync_seconds
+
+    async def refresh_if_stale(self):
+        """
+        Riallinea da MongoDB se necessario; richieste concorrenti condividono la stessa aggregazione.
+        shield: un client che si disconnette annulla solo la propria attesa, non il riallineamento comune.
+        """
+        if not self.is_stale():
+            return
+        if self._resync is None:
+            self._resync = asyncio.ensure_future(self._do_resync())
+            self._resync.add_done_callback(_log_resync_error)
+        await asyncio.shield(self._resync)
+
+    async def _do_resync(self):
+        try:
+            # unione, non sostituzione: le ingestioni arrivate durante la query restano
+            for row in await _aggregate_latest({}):
+                self._put(row)
+            self._synced_at = time.monotonic()
+        finally:
+            self._resync = None
+
+    def latest(self, location: Optional[str] = None) -> Dict[str, dict]:
+        return _latest_by_type(
+            dict(row) for (loc, _), row in self._rows.items() if not location or loc == location
+        )
+
+
+latest_table = LatestReadingsTable()
 
 
 async def save_sensor_data(reading: SensorReading) -> SensorReadingResponse:
     """Salva una lettura del sensore nel database MongoDB"""
     try:
-        reading_dict = reading.dict()
-        result = await db["sensor_readings"].insert_one(reading_dict)
+        doc = series_doc(reading.dict())
+        if SENSOR_WRITE_BUFFER:
+            doc["_id"] = ObjectId()
+            await sensor_buffer.add([doc])
+            latest_table.update([doc])
+            return SensorReadingResponse(
+                status="queued",
+                id=str(doc["_id"]),
+                message=f"Sensor reading from {reading.sensor_id} queued"
+            )
+
+        result = await sensor_readings.insert_one(doc)
+        latest_table.update([doc])
+        await update_rollups([doc])
 
         return SensorReadingResponse(
             status="success",
@@ -20,81 +258,327 @@ async def save_sensor_data(reading: SensorReading) -> SensorReadingResponse:
         raise HTTPException(status_code=500, detail=f"Error saving sensor data: {str(e)}")
 
 
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """Oggetti da uno stream NDJSON (una lettura per riga); riga non valida -> None."""
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _json_or_none(line)
+    if pending.strip():
+        yield _json_or_none(pending)
+
+
+def _json_or_none(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def validate_readings(items: List[Any]) -> Tuple[List[Tuple[int, SensorReading]], List[dict]]:
+    """
+    Valida tutte le letture con un solo passaggio Pydantic (List[SensorReading]).
+    Se qualcuna non è valida la scarta, riportando {index, error}, e rivalida le altre.
+    """
+    try:
+        return list(enumerate(_readings_adapter.validate_python(items))), []
+    except ValidationError as e:
+        bad = {}
+        for err in e.errors():
+            index, *field = err["loc"]
+            bad.setdefault(index, f"{'.'.join(map(str, field)) or 'reading'}: {err['msg']}")
+    good = [i for i in range(len(items)) if i not in bad]
+    readings = _readings_adapter.validate_python([items[i] for i in good])
+    return list(zip(good, readings)), [{"index": i, "error": msg} for i, msg in sorted(bad.items())]
+
+
+async def save_sensor_batch(items: List[Any]) -> SensorBatchResponse:
+    """
+    Salva molte letture: validazione in blocco, poi un insert_many non ordinato
+    (o accodamento nel buffer se SENSOR_WRITE_BUFFER è attivo).
+    Le letture non valide o non scritte sono riportate per indice.
+    """
+    valid, errors_out = validate_readings(items)
+    docs = [series_doc(r.dict()) for _, r in valid]
+    if not docs:
+        return SensorBatchResponse(status="error", received=len(items), saved=0, errors=errors_out)
+
+    if SENSOR_WRITE_BUFFER:
+        for doc in docs:
+            doc["_id"] = ObjectId()
+        await sensor_buffer.add(docs)
+        latest_table.update(docs)
+        return SensorBatchResponse(status="queued", received=len(items), saved=len(docs), errors=errors_out)
+
+    saved = len(docs)
+    try:
+        await sensor_readings.insert_many(docs, ordered=False)
+        latest_table.update(docs)
+        await update_rollups(docs)
+    except errors.BulkWriteError as e:
+        saved = e.details.get("nInserted", 0)
+        failed = {w["index"]: w.get("errmsg", "write error") for w in e.details.get("writeErrors", [])}
+        errors_out += [{"index": valid[i][0], "error": msg} for i, msg in failed.items()]
+        errors_out.sort(key=lambda x: x["index"])
+        written = [d for i, d in enumerate(docs) if i not in failed]
+        latest_table.update(written)
+        await update_rollups(written)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error saving sensor batch: {str(e)}")
+
+    return SensorBatchResponse(
+        status="success" if not errors_out else "partial",
+        received=len(items),
+        saved=saved,
+        errors=errors_out,
+    )
+
+
+async def _keyset_page(collection, query: dict, time_field: str, limit: int) -> List[dict]:
+    """
+    Prima pagina di 'limit' documenti nell'ordine (time_field, _id) decrescente.
+    Il server ordina solo per tempo (indice meta+tempo, niente sort bloccante su
+    _id): tra i documenti con l'istante dell'ultimo restituito ne sceglie alcuni
+    a caso, quindi quel gruppo viene riletto per intero (uguaglianza sul tempo)
+    e la pagina è riordinata per _id, lo spareggio di keyset_filter.
+    """
+    docs = await collection.find(query).sort(time_field, -1).limit(limit).to_list(length=limit)
+    if limit and len(docs) == limit:
+        boundary = docs[-1][time_field]
+        ties = await collection.find({**query, time_field: boundary}).to_list(length=None)
+        docs = [d for d in docs if d[time_field] != boundary] + ties
+    docs.sort(key=lambda d: (d[time_field], d["_id"]), reverse=True)
+    return docs[:limit]
+
+
 async def get_sensor_history(
         sensor_id: Optional[str] = None,
         sensor_type: Optional[str] = None,
         location: Optional[str] = None,
         hours: int = 24,
-        limit: int = 1000
+        limit: int = 1000,
+        resolution: str = "raw",
+        points: int = SENSOR_ROLLUP_POINTS,
+        after: Optional[Tuple[datetime, ObjectId]] = None
 ) -> List[dict]:
-    """Recupera lo storico delle letture con filtri opzionali"""
+    """
+    Recupera lo storico delle letture con filtri opzionali, dalla più recente.
+    resolution: raw (letture grezze) | 1m | 1h | 1d (rollup, value = media
+    dell'intervallo) | auto (vedi pick_resolution con 'points').
+    after: (timestamp, _id) dell'ultimo elemento della pagina precedente
+    (paginazione keyset, vedi utils/sensor_series.decode_cursor).
+    """
     try:
-        query = {}
+        if resolution == "auto":
+            resolution = pick_resolution(hours, points)
+        if resolution in ROLLUPS:
+            return await _rollup_history(resolution, meta_query(sensor_id, sensor_type, location, prefix=""),
+                                         hours, limit, after)
 
-        if sensor_id:
-            query["sensor_id"] = sensor_id
-        if sensor_type:
-            query["sensor_type"] = sensor_type
-        if location:
-            query["location"] = location
+        query = meta_query(sensor_id, sensor_type, location)
 
         time_threshold = datetime.utcnow() - timedelta(hours=hours)
         query["timestamp"] = {"$gte": time_threshold}
+        if after:
+            query.update(keyset_filter("timestamp", after, -1))
 
-        cursor = db["sensor_readings"].find(query).sort("timestamp", -1).limit(limit)
-        readings = await cursor.to_list(length=limit)
-
-        for reading in readings:
-            reading["_id"] = str(reading["_id"])
-
-        return readings
+        readings = await _keyset_page(sensor_readings, query, "timestamp", limit)
+        return [flatten_reading(r) for r in readings]
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving sensor history: {str(e)}")
 
 
-async def get_latest_readings(location: Optional[str] = None) -> dict:
-    """Recupera le ultime letture di ogni tipo di sensore"""
+def _rollup_since(resolution: str, hours: int) -> datetime:
+    """Primo intervallo del rollup nella finestra (incluso quello parziale)."""
+    return bucket_start(datetime.utcnow() - timedelta(hours=hours), ROLLUPS[resolution])
+
+
+async def _rollup_history(resolution: str, query: dict, hours: int, limit: int, after=None) -> List[dict]:
+    query = {**query, "bucket": {"$gte": _rollup_since(resolution, hours)}}
+    if after:
+        query.update(keyset_filter("bucket", after, -1))
+    docs = await _keyset_page(sensor_rollups[resolution], query, "bucket", limit)
+    return [flatten_rollup(doc, resolution) for doc in docs]
+
+
+EXPORT_COLUMNS = {
+    "raw": ["timestamp", "sensor_id", "sensor_type", "location", "value", "unit", "plant_id", "_id"],
+    "rollup": ["timestamp", "sensor_id", "sensor_type", "location", "value", "min", "max", "last", "count",
+               "unit", "_id"],
+}
+
+
+def _export_value(v: Any) -> Any:
+    return v.isoformat() if isinstance(v, datetime) else v
+
+
+def export_is_indexed(
+        resolution: str = "raw",
+        sensor_id: Optional[str] = None,
+        sensor_type: Optional[str] = None,
+        location: Optional[str] = None
+) -> bool:
+    """
+    True se i filtri hanno un indice (meta, tempo) in cui il tempo segue campi
+    in uguaglianza: il cursore legge l'indice già in ordine cronologico e le righe
+    escono subito. Altrimenti il server ordina tutta la finestra (su disco).
+    """
+    if sensor_id or (sensor_type and location):
+        return True  # idx_sensor_ts / idx_type_location_ts (rollup: *_bucket)
+    return bool(location) and resolution in ROLLUPS  # idx_location_bucket
+
+
+def check_export_window(
+        resolution: str,
+        sensor_id: Optional[str],
+        sensor_type: Optional[str],
+        location: Optional[str],
+        start: datetime,
+        end: Optional[datetime] = None
+):
+    """Rifiuta (400) export senza indice su finestre oltre SENSOR_EXPORT_UNINDEXED_MAX_HOURS."""
+    if export_is_indexed(resolution, sensor_id, sensor_type, location):
+        return
+    hours = ((_naive_utc(end) if end else datetime.utcnow()) - _naive_utc(start)).total_seconds() / 3600
+    if hours > SENSOR_EXPORT_UNINDEXED_MAX_HOURS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Export window too large without sensor_id or sensor_type+location filters "
+                   f"(max {SENSOR_EXPORT_UNINDEXED_MAX_HOURS} hours)",
+        )
+
+
+async def iter_sensor_export(
+        sensor_id: Optional[str] = None,
+        sensor_type: Optional[str] = None,
+        location: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        fmt: str = "ndjson",
+        resolution: str = "raw",
+        after: Optional[Tuple[datetime, ObjectId]] = None
+) -> AsyncIterator[str]:
+    """
+    Export dello storico in ordine cronologico (timestamp, _id), NDJSON o CSV,
+    scritto man mano dal cursore a blocchi di SENSOR_EXPORT_BATCH documenti:
+    la memoria non dipende dall'ampiezza della finestra. Nessun limite sul
+    numero di righe; 'after' riprende un export interrotto dall'ultima riga ricevuta.
+
+    Il server ordina solo per tempo (l'ordine dell'indice meta+tempo, vedi
+    export_is_indexed): le righe con lo stesso istante vengono raccolte e
+    scritte per _id qui, lo stesso spareggio usato dal filtro keyset di 'after'.
+    Senza indice utilizzabile l'ordinamento è bloccante: il router limita la
+    finestra con check_export_window.
+    """
+    if resolution in ROLLUPS:
+        collection, time_field, kind = sensor_rollups[resolution], "bucket", "rollup"
+        query = meta_query(sensor_id, sensor_type, location, prefix="")
+        flatten = lambda doc: flatten_rollup(doc, resolution)
+    else:
+        collection, time_field, kind = sensor_readings, "timestamp", "raw"
+        query = meta_query(sensor_id, sensor_type, location)
+        flatten = flatten_reading
+
+    window = {}
+    if start:
+        start = _naive_utc(start)
+        window["$gte"] = start if resolution not in ROLLUPS else bucket_start(start, ROLLUPS[resolution])
+    if end:
+        window["$lt"] = _naive_utc(end)
+    if window:
+        query[time_field] = window
+    if after:
+        query.update(keyset_filter(time_field, after, 1))
+
+    columns = EXPORT_COLUMNS[kind]
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=columns, extrasaction="ignore") if fmt == "csv" else None
+    if writer:
+        writer.writeheader()
+
+    def _take() -> str:
+        out = buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+        return out
+
+    def _write(docs: List[dict]) -> int:
+        for doc in sorted(docs, key=lambda d: d["_id"]):
+            row = {k: _export_value(v) for k, v in flatten(doc).items()}
+            if writer:
+                writer.writerow(row)
+            else:
+                buf.write(json.dumps(row, ensure_ascii=False) + "\n")
+        return len(docs)
+
+    indexed = export_is_indexed(resolution, sensor_id, sensor_type, location)
+    cursor = collection.find(query, batch_size=SENSOR_EXPORT_BATCH, allow_disk_use=not indexed) \
+        .sort(time_field, 1)
+    rows = flushed = 0
+    ties: List[dict] = []  # documenti dello stesso istante, in attesa dello spareggio per _id
     try:
-        query = {}
-        if location:
-            query["location"] = location
-
-        sensor_types = await db["sensor_readings"].distinct("sensor_type", query)
-        latest_readings = {}
-
-        for sensor_type in sensor_types:
-            type_query = {**query, "sensor_type": sensor_type}
-            reading = await db["sensor_readings"].find_one(
-                type_query,
-                sort=[("timestamp", -1)]
-            )
+        async for doc in cursor:
+            if ties and doc[time_field] != ties[0][time_field]:
+                rows += _write(ties)
+                ties = []
+                if rows - flushed >= SENSOR_EXPORT_BATCH:
+                    flushed = rows
+                    yield _take()
+            ties.append(doc)
+        rows += _write(ties)
+    except errors.PyMongoError as e:
+        logger.warning(f"sensor export interrotto dopo {rows} righe: {e}")
+        if not writer:
+            buf.write(json.dumps({"error": "export interrupted", "rows": rows}) + "\n")
+    finally:
+        await cursor.close()
+    tail = _take()
+    if tail:
+        yield tail
 
-            if reading:
-                reading["_id"] = str(reading["_id"])
-                latest_readings[sensor_type] = reading
 
-        return latest_readings
+async def get_latest_readings(location: Optional[str] = None) -> dict:
+    """
+    Recupera le ultime letture di ogni tipo di sensore dalla tabella in memoria
+    (riallineata da MongoDB con una sola aggregazione se più vecchia di
+    SENSOR_LATEST_RESYNC_SECONDS).
+    """
+    try:
+        await latest_table.refresh_if_stale()
+        return latest_table.latest(location)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving latest readings: {str(e)}")
 
 
-async def get_sensor_stats(sensor_id: str, hours: int = 24) -> dict:
-    """Calcola statistiche per un sensore specifico"""
+async def get_sensor_stats(sensor_id: str, hours: int = 24, resolution: str = "raw") -> dict:
+    """
+    Calcola statistiche per un sensore specifico.
+    Con un rollup (1m | 1h | 1d | auto) somma gli intervalli invece delle letture
+    grezze; il primo intervallo può includere letture di poco precedenti alla finestra.
+    """
     try:
+        if resolution == "auto":
+            resolution = pick_resolution(hours)
+        if resolution in ROLLUPS:
+            return await _rollup_stats(sensor_id, hours, resolution)
+
         time_threshold = datetime.utcnow() - timedelta(hours=hours)
 
         pipeline = [
             {
                 "$match": {
-                    "sensor_id": sensor_id,
+                    "meta.sensor_id": sensor_id,
                     "timestamp": {"$gte": time_threshold}
                 }
             },
             {
                 "$group": {
-                    "_id": "$sensor_id",
+                    "_id": "$meta.sensor_id",
                     "avg_value": {"$avg": "$value"},
                     "min_value": {"$min": "$value"},
                     "max_value": {"$max": "$value"},
@@ -104,7 +588,8 @@ async def get_sensor_stats(sensor_id: str, hours: int = 24) -> dict:
             }
         ]
 
-        result = await db["sensor_readings"].aggregate(pipeline).to_list(length=1)
+        cursor = await sensor_readings.aggregate(pipeline)
+        result = await cursor.to_list(length=1)
 
         if not result:
             raise HTTPException(status_code=404, detail=f"No data found for sensor {sensor_id}")
@@ -115,3 +600,25 @@ async def get_sensor_stats(sensor_id: str, hours: int = 24) -> dict:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error calculating stats: {str(e)}")
+
+
+async def _rollup_stats(sensor_id: str, hours: int, resolution: str) -> dict:
+    cursor = await sensor_rollups[resolution].aggregate([
+        {"$match": {"sensor_id": sensor_id, "bucket": {"$gte": _rollup_since(resolution, hours)}}},
+        {"$group": {
+            "_id": "$sensor_id",
+            "sum": {"$sum": "$sum"},
+            "min_value": {"$min": "$min"},
+            "max_value": {"$max": "$max"},
+            "count": {"$sum": "$count"},
+            "unit": {"$first": "$unit"},
+        }},
+    ])
+    result = await cursor.to_list(length=1)
+    if not result or not result[0]["count"]:
+        raise HTTPException(status_code=404, detail=f"No data found for sensor {sensor_id}")
+
+    stats = result[0]
+    stats["avg_value"] = stats.pop("sum") / stats["count"]
+    stats["resolution"] = resolution
+    return stats
@@ -1,5 +1,8 @@
-from pymongo import MongoClient, ASCENDING, errors
-from config import MONGO_URI, MONGO_DB
+from pymongo import MongoClient, AsyncMongoClient, ASCENDING, errors
+from config import (
+    MONGO_URI, MONGO_DB,
+    MONGO_ASYNC_MAX_POOL, MONGO_ASYNC_MIN_POOL, MONGO_ASYNC_MAX_CONNECTING, MONGO_ASYNC_WAIT_QUEUE_MS,
+)
 
 
 client = MongoClient(
@@ -10,6 +13,28 @@ client = MongoClient(
 )
 db = client[MONGO_DB]
 
+# Client asincrono (API async di pymongo, stesse chiamate di Motor) per gli
+# endpoint async ad alto traffico (sensori). Connessioni aperte alla prima
+# richiesta, dentro l'event loop di uvicorn; pool più ampio del sync per
+# reggere raffiche di letture, con attesa limitata quando è esaurito.
+async_client = AsyncMongoClient(
+    MONGO_URI,
+    maxPoolSize=MONGO_ASYNC_MAX_POOL,
+    minPoolSize=MONGO_ASYNC_MIN_POOL,
+    maxConnecting=MONGO_ASYNC_MAX_CONNECTING,
+    waitQueueTimeoutMS=MONGO_ASYNC_WAIT_QUEUE_MS,
+    maxIdleTimeMS=60000,
+    retryWrites=True,
+    serverSelectionTimeoutMS=30000,
+    connectTimeoutMS=30000,
+    socketTimeoutMS=30000
+)
+async_db = async_client[MONGO_DB]
+
+
+async def close_async_client():
+    await async_client.close()
+
 
 def ensure_indexes():
     """Crea gli indici necessari (unique, ttl, ecc.) sulle collezioni."""
@@ -1,10 +1,14 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 from config import settings
-from database import db
+from database import db, close_async_client
 from controllers.interventionsController import ensure_interventions_indexes
+from controllers.recommendation_store import ensure_recommendation_store_indexes
+from utils.sensor_series import ensure_sensor_series
+from controllers.sensor_controller import sensor_buffer
+from utils.ttl_cache import cache_stats, cache_hot_keys, start_prewarm, stop_prewarm
 
 # Import dei Router
 from routers import interventionsRouter
@@ -55,6 +59,19 @@ app.include_router(aiRouter.router)
 def health():
     return {"status": "ok", "service": "Greenfield Advisor"}
 
+# Statistiche delle cache dei servizi esterni (hit/miss/eviction)
+@app.get("/health/cache")
+def health_cache():
+    return cache_stats()
+
+# Conteggio accessi per chiave (set caldo usato dal pre-warm)
+@app.get("/health/cache/{name}/keys")
+def health_cache_keys(name: str, limit: int = 20):
+    keys = cache_hot_keys(name, limit)
+    if keys is None:
+        raise HTTPException(status_code=404, detail="Cache non trovata")
+    return keys
+
 # ---- Startup: Inizializzazione Indici Database ----
 @app.on_event("startup")
 def init_indexes():
@@ -77,4 +94,26 @@ def init_indexes():
     try:
         ensure_interventions_indexes()
     except Exception as e:
-        print(f"[WARN] interventions indexes: {e}")
\ No newline at end of file
+        print(f"[WARN] interventions indexes: {e}")
+
+    # Indici Consigli materializzati
+    ensure_recommendation_store_indexes()
+
+    # Letture sensori: collezione time-series e indici
+    ensure_sensor_series(db)
+
+# ---- Startup: Pre-warm delle cache (celle più richieste) ----
+@app.on_event("startup")
+def init_cache_prewarm():
+    start_prewarm()
+
+
+@app.on_event("shutdown")
+def stop_cache_prewarm():
+    stop_prewarm()
+
+
+@app.on_event("shutdown")
+async def close_async_db():
+    await sensor_buffer.close()  # letture in coda e blocchi in scrittura
+    await close_async_client()
@@ -0,0 +1,159 @@
+"""
+Migrazione delle letture sensori nella collezione time-series (utils/sensor_series).
+
+Copia a blocchi i documenti di 'sensor_readings' (API) e 'sensor_data'
+(SensorSimulator) nel formato { timestamp, meta, value, unit, plant_id },
+mantenendo gli _id originali, e aggiorna i rollup 1m/1h/1d con gli stessi
+blocchi. L'avanzamento per sorgente (ultimo _id copiato) è salvato in
+'migrations': rilanciando lo script riprende da dove si era fermato.
+
+La time-series non impone l'unicità di _id: prima di ogni blocco viene salvato
+anche l'ultimo _id in scrittura ('pendingId'). Se lo script si interrompe tra
+l'inserimento e l'aggiornamento dell'avanzamento, alla ripresa le letture fino
+a pendingId già presenti nella time-series vengono saltate (né reinserite né
+contate di nuovo nei rollup).
+
+Le collezioni sorgente non vengono modificate: --drop-source le elimina solo
+se la copia è completa (nessuna lettura non copiata o senza timestamp).
+
+Uso:
+    python migrate_sensor_series.py [--batch-size 5000] [--source sensor_readings] [--dry-run] [--drop-source]
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict
+
+from pymongo import errors
+
+# Aggiungi la root del backend al path per importare i moduli
+sys.path.append(str(Path(__file__).parent))
+
+from database import db
+from utils.sensor_series import SENSOR_SERIES, series_doc, ensure_sensor_series, apply_rollups
+
+
+SOURCES = ("sensor_readings", "sensor_data")
+
+migrations_collection = db["migrations"]
+
+
+def _progress_id(source: str) -> str:
+    return f"{SENSOR_SERIES}:{source}"
+
+
+def migrate_source(source: str, batch_size: int = 5000, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Copia 'source' nella time-series in ordine di _id, riprendendo dall'ultimo blocco salvato.
+    stats: copied (inserite), existing (già presenti dopo un'interruzione), failed
+    (errori di scrittura), skipped (senza timestamp), batches.
+    """
+    stats = {"source": source, "copied": 0, "existing": 0, "failed": 0, "skipped": 0, "batches": 0}
+    progress = migrations_collection.find_one({"_id": _progress_id(source)}) or {}
+    query = {"_id": {"$gt": progress["lastId"]}} if progress.get("lastId") is not None else {}
+    pending_id = progress.get("pendingId")  # blocco interrotto: letture forse già inserite
+
+    series = db[SENSOR_SERIES]
+    batch = []
+    unsaved_skips = 0  # letture senza timestamp non ancora registrate in 'migrations'
+
+    def _already_copied(docs):
+        """_id dei documenti (fino a pending_id) già presenti nella time-series."""
+        ids = [d["_id"] for d in docs if d["_id"] <= pending_id]
+        if not ids:
+            return set()
+        found = {"_id": {"$in": ids}}
+        ts = [d["timestamp"] for d in docs if d["_id"] <= pending_id]
+        if all(isinstance(t, datetime) for t in ts):
+            found["timestamp"] = {"$gte": min(ts), "$lte": max(ts)}  # limita i bucket letti
+        return {d["_id"] for d in series.find(found, {"_id": 1})}
+
+    def _flush():
+        nonlocal unsaved_skips
+        if not batch:
+            return
+        docs = [series_doc(d) | {"_id": d["_id"]} for d in batch]
+        failed = existing = 0
+        if not dry_run:
+            if pending_id is not None and batch[0]["_id"] <= pending_id:
+                present = _already_copied(docs)
+                docs = [d for d in docs if d["_id"] not in present]
+                existing = len(present)
+                stats["existing"] += existing
+            migrations_collection.update_one(
+                {"_id": _progress_id(source)}, {"$set": {"pendingId": batch[-1]["_id"]}}, upsert=True,
+            )
+            try:
+                if docs:
+                    series.insert_many(docs, ordered=False)
+                    apply_rollups(db, docs)
+            except errors.BulkWriteError as e:
+                failed_idx = {w["index"] for w in e.details.get("writeErrors", [])}
+                failed = len(failed_idx)
+                apply_rollups(db, [d for i, d in enumerate(docs) if i not in failed_idx])
+                print(f"[WARN] {source}: {failed} letture non copiate")
+            migrations_collection.update_one(
+                {"_id": _progress_id(source)},
+                {"$set": {"lastId": batch[-1]["_id"]}, "$unset": {"pendingId": ""},
+                 "$inc": {"copied": len(docs) - failed + existing, "failed": failed, "skipped": unsaved_skips}},
+                upsert=True,
+            )
+            unsaved_skips = 0
+        stats["copied"] += len(docs) - failed
+        stats["failed"] += failed
+        stats["batches"] += 1
+        batch.clear()
+
+    for doc in db[source].find(query, batch_size=batch_size).sort("_id", 1):
+        if not doc.get("timestamp"):
+            stats["skipped"] += 1  # il timeField è obbligatorio
+            unsaved_skips += 1
+            continue
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            _flush()
+            print(f"  {source}: {stats['copied']} letture copiate")
+    _flush()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=f"Migra le letture sensori nella time-series '{SENSOR_SERIES}'")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Documenti per insert_many (default: 5000)")
+    parser.add_argument("--source", choices=SOURCES, action="append",
+                        help="Collezione sorgente (ripetibile, default: tutte)")
+    parser.add_argument("--dry-run", action="store_true", help="Legge e converte senza scrivere")
+    parser.add_argument("--drop-source", action="store_true", help="Elimina le sorgenti a copia completata")
+    args = parser.parse_args()
+
+    print(f"\n{'='*60}")
+    print(f" Migrazione letture sensori -> {SENSOR_SERIES}{' (dry-run)' if args.dry_run else ''}")
+    print(f"{'='*60}\n")
+
+    if not args.dry_run:
+        ensure_sensor_series(db)
+
+    t0 = time.perf_counter()
+    for source in args.source or SOURCES:
+        stats = migrate_source(source, args.batch_size, args.dry_run)
+        print(f" {source}: {stats['copied']} copiate, {stats['existing']} già presenti, "
+              f"{stats['failed']} non copiate, {stats['skipped']} senza timestamp, {stats['batches']} blocchi")
+        if args.drop_source and not args.dry_run:
+            # anche le esecuzioni precedenti: le letture perse restano prima di lastId
+            totals = migrations_collection.find_one({"_id": _progress_id(source)}) or {}
+            if stats["failed"] == 0 and stats["skipped"] == 0 \
+                    and not totals.get("failed") and not totals.get("skipped"):
+                db[source].drop()
+                print(f" {source}: eliminata")
+            else:
+                print(f"[WARN] {source}: non eliminata, copia incompleta")
+
+    print(f"\n Tempo: {time.perf_counter() - t0:.1f}s")
+    print(f"{'='*60}\n")
+
+
+if __name__ == "__main__":
+    main()
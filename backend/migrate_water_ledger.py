@@ -0,0 +1,68 @@
+"""
+Ricostruzione del registro idrico giornaliero (water_ledger) per le piante
+create prima del registro, o il cui registro è stato invalidato da un
+aggiornamento fallito (flag waterLedgerReady assente).
+
+Per ogni pianta ricalcola i totali per giorno dallo storico degli interventi e
+li scrive con un upsert $set per (pianta, giorno) sull'indice unico uniq_plant_day
+(vedi controllers/interventionsController.rebuild_water_ledger): lo script è
+idempotente e può essere rilanciato. Fino alla ricostruzione le letture di quella
+pianta usano l'aggregazione sugli interventi.
+
+Da eseguire con le scritture di interventi ferme: un'irrigazione registrata
+durante la ricostruzione della stessa pianta può essere contata due volte o
+persa (basta rilanciare lo script con --all per riallinearla).
+
+Uso:
+    python migrate_water_ledger.py [--all] [--dry-run]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Aggiungi la root del backend al path per importare i moduli
+sys.path.append(str(Path(__file__).parent))
+
+from controllers.interventionsController import (
+    plants_collection, ensure_interventions_indexes, rebuild_water_ledger
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ricostruisce il registro idrico giornaliero (water_ledger)")
+    parser.add_argument("--all", action="store_true", help="Ricostruisce anche le piante con waterLedgerReady")
+    parser.add_argument("--dry-run", action="store_true", help="Conta le piante senza scrivere")
+    args = parser.parse_args()
+
+    print(f"\n{'='*60}")
+    print(f" Ricostruzione registro idrico{' (dry-run)' if args.dry_run else ''}")
+    print(f"{'='*60}\n")
+
+    query = {} if args.all else {"waterLedgerReady": {"$ne": True}}
+    if args.dry_run:
+        print(f" Piante da ricostruire: {plants_collection.count_documents(query)}")
+        return
+
+    ensure_interventions_indexes()  # uniq_plant_day prima degli upsert
+
+    t0 = time.perf_counter()
+    plants = days = failed = 0
+    for plant in plants_collection.find(query, {"_id": 1}):
+        try:
+            days += rebuild_water_ledger(plant["_id"])
+            plants += 1
+        except Exception as e:
+            failed += 1
+            print(f"[WARN] pianta {plant['_id']}: {e}")
+        if plants and plants % 500 == 0:
+            print(f"  {plants} piante ricostruite")
+
+    print(f" {plants} piante ricostruite ({days} giorni), {failed} non ricostruite")
+    print(f"\n Tempo: {time.perf_counter() - t0:.1f}s")
+    print(f"{'='*60}\n")
+
+
+if __name__ == "__main__":
+    main()
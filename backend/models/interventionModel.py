@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from pydantic import BaseModel, Field
-from typing import Optional, Literal
+from typing import Optional, Literal, List, Union
 from datetime import datetime
 
 
@@ -21,6 +21,23 @@ class InterventionCreate(InterventionBase):
     # in questo endpoint lo passiamo da path, quindi non serve qui plantId
     pass
 
+class InterventionBulkItem(BaseModel):
+    # type/status/date non vincolati qui: la validazione è per singolo elemento
+    # (vedi create_interventions_bulk), un elemento errato non invalida il batch
+    plantId: str
+    type: str = "irrigazione"
+    status: str = "done"
+    notes: Optional[str] = None
+    liters: Optional[float] = None
+    fertilizerType: Optional[str] = None
+    dose: Optional[str] = None
+    executedAt: Optional[Union[datetime, str]] = None
+    plannedAt: Optional[Union[datetime, str]] = None
+
+class InterventionBulkIn(BaseModel):
+    items: List[InterventionBulkItem] = Field(default_factory=list)
+    ordered: bool = False  # True: si ferma al primo elemento non valido o non inserito
+
 class InterventionUpdate(BaseModel):
     type: Optional[Literal["irrigazione", "concimazione", "potatura", "pianificato", "altro"]] = None
     status: Optional[Literal["done", "planned", "skipped", "canceled"]] = None
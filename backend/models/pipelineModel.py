@@ -51,6 +51,7 @@ class PipelineDetailsResponse(BaseModel):
 class PipelineMetadataResponse(BaseModel):
     started_at: str
     completed_at: Optional[str] = None
+    duration_ms: Optional[float] = None
     errors: List[str] = []
     warnings: List[str] = []
     stage_results: Dict[str, Dict[str, Any]] = {}
@@ -66,6 +67,20 @@ class PipelineRequest(BaseModel):
     plant_type: Optional[str] = "generic"
     soil_type: Optional[str] = None
 
+class StageMetricsResponse(BaseModel):
+    """Durate di uno stage (millisecondi, clock monotono)"""
+    count: int
+    errors: int
+    mean_ms: Optional[float] = None
+    p50_ms: Optional[float] = None
+    p95_ms: Optional[float] = None
+    p99_ms: Optional[float] = None
+    max_ms: Optional[float] = None
+
+class PipelineMetricsResponse(BaseModel):
+    since: str
+    stages: Dict[str, StageMetricsResponse] = {}
+
 class HealthCheckResponse(BaseModel):
     status: str
     pipeline_available: bool
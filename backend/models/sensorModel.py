@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 class SensorReading(BaseModel):
     """Modello per una lettura da sensore"""
@@ -29,3 +29,14 @@ class SensorReadingResponse(BaseModel):
     status: str
     id: str
     message: str
+
+class SensorBatchError(BaseModel):
+    index: int
+    error: str
+
+class SensorBatchResponse(BaseModel):
+    """Risposta dopo il salvataggio di un batch"""
+    status: str  # success | partial | queued | error
+    received: int
+    saved: int
+    errors: List[SensorBatchError] = []
@@ -0,0 +1,269 @@
+"""
+Job notturno: consiglio di irrigazione per tutte le piante della collezione 'piante'.
+
+- legge le piante dal cursore Mongo a blocchi (--batch-size)
+- raggruppa ogni blocco per cella meteo (NASA POWER | Open-Meteo, vedi
+  utils/spatial_grid): una sola richiesta upstream per cella, in parallelo
+- calcola i consigli con il motore fuzzy batch in un pool di processi (--workers,
+  avviati con 'spawn': il processo padre ha già client Mongo e thread attivi)
+- scrive i risultati nella collezione 'recommendations' con bulk_write (upsert per plantId)
+
+Nessuna spiegazione LLM: il job produce solo decisione, segnali e meteo.
+
+Uso:
+    python nightly_recommendations.py [--workers 4] [--batch-size 500] [--limit N] [--detail] [--dry-run]
+
+ENV (default dei parametri):
+  FLEET_JOB_WORKERS       processi del pool (default: numero di CPU; 0 = nel processo)
+  FLEET_JOB_BATCH_SIZE    piante per blocco (default: 500)
+  FLEET_JOB_CONCURRENCY   celle meteo richieste in parallelo (default: 8)
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional
+
+import httpx
+from pymongo import ASCENDING, UpdateOne, errors
+
+# Aggiungi la root del backend al path per importare i moduli
+sys.path.append(str(Path(__file__).parent))
+
+from database import db
+from utils.ai_inputs_aggregator import get_inputs, get_inputs_async, cell_key
+from utils.ai_irrigation_service import compute_batch
+from utils.weather_service import get_weather
+
+
+FLEET_JOB_WORKERS = int(os.getenv("FLEET_JOB_WORKERS", str(os.cpu_count() or 1)))
+FLEET_JOB_BATCH_SIZE = int(os.getenv("FLEET_JOB_BATCH_SIZE", "500"))
+FLEET_JOB_CONCURRENCY = int(os.getenv("FLEET_JOB_CONCURRENCY", "8"))
+
+# Campi della pianta usati da aggregatore e motore fuzzy
+PLANT_FIELDS = {
+    "_id": 1, "userId": 1, "geoLat": 1, "geoLng": 1, "species": 1,
+    "stage": 1, "wateringIntervalDays": 1, "lastWateredAt": 1,
+}
+
+plants_collection = db["piante"]
+recommendations_collection = db["recommendations"]
+
+
+def ensure_recommendation_indexes(collection=recommendations_collection):
+    try:
+        collection.create_index([("plantId", ASCENDING)], unique=True, name="uniq_plant", background=True)
+        collection.create_index([("userId", ASCENDING), ("generatedAt", -1)], name="idx_user_generated",
+                                background=True)
+    except errors.PyMongoError as e:
+        print(f"[WARN] recommendations indexes: {e}")
+
+
+def iter_plant_batches(collection, batch_size: int, limit: Optional[int] = None) -> Iterator[List[dict]]:
+    """Piante a blocchi di 'batch_size', lette con un solo cursore."""
+    cursor = collection.find({}, PLANT_FIELDS, batch_size=batch_size)
+    if limit:
+        cursor = cursor.limit(limit)
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _plant_cell(plant: dict) -> Optional[str]:
+    lat, lng = plant.get("geoLat"), plant.get("geoLng")
+    if isinstance(lat, (int, float)) and isinstance(lng, (int, float)):
+        return cell_key(lat, lng)
+    return None
+
+
+def group_by_cell(plants: List[dict]) -> Dict[Optional[str], List[dict]]:
+    """Piante per cella meteo (None = senza coordinate)."""
+    groups: Dict[Optional[str], List[dict]] = {}
+    for p in plants:
+        groups.setdefault(_plant_cell(p), []).append(p)
+    return groups
+
+
+async def warm_cells(groups: Dict[Optional[str], List[dict]], now: datetime, concurrency: int,
+                     client: httpx.AsyncClient):
+    """Una richiesta aggregata per cella (la prima pianta fa da rappresentante)."""
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def _one(plant: dict):
+        async with sem:
+            try:
+                await get_inputs_async(plant, now=now, client=client)
+            except Exception as e:
+                print(f"[WARN] nightly warm {_plant_cell(plant)}: {e}")
+
+    await asyncio.gather(*(_one(plants[0]) for cell, plants in groups.items() if cell is not None))
+
+
+def plant_weather(plant: dict, now: datetime) -> Dict[str, Any]:
+    """Meteo normalizzato come in compute_for_plant (aggregatore, fallback Open-Meteo)."""
+    agg = get_inputs(plant, now=now) or {}
+    wx = agg.get("weather") or {}
+    if not wx and plant.get("geoLat") is not None and plant.get("geoLng") is not None:
+        wx = {**wx, **(get_weather(plant["geoLat"], plant["geoLng"]) or {})}
+    return wx
+
+
+def score_chunk(plants: List[dict], weathers: List[dict], cells: List[Optional[str]],
+                now: datetime, detail: bool) -> List[dict]:
+    """
+    Eseguito nel pool: motore fuzzy batch e documenti per 'recommendations'.
+    """
+    decisions = compute_batch(plants, weathers, now, detail=detail)
+    docs = []
+    for plant, wx, cell, decision in zip(plants, weathers, cells, decisions):
+        doc = {
+            "plantId": plant["_id"],
+            "userId": plant.get("userId"),
+            "recommendation": decision["recommendation"],
+            "reason": decision["reason"],
+            "nextDate": decision["nextDate"],
+            "confidence": decision["confidence"],
+            "signals": decision["signals"],
+            "weather": {
+                "temp": wx.get("temp"),
+                "humidity": wx.get("humidity"),
+                "rainNext24h": wx.get("rainNext24h"),
+                "soilMoistureApprox": wx.get("soilMoistureApprox"),
+                "soilMoisture0to7cm": wx.get("soilMoisture0to7cm"),
+            },
+            "cellKey": cell,
+            "source": "nightly",
+            "generatedAt": now,
+        }
+        if detail:
+            doc["tech"] = decision.get("tech")
+        docs.append(doc)
+    return docs
+
+
+def write_recommendations(collection, docs: List[dict]) -> int:
+    """Upsert per plantId; ritorna i documenti inseriti o aggiornati."""
+    if not docs:
+        return 0
+    ops = [UpdateOne({"plantId": d["plantId"]}, {"$set": d}, upsert=True) for d in docs]
+    try:
+        res = collection.bulk_write(ops, ordered=False)
+        return res.upserted_count + res.matched_count
+    except errors.BulkWriteError as e:
+        print(f"[WARN] nightly bulk_write: {len(e.details.get('writeErrors', []))} errori")
+        return e.details.get("nUpserted", 0) + e.details.get("nMatched", 0)
+
+
+def run(workers: int = FLEET_JOB_WORKERS, batch_size: int = FLEET_JOB_BATCH_SIZE,
+        concurrency: int = FLEET_JOB_CONCURRENCY, limit: Optional[int] = None,
+        detail: bool = False, dry_run: bool = False,
+        source=plants_collection, target=recommendations_collection) -> Dict[str, Any]:
+    now = datetime.utcnow()
+    stats = {"plants": 0, "cells": 0, "batches": 0, "written": 0, "errors": 0}
+    seen_cells = set()
+    if not dry_run:
+        ensure_recommendation_indexes(target)
+
+    def _write(docs: List[dict]):
+        stats["written"] += len(docs) if dry_run else write_recommendations(target, docs)
+
+    t0 = time.perf_counter()
+    # 'spawn': un fork copierebbe client Mongo e thread della cache già attivi
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) \
+        if workers > 0 else None
+    # un solo event loop (e client HTTP) per tutto il job: i refresh in cache avviati
+    # in un blocco proseguono nei successivi
+    loop = asyncio.new_event_loop()
+    client = httpx.AsyncClient()
+    pending = []  # blocchi in calcolo nel pool, in ordine
+    try:
+        for batch in iter_plant_batches(source, batch_size, limit):
+            groups = group_by_cell(batch)
+            loop.run_until_complete(warm_cells(groups, now, concurrency, client))
+
+            plants, weathers, cells = [], [], []
+            for cell, members in groups.items():
+                for p in members:
+                    try:
+                        wx = plant_weather(p, now)
+                    except Exception as e:
+                        print(f"[WARN] nightly input {p.get('_id')}: {e}")
+                        stats["errors"] += 1
+                        continue
+                    plants.append(p)
+                    weathers.append(wx)
+                    cells.append(cell)
+
+            # il pool calcola mentre il blocco successivo legge Mongo e il meteo
+            if pool is None:
+                _write(score_chunk(plants, weathers, cells, now, detail))
+            else:
+                pending.append(pool.submit(score_chunk, plants, weathers, cells, now, detail))
+                while len(pending) > workers:
+                    _write(pending.pop(0).result())
+
+            seen_cells.update(c for c in groups if c is not None)
+            stats["plants"] += len(batch)
+            stats["batches"] += 1
+            elapsed = time.perf_counter() - t0
+            print(f"  blocco {stats['batches']}: {stats['plants']} piante, "
+                  f"{stats['plants'] / elapsed:,.0f} piante/s")
+        for fut in pending:
+            _write(fut.result())
+    finally:
+        leftover = asyncio.all_tasks(loop)  # refresh in background ancora in corso
+        for task in leftover:
+            task.cancel()
+        if leftover:
+            loop.run_until_complete(asyncio.gather(*leftover, return_exceptions=True))
+        loop.run_until_complete(client.aclose())
+        loop.close()
+        if pool is not None:
+            pool.shutdown()
+
+    stats["cells"] = len(seen_cells)
+    stats["seconds"] = round(time.perf_counter() - t0, 3)
+    stats["plantsPerSec"] = round(stats["plants"] / stats["seconds"], 1) if stats["seconds"] else None
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consigli di irrigazione per tutte le piante (job notturno)")
+    parser.add_argument("--workers", type=int, default=FLEET_JOB_WORKERS,
+                        help=f"Processi del pool, 0 = nel processo (default: {FLEET_JOB_WORKERS})")
+    parser.add_argument("--batch-size", type=int, default=FLEET_JOB_BATCH_SIZE,
+                        help=f"Piante per blocco (default: {FLEET_JOB_BATCH_SIZE})")
+    parser.add_argument("--concurrency", type=int, default=FLEET_JOB_CONCURRENCY,
+                        help=f"Celle meteo richieste in parallelo (default: {FLEET_JOB_CONCURRENCY})")
+    parser.add_argument("--limit", type=int, default=None, help="Numero massimo di piante")
+    parser.add_argument("--detail", action="store_true", help="Salva anche i dettagli fuzzy (tech)")
+    parser.add_argument("--dry-run", action="store_true", help="Calcola senza scrivere su MongoDB")
+    args = parser.parse_args()
+
+    print(f"\n{'='*60}")
+    print(f" Job consigli irrigazione - workers={args.workers} batch={args.batch_size}")
+    print(f"{'='*60}\n")
+
+    stats = run(workers=args.workers, batch_size=args.batch_size, concurrency=args.concurrency,
+                limit=args.limit, detail=args.detail, dry_run=args.dry_run)
+
+    print(f"\n{'='*60}")
+    print(f" Piante: {stats['plants']} | celle meteo: {stats['cells']} | blocchi: {stats['batches']}")
+    print(f" Scritte: {stats['written']}{' (dry-run)' if args.dry_run else ''} | errori: {stats['errors']}")
+    print(f" Tempo: {stats['seconds']}s -> {stats['plantsPerSec']} piante/s")
+    print(f"{'='*60}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 """
 Pipeline di processing per analisi dati sensori e suggerimenti irrigazione.
-Implementa pattern Chain of Responsibility e Strategy.
+Stage eseguiti in sequenza con dipendenze esplicite; pattern Strategy per le piante.
 """
 
 from .base import ProcessorBase, PipelineContext, PipelineStage, PipelineStatus
@@ -10,6 +10,7 @@ from .estimators import IrrigationEstimator, PlantType, IrrigationDecision
 from .anomaly_detector import AnomalyDetector
 from .action_generator import ActionGenerator
 from .pipeline_manager import PipelineManager
+from .registry import PipelineRegistry, pipeline_registry, get_pipeline
 
 __all__ = [
     "ProcessorBase",
@@ -23,5 +24,8 @@ __all__ = [
     "IrrigationDecision",
     "AnomalyDetector",
     "ActionGenerator",
-    "PipelineManager"
+    "PipelineManager",
+    "PipelineRegistry",
+    "pipeline_registry",
+    "get_pipeline"
 ]
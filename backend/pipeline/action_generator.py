@@ -4,9 +4,11 @@ Step 5: Action Suggestion Generator
 
 from typing import Dict, Any, List
 from datetime import datetime, timedelta
-from .base import ProcessorBase, PipelineContext, PipelineStage
+import numpy as np
+from .base import ProcessorBase, PipelineContext, PipelineBatch, PipelineStage, round_column
 
 class ActionGenerator(ProcessorBase):
+    depends_on = (PipelineStage.VALIDATION, PipelineStage.ESTIMATION)
     
     def __init__(self):
         super().__init__("Action Generator")
@@ -43,7 +45,7 @@ class ActionGenerator(ProcessorBase):
         swrf = features.get("soil_retention_factor", 1.0) 
         plant_type = context.raw_data.get("plant_type", "generic").lower()
 
-        is_tree = any(p in plant_type for p in ["peach", "pesca", "grape", "uva", "vite"])
+        is_tree = self._is_tree(plant_type)
         tree_factor = 2.0 if is_tree else 1.0
 
         if et0 > 0:
@@ -52,7 +54,12 @@ class ActionGenerator(ProcessorBase):
             base_days = 7.0 * tree_factor
             
         adjusted_days = base_days * swrf 
+        return self._frequency_from_days(adjusted_days, is_tree)
 
+    def _is_tree(self, plant_type: str) -> bool:
+        return any(p in plant_type for p in ["peach", "pesca", "grape", "uva", "vite"])
+
+    def _frequency_from_days(self, adjusted_days: float, is_tree: bool) -> Dict[str, str]:
         if adjusted_days <= 2:
              detail = "Molto Frequente (1-2 gg)"
              label = "ALTA"
@@ -79,7 +86,9 @@ class ActionGenerator(ProcessorBase):
         if "species" in context.raw_data: plant_type = str(context.raw_data["species"]).lower()
         
         soil_type = context.cleaned_data.get("soil", "universale").lower()
-        
+        return self._fertilizer_for(plant_type, soil_type)
+
+    def _fertilizer_for(self, plant_type: str, soil_type: str) -> Dict[str, str]:
         # 1. Classificazione
         is_tomato = "tomato" in plant_type or "pomodoro" in plant_type
         is_potato = "potato" in plant_type or "patata" in plant_type
@@ -122,6 +131,67 @@ class ActionGenerator(ProcessorBase):
             "reasoning": advice
         }
 
+    def _execute_batch(self, batch: PipelineBatch) -> List[Dict[str, Any]]:
+        """Genera i suggerimenti per tutte le righe del batch"""
+        c = batch.columns
+        et0 = c["evapotranspiration"]
+        swrf = c["soil_retention_factor"]
+
+        plant_types = [row.get("plant_type", "generic").lower() for row in batch.rows]
+        is_tree = np.array([self._is_tree(pt) for pt in plant_types], dtype=bool)
+        tree_factor = np.where(is_tree, 2.0, 1.0)
+        with np.errstate(divide="ignore"):
+            base_days = np.where(et0 > 0, np.maximum(1.0, (4.0 * tree_factor) / et0), 7.0 * tree_factor)
+        adjusted_days = base_days * swrf
+        frequency_cache: Dict[tuple, Dict[str, str]] = {}
+        bucket = np.select([adjusted_days <= 2, adjusted_days <= 5, adjusted_days <= 10], [2, 5, 10], 11)
+
+        liters = round_column(c["water_amount_ml"] / 1000, 2)
+
+        fertilizer_cache: Dict[tuple, Dict[str, str]] = {}
+        generated_at = datetime.utcnow().isoformat()
+        next_window = datetime.now().isoformat()
+
+        suggestions_rows = []
+        for i, (raw, cleaned, estimation) in enumerate(zip(batch.rows, batch.cleaned_data, batch.estimation)):
+            freq_key = (int(bucket[i]), bool(is_tree[i]))
+            if freq_key not in frequency_cache:
+                frequency_cache[freq_key] = self._frequency_from_days(float(adjusted_days[i]), freq_key[1])
+
+            plant_type = plant_types[i]
+            if "species" in raw: plant_type = str(raw["species"]).lower()
+            fert_key = (plant_type, cleaned.get("soil", "universale").lower())
+            if fert_key not in fertilizer_cache:
+                fertilizer_cache[fert_key] = self._fertilizer_for(*fert_key)
+
+            main_action = {
+                "action": "irrigate" if estimation["should_water"] else "do_not_irrigate",
+                "decision": estimation["decision"],
+                "water_amount_ml": estimation["water_amount_ml"],
+                "water_amount_liters": liters[i].item(),
+                "reasoning": estimation["reasoning"],
+                "confidence": estimation["confidence"],
+                "description": self._get_action_description(estimation)
+            }
+            suggestions_rows.append({
+                "main_action": main_action,
+                "secondary_actions": [],
+                "timing": {
+                    "suggested_time": "Mattino presto",
+                    "next_window": next_window,
+                    "current_phase": "day",
+                    "ideal_hours": ["06:00-09:00"]
+                },
+                "frequency_estimation": dict(frequency_cache[freq_key]),
+                "fertilizer_estimation": dict(fertilizer_cache[fert_key]),
+                "notes": batch.warnings[i],
+                "priority": "medium",
+                "generated_at": generated_at
+            })
+
+        batch.suggestions = suggestions_rows
+        return [{"suggestions": s} for s in suggestions_rows]
+
     def _generate_main_action(self, context: PipelineContext) -> Dict[str, Any]:
         estimation = context.estimation
         
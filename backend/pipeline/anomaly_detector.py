@@ -4,7 +4,8 @@ Rileva anomalie nei dati e nelle condizioni ambientali.
 """
 
 from typing import Dict, Any, List
-from .base import ProcessorBase, PipelineContext, PipelineStage
+import numpy as np
+from .base import ProcessorBase, PipelineContext, PipelineBatch, PipelineStage
 
 
 class AnomalyDetector(ProcessorBase):
@@ -60,6 +61,49 @@ class AnomalyDetector(ProcessorBase):
             "anomalies": anomalies
         }
         
+    def _execute_batch(self, batch: PipelineBatch) -> List[Dict[str, Any]]:
+        """
+        Rileva anomalie su tutte le righe.
+        Le soglie sono valutate sulle colonne: i controlli per riga vengono
+        eseguiti solo dove almeno una soglia è superata.
+        """
+        c = batch.columns
+        t = self.critical_thresholds
+        flagged = (
+            (c["soil_moisture"] < t["soil_moisture"]["min"]) | (c["soil_moisture"] > t["soil_moisture"]["max"])
+            | (c["temperature"] < t["temperature"]["min"]) | (c["temperature"] > t["temperature"]["max"])
+            | (c["humidity"] < t["humidity"]["min"]) | (c["humidity"] > t["humidity"]["max"])
+            | (c["water_stress_index"] > t["water_stress_index"]["max"])
+            | (c["irrigation_urgency"] >= t["irrigation_urgency"]["max"])
+            | (c["water_deficit"] > 10)
+            | (c["climate_comfort_index"] < 30)
+            | (c["water_amount_ml"] > 3000)
+        )
+
+        # La confidence è costante per strategia, ma va comunque verificata per riga
+        confidences = np.array([e.get("confidence", 1.0) for e in batch.estimation], dtype=float)
+        flagged |= confidences < 0.5
+
+        results = []
+        for i in range(batch.size):
+            anomalies = []
+            if flagged[i]:
+                anomalies.extend(self._check_data_anomalies(batch.cleaned_data[i]))
+                anomalies.extend(self._check_feature_anomalies(batch.features[i]))
+                anomalies.extend(self._check_estimation_anomalies(batch.estimation[i]))
+            batch.anomalies[i] = anomalies
+
+            critical_anomalies = [a for a in anomalies if a["severity"] == "critical"]
+            for anomaly in critical_anomalies:
+                batch.add_warning(i, self.name, f"Anomalia critica: {anomaly['message']}")
+
+            results.append({
+                "anomalies_found": len(anomalies),
+                "critical_count": len(critical_anomalies),
+                "anomalies": anomalies
+            })
+        return results
+
     def _check_data_anomalies(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Controlla anomalie nei dati sensori"""
         anomalies = []
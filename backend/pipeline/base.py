@@ -1,11 +1,21 @@
 """
-Classi base per il pattern Chain of Responsibility.
+Classi base dei processori della pipeline.
+Gli stage sono eseguiti in sequenza dal PipelineManager, che salta quelli
+le cui dipendenze non sono state soddisfatte.
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Callable, Tuple
 from datetime import datetime
 from enum import Enum
+import os
+import time
+import numpy as np
+from .metrics import stage_metrics
+
+
+# Stampa su stdout l'avanzamento degli stage (utile in sviluppo, costoso ad alto carico)
+PIPELINE_VERBOSE = os.getenv("PIPELINE_VERBOSE", "false").lower() in ("1", "true", "yes")
 
 
 class PipelineStage(str, Enum):
@@ -42,6 +52,7 @@ class PipelineContext:
         # Metadata
         self.started_at = datetime.utcnow()
         self.completed_at: Optional[datetime] = None
+        self.duration_ms: Optional[float] = None
         self.errors: List[str] = []
         self.warnings: List[str] = []
         self.stage_results: Dict[str, Dict[str, Any]] = {}
@@ -54,14 +65,21 @@ class PipelineContext:
         """Aggiungi warning"""
         self.warnings.append(f"[{stage}] {message}")
         
-    def set_stage_result(self, stage: PipelineStage, status: PipelineStatus, data: Dict[str, Any]):
-        """Salva risultato di uno stage"""
+    def set_stage_result(self, stage: PipelineStage, status: PipelineStatus, data: Dict[str, Any],
+                         duration_ms: Optional[float] = None):
+        """Salva risultato di uno stage (durata misurata con clock monotono)"""
         self.stage_results[stage.value] = {
             "status": status.value,
             "data": data,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow().isoformat(),
+            "duration_ms": duration_ms
         }
         
+    def stage_succeeded(self, stage: PipelineStage) -> bool:
+        """True se lo stage è stato eseguito senza errori"""
+        result = self.stage_results.get(stage.value)
+        return bool(result) and result["status"] in (PipelineStatus.SUCCESS.value, PipelineStatus.WARNING.value)
+        
     def complete(self):
         """Marca la pipeline come completata"""
         self.completed_at = datetime.utcnow()
@@ -78,6 +96,7 @@ class PipelineContext:
             "metadata": {
                 "started_at": self.started_at.isoformat(),
                 "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+                "duration_ms": self.duration_ms,
                 "errors": self.errors,
                 "warnings": self.warnings,
                 "stage_results": self.stage_results
@@ -85,56 +104,180 @@ class PipelineContext:
         }
 
 
+class PipelineBatch:
+    """
+    Contesto della modalità batch.
+    Le grandezze numeriche sono tenute in colonne NumPy (una posizione per riga),
+    mentre i risultati per riga vengono materializzati solo per l'output finale.
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.rows = rows
+        self.size = len(rows)
+
+        # Colonne numeriche condivise tra gli stage (es. "soil_moisture", "vpd")
+        self.columns: Dict[str, np.ndarray] = {}
+
+        # Risultati per riga (stessa forma di PipelineContext)
+        self.cleaned_data: List[Dict[str, Any]] = []
+        self.features: List[Dict[str, Any]] = []
+        self.estimation: List[Dict[str, Any]] = []
+        self.anomalies: List[List[Dict[str, Any]]] = [[] for _ in rows]
+        self.suggestions: List[Dict[str, Any]] = []
+
+        # Metadata
+        self.started_at = datetime.utcnow()
+        self.completed_at: Optional[datetime] = None
+        self.duration_ms: Optional[float] = None
+        self.warnings: List[List[str]] = [[] for _ in rows]
+        self.stage_results: Dict[str, Dict[str, Any]] = {}
+
+    def add_warning(self, index: int, stage: str, message: str):
+        """Aggiungi warning alla riga indicata"""
+        self.warnings[index].append(f"[{stage}] {message}")
+
+    def set_stage_result(self, stage: PipelineStage, status: PipelineStatus, data: List[Dict[str, Any]],
+                         duration_ms: Optional[float] = None):
+        """Salva il risultato di uno stage (una voce 'data' per riga, durata dell'intero batch)"""
+        self.stage_results[stage.value] = {
+            "status": status.value,
+            "data": data,
+            "timestamp": datetime.utcnow().isoformat(),
+            "duration_ms": duration_ms
+        }
+
+    def complete(self):
+        """Marca il batch come completato"""
+        self.completed_at = datetime.utcnow()
+
+    def to_contexts(self) -> List[PipelineContext]:
+        """Ricostruisce un PipelineContext per riga, identico a quello del percorso scalare"""
+        contexts = []
+        for i, raw in enumerate(self.rows):
+            ctx = PipelineContext(raw)
+            ctx.cleaned_data = self.cleaned_data[i] if self.cleaned_data else None
+            ctx.features = self.features[i] if self.features else None
+            ctx.estimation = self.estimation[i] if self.estimation else None
+            ctx.anomalies = self.anomalies[i]
+            ctx.suggestions = self.suggestions[i] if self.suggestions else None
+            ctx.started_at = self.started_at
+            ctx.completed_at = self.completed_at
+            ctx.duration_ms = self.duration_ms
+            ctx.warnings = self.warnings[i]
+            ctx.stage_results = {
+                stage: {**res, "data": res["data"][i]}
+                for stage, res in self.stage_results.items()
+            }
+            contexts.append(ctx)
+        return contexts
+
+
+def round_column(values: np.ndarray, ndigits: int,
+                 exact: Optional[Callable[[int], float]] = None) -> np.ndarray:
+    """
+    Arrotonda una colonna con lo stesso risultato di round() di Python.
+    np.round può divergere sui valori a metà tra due arrotondamenti: quei pochi
+    casi vengono ricalcolati con round() oppure con la funzione scalare 'exact'
+    (necessaria quando il valore deriva da exp/pow, che NumPy calcola diversamente da math).
+    """
+    values = np.asarray(values, dtype=float)
+    rounded = np.round(values, ndigits)
+    scaled = values * (10.0 ** ndigits)
+    near_tie = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_tie):
+        rounded[i] = exact(int(i)) if exact else round(float(values[i]), ndigits)
+    return rounded
+
+
 class ProcessorBase(ABC):
     """
     Classe base per tutti i processori della pipeline.
-    Implementa pattern Chain of Responsibility.
+    Ogni processore esegue un solo stage; 'depends_on' elenca gli stage
+    che devono essere riusciti perché abbia senso eseguirlo.
+    Le istanze sono condivise tra richieste (vedi PipelineRegistry):
+    lo stato di una richiesta va salvato solo nel PipelineContext.
     """
     
-    def __init__(self, name: str):
+    # Stage che devono essere riusciti prima di eseguire questo
+    depends_on: Tuple[PipelineStage, ...] = ()
+    
+    def __init__(self, name: str, verbose: Optional[bool] = None):
         self.name = name
-        self._next_processor: Optional['ProcessorBase'] = None
-        
-    def set_next(self, processor: 'ProcessorBase') -> 'ProcessorBase':
-        """Imposta il prossimo processore nella catena"""
-        self._next_processor = processor
-        return processor
+        self.verbose = PIPELINE_VERBOSE if verbose is None else verbose
         
     def process(self, context: PipelineContext) -> PipelineContext:
         """
-        Processa il contesto e passa al prossimo se esiste.
+        Esegue lo stage sul contesto e ne registra esito e durata.
         Template Method Pattern.
         """
+        stage = self._get_stage()
+        started = time.perf_counter()
         try:
-            print(f" [{self.name}] Processando...")
+            self._log("Processando...")
             
             # Esegui la logica specifica del processore
             result = self._execute(context)
             
             # Salva risultato
-            stage = self._get_stage()
+            elapsed = time.perf_counter() - started
             context.set_stage_result(
                 stage,
                 PipelineStatus.SUCCESS if not context.errors else PipelineStatus.WARNING,
-                result
+                result,
+                duration_ms=round(elapsed * 1000, 3)
             )
+            stage_metrics.observe(stage.value, elapsed)
             
-            print(f" [{self.name}] Completato")
+            self._log("Completato")
             
         except Exception as e:
-            print(f" [{self.name}] Errore: {str(e)}")
+            elapsed = time.perf_counter() - started
+            self._log(f"Errore: {str(e)}")
             context.add_error(self.name, str(e))
             context.set_stage_result(
-                self._get_stage(),
+                stage,
                 PipelineStatus.ERROR,
-                {"error": str(e)}
+                {"error": str(e)},
+                duration_ms=round(elapsed * 1000, 3)
             )
-            
-        # Passa al prossimo processore
-        if self._next_processor:
-            return self._next_processor.process(context)
+            stage_metrics.observe(stage.value, elapsed, error=True)
             
         return context
+
+    def skip(self, context: PipelineContext, missing: List[PipelineStage]) -> PipelineContext:
+        """Registra lo stage come saltato perché le dipendenze non sono disponibili"""
+        self._log("Saltato")
+        context.set_stage_result(
+            self._get_stage(),
+            PipelineStatus.SKIPPED,
+            {"reason": "Dipendenze non soddisfatte", "missing": [m.value for m in missing]}
+        )
+        return context
+
+    def process_batch(self, batch: PipelineBatch) -> PipelineBatch:
+        """
+        Variante vettoriale di process(): esegue lo stage su tutte le righe del batch.
+        """
+        stage = self._get_stage()
+        started = time.perf_counter()
+        try:
+            result = self._execute_batch(batch)
+        except Exception as e:
+            elapsed = time.perf_counter() - started
+            batch.set_stage_result(stage, PipelineStatus.ERROR, [{"error": str(e)}] * batch.size,
+                                   duration_ms=round(elapsed * 1000, 3))
+            stage_metrics.observe(f"{stage.value}.batch", elapsed, error=True)
+            raise
+        elapsed = time.perf_counter() - started
+        batch.set_stage_result(stage, PipelineStatus.SUCCESS, result, duration_ms=round(elapsed * 1000, 3))
+        # Durata dell'intero batch: istogramma separato da quello per richiesta
+        stage_metrics.observe(f"{stage.value}.batch", elapsed)
+        return batch
+
+    def _log(self, message: str):
+        """Stampa l'avanzamento dello stage solo se richiesto"""
+        if self.verbose:
+            print(f" [{self.name}] {message}")
         
     @abstractmethod
     def _execute(self, context: PipelineContext) -> Dict[str, Any]:
@@ -144,6 +287,13 @@ class ProcessorBase(ABC):
         """
         pass
         
+    def _execute_batch(self, batch: PipelineBatch) -> List[Dict[str, Any]]:
+        """
+        Logica vettoriale del processore.
+        Ritorna la voce 'data' dello stage per ogni riga del batch.
+        """
+        raise NotImplementedError(f"{self.name} non supporta la modalità batch")
+
     @abstractmethod
     def _get_stage(self) -> PipelineStage:
         """Ritorna lo stage della pipeline"""
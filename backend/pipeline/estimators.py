@@ -1,7 +1,8 @@
-from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from abc import ABC
+from typing import Dict, Any, Optional, List
 from enum import Enum
-from .base import ProcessorBase, PipelineContext, PipelineStage
+import numpy as np
+from .base import ProcessorBase, PipelineContext, PipelineBatch, PipelineStage, round_column
 
 class PlantType(str, Enum):
     TOMATO = "tomato"; POTATO = "potato"; PEACH = "peach"; GRAPE = "grape"; PEPPER = "pepper"; GENERIC = "generic"
@@ -15,8 +16,26 @@ class IrrigationDecision(str, Enum):
     WATER_MODERATE = "water_moderate" 
 
 class IrrigationStrategy(ABC):
-    @abstractmethod
-    def estimate(self, cleaned_data: Dict[str, Any], features: Dict[str, Any]) -> Dict[str, Any]: pass
+    # Parametri della strategia (definiti dalle sottoclassi)
+    TARGET: float = 0.0        # Litri per ciclo
+    CONFIDENCE: float = 0.5
+    PLANT_TYPE: str = "generic"
+
+    def estimate(self, cleaned_data: Dict[str, Any], features: Dict[str, Any]) -> Dict[str, Any]:
+        added = cleaned_data.get("water_added_24h", 0.0)
+        amt, dec = self._calculate_budget(self.TARGET, added)
+        return {"should_water": dec != IrrigationDecision.DO_NOT_WATER, "decision": dec.value, "water_amount_ml": amt * 1000, "confidence": self.CONFIDENCE, "reasoning": self._reasoning(added), "plant_type": self.PLANT_TYPE}
+
+    def estimate_batch(self, added: np.ndarray, added_raw: List[Any]) -> List[Dict[str, Any]]:
+        """Variante vettoriale di estimate(): 'added' sono i litri versati per riga."""
+        amounts, decisions = self._calculate_budget_batch(self.TARGET, added)
+        return [
+            {"should_water": dec != IrrigationDecision.DO_NOT_WATER.value, "decision": dec, "water_amount_ml": amt * 1000, "confidence": self.CONFIDENCE, "reasoning": self._reasoning(raw), "plant_type": self.PLANT_TYPE}
+            for amt, dec, raw in zip(amounts.tolist(), decisions.tolist(), added_raw)
+        ]
+
+    def _reasoning(self, added) -> str:
+        return f"Target Ciclo: {self.TARGET}L."
     
     # LOGICA PURA: FABBISOGNO CICLO - VERSATO CICLO
     def _calculate_budget(self, cycle_need_liters, added_cycle_liters):
@@ -31,52 +50,48 @@ class IrrigationStrategy(ABC):
             
         return round(missing, 1), decision
 
+    def _calculate_budget_batch(self, cycle_need_liters, added_cycle_liters: np.ndarray):
+        missing = cycle_need_liters - added_cycle_liters
+        skip = missing <= 0.2
+        amounts = np.where(skip, 0.0, round_column(missing, 1))
+        decisions = np.where(skip, IrrigationDecision.DO_NOT_WATER.value,
+                             np.where(missing < 1.0, IrrigationDecision.WATER_INTEGRATION.value,
+                                      IrrigationDecision.WATER_STANDARD.value))
+        return amounts, decisions
+
 
 #STRATEGIE PER LE DIVERSE PIANTE PRESENTI
 class TomatoStrategy(IrrigationStrategy):
-    def estimate(self, cleaned_data: Dict[str, Any], features: Dict[str, Any]) -> Dict[str, Any]:
-        added = cleaned_data.get("water_added_24h", 0.0) 
-        # Target per ciclo (es. 4 Litri ogni 3 giorni)
-        TARGET = 4.0 
-        amt, dec = self._calculate_budget(TARGET, added)
-        return {"should_water": dec != IrrigationDecision.DO_NOT_WATER, "decision": dec.value, "water_amount_ml": amt * 1000, "confidence": 0.95, "reasoning": f"Target Ciclo: {TARGET}L. Versati: {added}L.", "plant_type": "tomato"}
+    # Target per ciclo (es. 4 Litri ogni 3 giorni)
+    TARGET = 4.0; CONFIDENCE = 0.95; PLANT_TYPE = "tomato"
+
+    def _reasoning(self, added) -> str:
+        return f"Target Ciclo: {self.TARGET}L. Versati: {added}L."
 
 class PotatoStrategy(IrrigationStrategy):
-    def estimate(self, cleaned_data: Dict[str, Any], features: Dict[str, Any]) -> Dict[str, Any]:
-        added = cleaned_data.get("water_added_24h", 0.0)
-        TARGET = 3.5
-        amt, dec = self._calculate_budget(TARGET, added)
-        return {"should_water": dec != IrrigationDecision.DO_NOT_WATER, "decision": dec.value, "water_amount_ml": amt * 1000, "confidence": 0.9, "reasoning": f"Target Ciclo: {TARGET}L. Versati: {added}L.", "plant_type": "potato"}
+    TARGET = 3.5; CONFIDENCE = 0.9; PLANT_TYPE = "potato"
+
+    def _reasoning(self, added) -> str:
+        return f"Target Ciclo: {self.TARGET}L. Versati: {added}L."
 
 class PepperStrategy(IrrigationStrategy):
-    def estimate(self, cleaned_data: Dict[str, Any], features: Dict[str, Any]) -> Dict[str, Any]:
-        added = cleaned_data.get("water_added_24h", 0.0)
-        TARGET = 3.0
-        amt, dec = self._calculate_budget(TARGET, added)
-        return {"should_water": dec != IrrigationDecision.DO_NOT_WATER, "decision": dec.value, "water_amount_ml": amt * 1000, "confidence": 0.85, "reasoning": f"Target Ciclo: {TARGET}L. Versati: {added}L.", "plant_type": "pepper"}
+    TARGET = 3.0; CONFIDENCE = 0.85; PLANT_TYPE = "pepper"
+
+    def _reasoning(self, added) -> str:
+        return f"Target Ciclo: {self.TARGET}L. Versati: {added}L."
 
 class PeachStrategy(IrrigationStrategy):
-    def estimate(self, cleaned_data: Dict[str, Any], features: Dict[str, Any]) -> Dict[str, Any]:
-        added = cleaned_data.get("water_added_24h", 0.0)
-        TARGET = 10.0 
-        amt, dec = self._calculate_budget(TARGET, added)
-        return {"should_water": dec != IrrigationDecision.DO_NOT_WATER, "decision": dec.value, "water_amount_ml": amt * 1000, "confidence": 0.85, "reasoning": f"Target Ciclo: {TARGET}L.", "plant_type": "peach"}
+    TARGET = 10.0; CONFIDENCE = 0.85; PLANT_TYPE = "peach"
 
 class GrapeStrategy(IrrigationStrategy):
-    def estimate(self, cleaned_data: Dict[str, Any], features: Dict[str, Any]) -> Dict[str, Any]:
-        added = cleaned_data.get("water_added_24h", 0.0)
-        TARGET = 5.0
-        amt, dec = self._calculate_budget(TARGET, added)
-        return {"should_water": dec != IrrigationDecision.DO_NOT_WATER, "decision": dec.value, "water_amount_ml": amt * 1000, "confidence": 0.9, "reasoning": f"Target Ciclo: {TARGET}L.", "plant_type": "grape"}
+    TARGET = 5.0; CONFIDENCE = 0.9; PLANT_TYPE = "grape"
 
 class GenericStrategy(IrrigationStrategy):
-    def estimate(self, cleaned_data: Dict[str, Any], features: Dict[str, Any]) -> Dict[str, Any]:
-        added = cleaned_data.get("water_added_24h", 0.0)
-        TARGET = 2.5
-        amt, dec = self._calculate_budget(TARGET, added)
-        return {"should_water": dec != IrrigationDecision.DO_NOT_WATER, "decision": dec.value, "water_amount_ml": amt * 1000, "confidence": 0.5, "reasoning": f"Target Ciclo: {TARGET}L.", "plant_type": "generic"}
+    TARGET = 2.5; CONFIDENCE = 0.5; PLANT_TYPE = "generic"
 
 class IrrigationEstimator(ProcessorBase):
+    depends_on = (PipelineStage.VALIDATION,)
+
     def __init__(self, plant_type: Optional[str] = None):
         super().__init__("Irrigation Estimator")
         self.strategies = {
@@ -88,9 +103,20 @@ class IrrigationEstimator(ProcessorBase):
         
     def _get_stage(self) -> PipelineStage: return PipelineStage.ESTIMATION
     
+    def _strategy(self) -> IrrigationStrategy:
+        pt = PlantType(self.plant_type) if self.plant_type in [p.value for p in PlantType] else PlantType.GENERIC
+        return self.strategies[pt]
+
     def _execute(self, context: PipelineContext) -> Dict[str, Any]:
         if not context.cleaned_data: raise ValueError("Dati puliti non disponibili.")
-        pt = PlantType(self.plant_type) if self.plant_type in [p.value for p in PlantType] else PlantType.GENERIC
-        estimation = self.strategies[pt].estimate(context.cleaned_data, context.features or {})
+        estimation = self._strategy().estimate(context.cleaned_data, context.features or {})
         context.estimation = estimation
-        return {"estimation": estimation}
\ No newline at end of file
+        return {"estimation": estimation}
+
+    def _execute_batch(self, batch: PipelineBatch) -> List[Dict[str, Any]]:
+        added_raw = [row.get("water_added_24h", 0.0) for row in batch.cleaned_data]
+        added = np.array(added_raw, dtype=float)
+        estimations = self._strategy().estimate_batch(added, added_raw)
+        batch.columns["water_amount_ml"] = np.array([e["water_amount_ml"] for e in estimations], dtype=float)
+        batch.estimation = estimations
+        return [{"estimation": e} for e in estimations]
\ No newline at end of file
@@ -3,13 +3,15 @@ Step 2: Feature Engineering
 Crea feature derivate AVANZATE (VPD, AWC, Disease Risk).
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, List
 from datetime import datetime, time
 import math
-from .base import ProcessorBase, PipelineContext, PipelineStage
+import numpy as np
+from .base import ProcessorBase, PipelineContext, PipelineBatch, PipelineStage, round_column
 
 
 class FeatureEngineer(ProcessorBase):
+    depends_on = (PipelineStage.VALIDATION,)
     
     def __init__(self):
         super().__init__("Feature Engineer")
@@ -80,6 +82,90 @@ class FeatureEngineer(ProcessorBase):
         context.features = features
         return {"features": features}
 
+    def _execute_batch(self, batch: PipelineBatch) -> List[Dict[str, Any]]:
+        """Stesse feature di _execute, calcolate su colonne NumPy"""
+        c = batch.columns
+        moisture, T, RH = c["soil_moisture"], c["temperature"], c["humidity"]
+        light, rain = c["light"], c["rainfall"]
+
+        # --- 1. ANALISI SUOLO (lookup per tipo di terreno distinto) ---
+        props_cache: Dict[str, Dict[str, Any]] = {}
+        props = []
+        for row in batch.cleaned_data:
+            soil_type = row.get("soil", "universale")
+            if soil_type not in props_cache:
+                props_cache[soil_type] = self._get_soil_properties(soil_type)
+            props.append(props_cache[soil_type])
+        retention = np.array([p["retention_factor"] for p in props], dtype=float)
+        fc = np.array([p["field_capacity"] for p in props], dtype=float)
+        wp = np.array([p["wilting_point"] for p in props], dtype=float)
+
+        awc = round_column((moisture - wp) / (fc - wp) * 100, 1)
+        awc = np.where(moisture <= wp, 0.0, np.where(moisture >= fc, 100.0, awc))
+
+        # --- 2. METRICHE CLIMATICHE ---
+        es = 0.6108 * np.exp((17.27 * T) / (T + 237.3))
+        vpd = round_column(es - es * (RH / 100.0), 2,
+                           exact=lambda i: self._calculate_vpd(T[i].item(), RH[i].item()))
+
+        disease_risk = (np.where(RH > 80, 40, np.where(RH > 70, 20, 0))
+                        + np.where((T >= 15) & (T <= 28), 30, 0)
+                        + np.where(vpd < 0.4, 30, 0))
+        disease_risk = np.minimum(100, disease_risk)
+
+        # --- 3. METRICHE STANDARD ---
+        soil_stress = np.maximum(0, 100 - moisture * 2)
+        temp_stress = np.maximum(0, (T - 15) * 3)
+        humidity_stress = np.maximum(0, 100 - RH)
+        stress = np.clip(soil_stress * 0.6 + temp_stress * 0.25 + humidity_stress * 0.15, 0, 100)
+
+        base_et = np.where(T > 0, 16 * np.power(np.maximum(10 * T / 365, 0), 1.5), 0.0)
+        et = base_et * (1 - (RH / 100) * 0.3) * (1 + (light / 100000) * 0.3)
+        et = round_column(np.clip(et, 0, 15), 2,
+                          exact=lambda i: self._estimate_evapotranspiration(T[i].item(), RH[i].item(), light[i].item()))
+
+        comfort = np.clip(100 - (np.abs(T - 21) / 15 * 50 + np.abs(RH - 60) / 40 * 50), 0, 100)
+
+        deficit = round_column(np.maximum(0, (60.0 - moisture) / 10 + et * (1.0 / retention) * 0.5), 2)
+
+        urgency = stress / 10 + deficit * 0.5
+        urgency = np.where(rain > 0, urgency - rain * 0.3, urgency)
+        urgency = np.clip(urgency, 0, 10).astype(int)
+
+        day_phase = self._get_day_phase()
+        season = self._get_season()
+
+        c.update({
+            "soil_retention_factor": retention, "evapotranspiration": et,
+            "water_stress_index": stress, "irrigation_urgency": urgency,
+            "water_deficit": deficit, "climate_comfort_index": comfort,
+        })
+
+        features_rows = [
+            {
+                "soil_retention_factor": p["retention_factor"],
+                "field_capacity": p["field_capacity"],
+                "wilting_point": p["wilting_point"],
+                "soil_behavior": p["description"],
+                "awc_percentage": a,
+                "vpd": v,
+                "disease_risk": d,
+                "water_stress_index": s,
+                "evapotranspiration": e,
+                "day_phase": day_phase,
+                "season": season,
+                "climate_comfort_index": cc,
+                "water_deficit": wd,
+                "irrigation_urgency": u,
+            }
+            for p, a, v, d, s, e, cc, wd, u in zip(
+                props, awc.tolist(), vpd.tolist(), disease_risk.tolist(), stress.tolist(),
+                et.tolist(), comfort.tolist(), deficit.tolist(), urgency.tolist()
+            )
+        ]
+        batch.features = features_rows
+        return [{"features": f} for f in features_rows]
+
     # --- CALCOLI SULLA BASE SCIENTIFICA ---
 
     def _calculate_vpd(self, T, RH):
@@ -0,0 +1,92 @@
+"""
+Metriche di durata degli stage della pipeline.
+Istogramma in-process a bucket esponenziali, condiviso tra le richieste.
+"""
+
+import bisect
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+
+class LatencyHistogram:
+    """
+    Istogramma di durate (secondi) a bucket esponenziali.
+    Memoria costante: i percentili sono stimati per interpolazione nel bucket.
+    """
+
+    # Bucket da 1µs a ~80s, ognuno il 20% più ampio del precedente
+    BOUNDS: List[float] = [1e-6 * (1.2 ** i) for i in range(101)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+
+    def observe(self, seconds: float, error: bool = False):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if error:
+            self.errors += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Stima il quantile q (0..1) in secondi"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= rank:
+                lower = self.BOUNDS[i - 1] if i > 0 else 0.0
+                upper = self.BOUNDS[i] if i < len(self.BOUNDS) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / c)
+            seen += c
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        def ms(v):
+            return round(v * 1000, 3) if v is not None else None
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": ms(self.total / self.count) if self.count else None,
+            "p50_ms": ms(self.percentile(0.50)),
+            "p95_ms": ms(self.percentile(0.95)),
+            "p99_ms": ms(self.percentile(0.99)),
+            "max_ms": ms(self.max) if self.count else None,
+        }
+
+
+class StageMetrics:
+    """Registro thread-safe degli istogrammi per stage"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self.since = datetime.utcnow()
+
+    def observe(self, stage: str, seconds: float, error: bool = False):
+        with self._lock:
+            hist = self._histograms.get(stage)
+            if hist is None:
+                hist = self._histograms[stage] = LatencyHistogram()
+            hist.observe(seconds, error)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "since": self.since.isoformat(),
+                "stages": {stage: h.summary() for stage, h in self._histograms.items()},
+            }
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self.since = datetime.utcnow()
+
+
+stage_metrics = StageMetrics()
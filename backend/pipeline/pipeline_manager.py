@@ -2,29 +2,39 @@
 Pipeline Manager: Orchestratore della pipeline di processing.
 """
 
-from typing import Dict, Any, Optional
-from .base import PipelineContext
+import logging
+import time
+from numbers import Real
+from typing import Dict, Any, Optional, List, Iterable
+from .base import PipelineContext, PipelineBatch, PIPELINE_VERBOSE
+from .metrics import stage_metrics
 from .validators import DataValidator
 from .feature_engineering import FeatureEngineer
 from .estimators import IrrigationEstimator
 from .anomaly_detector import AnomalyDetector
 from .action_generator import ActionGenerator
 
+logger = logging.getLogger(__name__)
+
 
 class PipelineManager:
     """
     Gestisce l'intera pipeline di processing.
-    Implementa Chain of Responsibility collegando tutti i processori.
+    Esegue gli stage in sequenza (iterativamente) rispettando le dipendenze
+    dichiarate da ogni processore: uno stage le cui dipendenze sono fallite
+    viene marcato SKIPPED invece di essere eseguito.
     """
     
-    def __init__(self, plant_type: Optional[str] = None):
+    def __init__(self, plant_type: Optional[str] = None, verbose: Optional[bool] = None):
         """
         Inizializza la pipeline.
         
         Args:
             plant_type: Tipo di pianta (tomato, lettuce, basil, etc.)
+            verbose: Stampa l'avanzamento su stdout (default: env PIPELINE_VERBOSE)
         """
         self.plant_type = plant_type
+        self.verbose = PIPELINE_VERBOSE if verbose is None else verbose
         
         # Crea i processori
         self.validator = DataValidator()
@@ -33,13 +43,18 @@ class PipelineManager:
         self.anomaly_detector = AnomalyDetector()
         self.action_generator = ActionGenerator()
         
-        # Collega la catena (Chain of Responsibility)
-        self.validator.set_next(self.feature_engineer) \
-                      .set_next(self.estimator) \
-                      .set_next(self.anomaly_detector) \
-                      .set_next(self.action_generator)
+        # Ordine di esecuzione degli stage
+        self.processors = [
+            self.validator,
+            self.feature_engineer,
+            self.estimator,
+            self.anomaly_detector,
+            self.action_generator,
+        ]
+        for processor in self.processors:
+            processor.verbose = self.verbose
         
-        print(f"Pipeline inizializzata per pianta: {plant_type or 'generic'}")
+        self._log(f"Pipeline inizializzata per pianta: {plant_type or 'generic'}")
         
     def process(self, sensor_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -51,32 +66,102 @@ class PipelineManager:
         Returns:
             Risultato completo della pipeline con suggerimenti
         """
-        print(f"\n{'='*60}")
-        print("Avvio Pipeline di Processing")
-        print(f"{'='*60}")
+        self._log(f"\n{'='*60}\nAvvio Pipeline di Processing\n{'='*60}")
         
         # Crea contesto
         context = PipelineContext(sensor_data)
+        started = time.perf_counter()
         
         # Esegui pipeline
         try:
-            context = self.validator.process(context)
+            context = self._run_stages(context)
             context.complete()
             
-            print(f"\n{'='*60}")
-            print("Pipeline Completata")
-            print(f"{'='*60}\n")
+            self._log(f"\n{'='*60}\nPipeline Completata\n{'='*60}\n")
             
         except Exception as e:
-            print(f"\n{'='*60}")
             print(f"Pipeline Fallita: {str(e)}")
-            print(f"{'='*60}\n")
             context.add_error("Pipeline", str(e))
             context.complete()
         
+        elapsed = time.perf_counter() - started
+        context.duration_ms = round(elapsed * 1000, 3)
+        stage_metrics.observe("total", elapsed, error=bool(context.errors))
+        
         # Ritorna risultato
         return self._format_output(context)
         
+    def _run_stages(self, context: PipelineContext) -> PipelineContext:
+        """Esecutore iterativo: uno stage alla volta, salto se le dipendenze mancano"""
+        for processor in self.processors:
+            missing = [dep for dep in processor.depends_on if not context.stage_succeeded(dep)]
+            if missing:
+                processor.skip(context, missing)
+            else:
+                processor.process(context)
+        return context
+
+    def process_batch(self, rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Processa molte letture in una sola chiamata, eseguendo gli stage su colonne NumPy.
+        
+        Args:
+            rows: Lista di dizionari con la stessa forma accettata da process()
+            
+        Returns:
+            Lista di risultati, nello stesso ordine e con lo stesso contenuto di
+            [process(row) for row in rows] (a meno dei timestamp)
+        """
+        rows = list(rows)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(rows)
+
+        # Le righe con tipi inattesi seguono il percorso scalare, che ne gestisce gli errori
+        batch_idx, scalar_idx = [], []
+        for i, row in enumerate(rows):
+            (batch_idx if self._is_batchable(row) else scalar_idx).append(i)
+
+        if batch_idx:
+            batch = PipelineBatch([rows[i] for i in batch_idx])
+            started = time.perf_counter()
+            try:
+                for processor in self.processors:
+                    processor.process_batch(batch)
+                batch.complete()
+                elapsed = time.perf_counter() - started
+                batch.duration_ms = round(elapsed * 1000, 3)
+                stage_metrics.observe("total.batch", elapsed)
+                for i, context in zip(batch_idx, batch.to_contexts()):
+                    results[i] = self._format_output(context)
+            except Exception as e:
+                # errore registrato nelle metriche (total.batch e stage.batch) e su ogni riga
+                logger.exception(f"Batch fallito ({str(e)}), ripiego sul percorso scalare")
+                stage_metrics.observe("total.batch", time.perf_counter() - started, error=True)
+                for i in batch_idx:
+                    results[i] = self.process(rows[i])
+                    results[i]["metadata"]["warnings"].append(
+                        f"[PipelineBatch] Batch fallito ({str(e)}): riga elaborata con il percorso scalare"
+                    )
+                    results[i]["metadata"]["batch_fallback"] = True
+
+        for i in scalar_idx:
+            results[i] = self.process(rows[i])
+
+        return results
+
+    def _log(self, message: str):
+        """Stampa messaggi di avanzamento solo in modalità verbose"""
+        if self.verbose:
+            print(message)
+
+    @staticmethod
+    def _is_batchable(row: Dict[str, Any]) -> bool:
+        """Verifica che i campi non numerici abbiano i tipi attesi dal percorso vettoriale"""
+        for field in ("soil", "plant_type"):
+            if field in row and not isinstance(row[field], str):
+                return False
+        added = row.get("water_added_24h", 0.0)
+        return isinstance(added, Real)
+
     def _format_output(self, context: PipelineContext) -> Dict[str, Any]:
         """Formatta output della pipeline"""
         
@@ -105,6 +190,7 @@ class PipelineManager:
             "metadata": {
                 "started_at": context.started_at.isoformat(),
                 "completed_at": context.completed_at.isoformat() if context.completed_at else None,
+                "duration_ms": context.duration_ms,
                 "errors": context.errors,
                 "warnings": context.warnings,
                 "stage_results": context.stage_results
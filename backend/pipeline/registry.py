@@ -0,0 +1,38 @@
+"""
+Registry delle pipeline: una catena pre-collegata per tipo di pianta,
+condivisa tra tutte le richieste.
+"""
+
+from typing import Dict, Optional
+from .estimators import PlantType
+from .pipeline_manager import PipelineManager
+
+
+class PipelineRegistry:
+    """
+    Costruisce una sola volta un PipelineManager per ogni PlantType.
+    I processori non conservano stato di richiesta (tutto vive in PipelineContext),
+    quindi la stessa istanza può servire richieste concorrenti.
+    Il dizionario è popolato nel costruttore e poi solo letto: nessun lock necessario.
+    """
+
+    def __init__(self):
+        self._pipelines: Dict[str, PipelineManager] = {
+            pt.value: PipelineManager(plant_type=pt.value) for pt in PlantType
+        }
+
+    def get(self, plant_type: Optional[str] = None) -> PipelineManager:
+        """
+        Ritorna la pipeline per il tipo di pianta.
+        Tipi non riconosciuti usano la pipeline 'generic' (stessa strategia dell'estimator).
+        """
+        return self._pipelines.get(plant_type or PlantType.GENERIC.value,
+                                   self._pipelines[PlantType.GENERIC.value])
+
+
+pipeline_registry = PipelineRegistry()
+
+
+def get_pipeline(plant_type: Optional[str] = None) -> PipelineManager:
+    """Scorciatoia per pipeline_registry.get()"""
+    return pipeline_registry.get(plant_type)
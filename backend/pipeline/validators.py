@@ -3,10 +3,11 @@ Step 1: Data Validator / Cleaner
 Valida e pulisce i dati in ingresso dai sensori.
 """
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 from datetime import datetime
 import math
-from .base import ProcessorBase, PipelineContext, PipelineStage
+import numpy as np
+from .base import ProcessorBase, PipelineContext, PipelineBatch, PipelineStage
 
 
 class DataValidator(ProcessorBase):
@@ -101,3 +102,98 @@ class DataValidator(ProcessorBase):
             return clamped, f"Valore fuori range per '{field}': {numeric_value} (clamped a {clamped})"
         
         return numeric_value, None
+
+    def _execute_batch(self, batch: PipelineBatch) -> List[Dict[str, Any]]:
+        """Valida e pulisce tutte le righe, un campo (colonna) alla volta"""
+        rows = batch.rows
+        cleaned_rows = [dict(row) for row in rows]
+        # Messaggi per campo: {indice_riga: messaggio}
+        value_issues: Dict[str, Dict[int, str]] = {}
+        missing_issues: Dict[str, Dict[int, str]] = {}
+
+        for field, (min_val, max_val) in self.valid_ranges.items():
+            default = self.default_values[field]
+            raw = [row.get(field) for row in rows]
+            missing = np.fromiter((field not in row for row in rows), dtype=bool, count=batch.size)
+            values, non_numeric = self._to_float_column(raw)
+            # None esplicito = valore non numerico (come float(None) nel percorso scalare)
+            non_numeric |= np.fromiter((v is None for v in raw), dtype=bool, count=batch.size)
+            non_numeric &= ~missing
+
+            with np.errstate(invalid="ignore"):
+                invalid = ~(missing | non_numeric) & ~np.isfinite(values)
+                below = values < min_val
+                above = values > max_val
+
+            column = np.where(missing | non_numeric | invalid, default, values)
+            column = np.where(below, min_val, np.where(above, max_val, column))
+            batch.columns[field] = column
+
+            # Materializza i valori puliti (i valori clampati restano gli estremi del range)
+            clean_values = column.tolist()
+            for i in np.flatnonzero(below).tolist():
+                clean_values[i] = min_val
+            for i in np.flatnonzero(above).tolist():
+                clean_values[i] = max_val
+            for row, value in zip(cleaned_rows, clean_values):
+                row[field] = value
+
+            issues = {}
+            for i in np.flatnonzero(non_numeric).tolist():
+                issues[i] = f"Valore non numerico per '{field}': {raw[i]}"
+            for i in np.flatnonzero(invalid).tolist():
+                issues[i] = f"Valore invalido per '{field}': {raw[i]}"
+            for i in np.flatnonzero(below | above).tolist():
+                clamped = min_val if below[i] else max_val
+                issues[i] = f"Valore fuori range per '{field}': {values[i].item()} (clamped a {clamped})"
+            value_issues[field] = issues
+            missing_issues[field] = {
+                i: f"Campo '{field}' mancante, usato default: {default}"
+                for i in np.flatnonzero(missing).tolist()
+            }
+
+        flagged = set()
+        for issues in (*value_issues.values(), *missing_issues.values()):
+            flagged.update(issues)
+
+        results = []
+        for i, (row, cleaned) in enumerate(zip(rows, cleaned_rows)):
+            issues = []
+            if i in flagged:
+                # Stesso ordine del percorso scalare: campi nell'ordine di arrivo, poi i mancanti
+                issues = [value_issues[f][i] for f in row if f in value_issues and i in value_issues[f]]
+                issues += [missing_issues[f][i] for f in self.valid_ranges if i in missing_issues[f]]
+            for issue in issues:
+                batch.add_warning(i, self.name, issue)
+            results.append({
+                "cleaned_data": cleaned,
+                "issues_found": len(issues),
+                "issues": issues
+            })
+
+        batch.cleaned_data = cleaned_rows
+        return results
+
+    def _to_float_column(self, raw: List[Any]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Converte una colonna di valori grezzi in float.
+        Returns: (valori, maschera_valori_non_numerici)
+        """
+        try:
+            values = np.array(raw, dtype=float)
+            if values.ndim == 1:
+                return values, np.zeros(len(raw), dtype=bool)
+        except (ValueError, TypeError):
+            pass
+
+        # Fallback elemento per elemento (stringhe non numeriche, oggetti, ...)
+        values = np.full(len(raw), np.nan)
+        non_numeric = np.zeros(len(raw), dtype=bool)
+        for i, value in enumerate(raw):
+            if value is None:
+                continue
+            try:
+                values[i] = float(value)
+            except (ValueError, TypeError):
+                non_numeric[i] = True
+        return values, non_numeric
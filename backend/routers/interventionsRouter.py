@@ -2,10 +2,12 @@ from fastapi import APIRouter, Depends, HTTPException, Query, status
 from typing import List, Optional
 
 from utils.auth import get_current_user
-from models.interventionModel import InterventionCreate, InterventionUpdate, InterventionOut
+from models.interventionModel import InterventionCreate, InterventionUpdate, InterventionOut, InterventionBulkIn
 from controllers.interventionsController import (
     list_interventions,
     create_intervention,
+    create_interventions_bulk,
+    INTERVENTIONS_BULK_MAX,
     patch_intervention,
     delete_intervention,
     ALLOWED_TYPES,
@@ -59,6 +61,20 @@ def api_create_intervention(
         raise HTTPException(status_code=404, detail="Pianta non trovata o non accessibile")
     return created
 
+# CREA INTERVENTI IN BLOCCO (più piante)
+@router.post("/interventi/bulk")
+def api_create_interventions_bulk(
+    payload: InterventionBulkIn,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Inserisce molti interventi in una richiesta: { inserted, items: [{index, id}], errors: [{index, error}] }.
+    Gli elementi non validi o su piante non accessibili sono riportati in 'errors'.
+    """
+    if len(payload.items) > INTERVENTIONS_BULK_MAX:
+        raise HTTPException(status_code=413, detail=f"Massimo {INTERVENTIONS_BULK_MAX} interventi per richiesta")
+    return create_interventions_bulk(current_user["id"], payload.items, ordered=payload.ordered)
+
 # PATCH INTERVENTO by ID
 @router.patch("/interventi/{inter_id}", response_model=InterventionOut, response_model_by_alias=True)
 def api_patch_intervention(
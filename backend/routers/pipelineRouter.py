@@ -8,6 +8,7 @@ from models.pipelineModel import (
     PipelineRequest,
     PipelineResponse,
     HealthCheckResponse,
+    PipelineMetricsResponse,
     SensorDataInput
 )
 from controllers.pipelineController import PipelineController
@@ -74,6 +75,21 @@ async def health_check():
     return controller.get_health_check()
 
 
+@router.get("/metrics", response_model=PipelineMetricsResponse, summary="Metriche di durata degli stage")
+async def pipeline_metrics():
+    """
+    Percentili di durata (p50/p95/p99) per ogni stage della pipeline,
+    misurati in-process dall'avvio del worker.
+    Le chiavi '*.batch' si riferiscono a process_batch (durata dell'intero batch;
+    gli errori contano i batch falliti, rielaborati riga per riga),
+    'total' all'intera pipeline per singola richiesta.
+    
+    Returns:
+        Conteggi, errori e percentili in millisecondi per stage
+    """
+    return controller.get_metrics()
+
+
 @router.get("/plants", summary="Lista piante supportate")
 async def list_supported_plants():
     """
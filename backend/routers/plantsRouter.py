@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi.responses import StreamingResponse
 from typing import List
 from pydantic import BaseModel, Field
 
@@ -10,7 +11,8 @@ from controllers.plantsController import (
     calculate_irrigation_for_plant  
 )
 
-from controllers.ai_irrigazione_controller import compute_for_plant, compute_batch
+from controllers.ai_irrigazione_controller import compute_for_plant, compute_batch, compute_batch_stream, \
+    AI_BATCH_MAX_PLANTS
 
 from database import db
 
@@ -81,24 +83,37 @@ def api_delete_plant_image(plant_id: str, current_user: dict = Depends(get_curre
 
 class AIPlantBatchIn(BaseModel):
     plantIds: List[str] = Field(default_factory=list)
+    explain: bool = True  # spiegazione LLM per ogni pianta
 
 
 #ENDPOINT DELLA PIPELINE
 @router.post("/{plant_id}/ai/irrigazione", summary="Analisi AI Irrigazione/Concimazione")
 async def api_ai_irrigazione_per_pianta(
     plant_id: str,
+    refresh: bool = False,
     current_user: dict = Depends(get_current_user)
 ):
     """
     Esegue la pipeline AI v2 (Meteo Reale + Suolo + Concimazione).
+    Se gli input non sono cambiati restituisce il consiglio già calcolato
+    (vedi 'freshness'); refresh=true forza il ricalcolo.
     """
     # Chiama la nuova funzione asincrona nel controller
-    return await calculate_irrigation_for_plant(current_user["id"], plant_id)
+    return await calculate_irrigation_for_plant(current_user["id"], plant_id, refresh=refresh)
 
 
 @router.post("/ai/irrigazione/batch")
-def api_ai_irrigazione_batch(
+async def api_ai_irrigazione_batch(
     payload: AIPlantBatchIn,
     current_user: dict = Depends(get_current_user)
 ):
-    return compute_batch(payload.plantIds, current_user)
\ No newline at end of file
+    """
+    Consiglio AI per più piante, in streaming NDJSON (una riga JSON per pianta,
+    appena pronta): { id, ...risultato } oppure { id, error }.
+    """
+    if len(payload.plantIds) > AI_BATCH_MAX_PLANTS:
+        raise HTTPException(status_code=413, detail=f"Massimo {AI_BATCH_MAX_PLANTS} piante per richiesta")
+    return StreamingResponse(
+        compute_batch_stream(payload.plantIds, current_user["id"], explain=payload.explain),
+        media_type="application/x-ndjson",
+    )
\ No newline at end of file
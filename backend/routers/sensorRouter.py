@@ -1,16 +1,35 @@
 
-from fastapi import APIRouter, Query
+import json
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from controllers.sensor_controller import (
     save_sensor_data,
+    save_sensor_batch,
+    iter_ndjson,
+    SENSOR_BATCH_MAX,
     get_sensor_history,
+    iter_sensor_export,
+    check_export_window,
     get_latest_readings,
     get_sensor_stats
 )
-from models.sensorModel import SensorReading, SensorReadingResponse
+from utils.sensor_series import SENSOR_ROLLUP_POINTS, encode_cursor, decode_cursor
+from models.sensorModel import SensorReading, SensorReadingResponse, SensorBatchResponse
 from typing import Optional, List
 
 router = APIRouter(prefix="/api/sensors", tags=["sensors"])
 
+RESOLUTION_PATTERN = "^(raw|1m|1h|1d|auto)$"
+
+
+def _parse_after(after: Optional[str]):
+    try:
+        return decode_cursor(after) if after else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid 'after' cursor")
+
 
 @router.post("/data", response_model=SensorReadingResponse, summary="Invia dati da sensore")
 async def receive_sensor_data(reading: SensorReading):
@@ -20,16 +39,81 @@ async def receive_sensor_data(reading: SensorReading):
     return await save_sensor_data(reading)
 
 
+@router.post("/data/batch", response_model=SensorBatchResponse, summary="Invia più letture in blocco")
+async def receive_sensor_batch(request: Request):
+    """
+    Letture multiple in una richiesta: array JSON di SensorReading oppure stream
+    NDJSON (Content-Type: application/x-ndjson, una lettura per riga).
+    Le letture non valide sono riportate in 'errors' senza scartare le altre.
+    """
+    if "ndjson" in request.headers.get("content-type", ""):
+        items = []
+        async for item in iter_ndjson(request.stream()):
+            items.append(item)
+            if len(items) > SENSOR_BATCH_MAX:
+                raise HTTPException(status_code=413, detail=f"Max {SENSOR_BATCH_MAX} readings per request")
+    else:
+        try:
+            items = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON body")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of readings")
+        if len(items) > SENSOR_BATCH_MAX:
+            raise HTTPException(status_code=413, detail=f"Max {SENSOR_BATCH_MAX} readings per request")
+    return await save_sensor_batch(items)
+
+
 @router.get("/history", summary="Storico letture sensori")
 async def get_history(
+    response: Response,
     sensor_id: Optional[str] = Query(None, description="ID specifico del sensore"),
     sensor_type: Optional[str] = Query(None, description="Tipo di sensore"),
     location: Optional[str] = Query(None, description="Posizione"),
     hours: int = Query(24, description="Ultime N ore", ge=1, le=720),
-    limit: int = Query(1000, description="Max record", ge=1, le=10000)
+    limit: int = Query(1000, description="Max record", ge=1, le=10000),
+    resolution: str = Query("raw", pattern=RESOLUTION_PATTERN,
+                            description="raw | 1m | 1h | 1d | auto (rollup più grossolano con almeno 'points' punti)"),
+    points: int = Query(SENSOR_ROLLUP_POINTS, description="Punti desiderati con resolution=auto", ge=1, le=10000),
+    after: Optional[str] = Query(None, description="Cursore della pagina successiva (header X-Next-Cursor)")
 ) -> List[dict]:
-    """Recupera lo storico delle letture con filtri opzionali"""
-    return await get_sensor_history(sensor_id, sensor_type, location, hours, limit)
+    """
+    Recupera lo storico delle letture con filtri opzionali, grezze o da rollup.
+    Se la pagina è piena, l'header X-Next-Cursor contiene il valore di 'after' per la successiva.
+    """
+    items = await get_sensor_history(sensor_id, sensor_type, location, hours, limit, resolution, points,
+                                     _parse_after(after))
+    if len(items) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(items[-1]["timestamp"], items[-1]["_id"])
+    return items
+
+
+@router.get("/export", summary="Esporta lo storico in streaming (NDJSON o CSV)")
+async def export_history(
+    sensor_id: Optional[str] = Query(None, description="ID specifico del sensore"),
+    sensor_type: Optional[str] = Query(None, description="Tipo di sensore"),
+    location: Optional[str] = Query(None, description="Posizione"),
+    start: Optional[datetime] = Query(None, description="Inizio (ISO 8601, default: now - hours)"),
+    end: Optional[datetime] = Query(None, description="Fine esclusa (ISO 8601, default: nessuna)"),
+    hours: int = Query(720, description="Ultime N ore se 'start' non è indicato", ge=1, le=24 * 366),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="ndjson | csv"),
+    resolution: str = Query("raw", pattern="^(raw|1m|1h|1d)$", description="raw | 1m | 1h | 1d"),
+    after: Optional[str] = Query(None, description="Riprende dopo questa riga: '<timestamp>_<_id>'")
+):
+    """
+    Tutte le letture della finestra in ordine cronologico, senza limite di righe,
+    scritte man mano dal cursore MongoDB. Senza sensor_id o sensor_type+location
+    la finestra è limitata a SENSOR_EXPORT_UNINDEXED_MAX_HOURS (400 se più ampia).
+    """
+    after_key = _parse_after(after)
+    start = start or datetime.utcnow() - timedelta(hours=hours)
+    check_export_window(resolution, sensor_id, sensor_type, location, start, end)
+    filename = f"sensors_{sensor_id or location or 'all'}_{resolution}.{format}"
+    return StreamingResponse(
+        iter_sensor_export(sensor_id, sensor_type, location, start, end, format, resolution, after_key),
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 @router.get("/latest", summary="Ultime letture per ogni tipo di sensore")
@@ -43,7 +127,8 @@ async def get_latest(
 @router.get("/stats/{sensor_id}", summary="Statistiche per un sensore")
 async def get_stats(
     sensor_id: str,
-    hours: int = Query(24, description="Periodo in ore", ge=1, le=720)
+    hours: int = Query(24, description="Periodo in ore", ge=1, le=720),
+    resolution: str = Query("raw", pattern=RESOLUTION_PATTERN, description="raw | 1m | 1h | 1d | auto")
 ) -> dict:
     """Calcola statistiche aggregate (media, min, max, count)"""
-    return await get_sensor_stats(sensor_id, hours)
+    return await get_sensor_stats(sensor_id, hours, resolution)
@@ -0,0 +1,125 @@
+"""
+Test del backend di rete della cache (utils/cache_backends.RedisBackend) su
+fakeredis: roundtrip dei serializzatori, TTL nativo, clear per namespace,
+fallback a json quando orjson/msgpack non sono installati.
+
+Uso:
+    python -m pytest -q test_cache_backends.py
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+import utils.cache_backends as cache_backends
+from utils.cache_backends import RedisBackend, Serializer
+from utils.ttl_cache import TTLCache
+
+VALUE = [1_700_000_000.5, {"weather": {"temp": 21.5, "rain": None}, "fallbacks": {}, "partial": ["soil"]}]
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis()
+
+
+@pytest.mark.parametrize("kind", ["orjson", "msgpack", "json"])
+def test_roundtrip(client, kind):
+    serializer = Serializer(kind)
+    if serializer.kind != kind:
+        pytest.skip(f"{kind} non installato")
+    backend = RedisBackend(client, "test_roundtrip", serializer=serializer)
+
+    backend.set("cell:1", VALUE, ttl=60)
+    assert backend.get("cell:1") == (True, VALUE)
+    assert backend.contains("cell:1")
+    assert backend.get("cell:2") == (False, None)
+
+    backend.delete("cell:1")
+    assert not backend.contains("cell:1")
+
+
+def test_native_ttl(client):
+    backend = RedisBackend(client, "test_ttl")
+    backend.set("k", VALUE, ttl=0.05)
+    assert 0 < client.pttl(backend._k("k")) <= 50
+
+    time.sleep(0.1)
+    assert backend.get("k") == (False, None)
+
+
+def test_clear_only_own_namespace(client):
+    weather = RedisBackend(client, "weather")
+    soil = RedisBackend(client, "soil")
+    for i in range(5):
+        weather.set(i, VALUE, ttl=60)
+        soil.set(i, VALUE, ttl=60)
+
+    weather.clear()
+    assert not any(weather.contains(i) for i in range(5))
+    assert all(soil.contains(i) for i in range(5))
+
+
+def test_json_fallback_without_optional_serializers(monkeypatch):
+    monkeypatch.setattr(cache_backends, "orjson", None)
+    monkeypatch.setattr(cache_backends, "msgpack", None)
+    for kind in ("orjson", "msgpack", "json"):
+        serializer = Serializer(kind)
+        assert serializer.kind == "json"
+        assert serializer.loads(serializer.dumps(VALUE)) == VALUE
+
+
+def test_unreachable_server_is_a_miss():
+    server = fakeredis.FakeServer()
+    server.connected = False  # ogni comando solleva ConnectionError
+    backend = RedisBackend(fakeredis.FakeRedis(server=server), "test_down")
+
+    backend.set("k", VALUE, ttl=60)
+    assert backend.get("k") == (False, None)
+    assert backend.stats()["errors"] == 2
+
+
+def test_undecodable_value_is_a_miss(client):
+    backend = RedisBackend(client, "test_corrupt", serializer=Serializer("json"))
+    client.set(backend._k("k"), b"\x93\x01\x02")  # es. scritto da msgpack
+    assert backend.get("k") == (False, None)
+    assert backend.stats()["errors"] == 1
+
+
+def test_async_access_runs_off_the_event_loop(client):
+    backend = RedisBackend(client, "test_async")
+    threads = []
+    get, set_ = backend.get, backend.set
+    backend.get = lambda key: threads.append(threading.get_ident()) or get(key)
+    backend.set = lambda key, value, ttl: threads.append(threading.get_ident()) or set_(key, value, ttl)
+    cache = TTLCache("test_async_redis", ttl=60, backend=backend)
+
+    async def loader():
+        return {"temp": 20.0}
+
+    async def scenario():
+        return await cache.get_or_load_async("cell", loader), threading.get_ident()
+
+    value, loop_thread = asyncio.run(scenario())
+    assert value == {"temp": 20.0} and cache.get("cell") == {"temp": 20.0}
+    assert len(threads) == 3 and loop_thread not in threads[:2]
+
+
+def test_ttl_cache_on_redis_backend(client):
+    cache = TTLCache("test_redis_cache", ttl=60, backend=RedisBackend(client, "test_redis_cache"))
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return {"temp": 20.0}
+
+    assert cache.get_or_load("cell", loader) == {"temp": 20.0}
+    assert cache.get_or_load("cell", loader) == {"temp": 20.0}
+    assert calls == [1]
+    # visibile a un altro processo che usa lo stesso server
+    other = TTLCache("test_redis_cache_2", ttl=60, backend=RedisBackend(client, "test_redis_cache"))
+    assert other.get("cell") == {"temp": 20.0}
@@ -0,0 +1,74 @@
+"""
+Test del layer asincrono dei sensori (controllers/sensor_controller) contro un
+mongod locale, su un database usa-e-getta.
+
+Uso:
+    MONGO_TEST_URI=mongodb://localhost:27017 python -m pytest -q test_sensor_async.py
+
+Se il server non è raggiungibile il test viene saltato.
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo import AsyncMongoClient, MongoClient, errors
+
+import controllers.sensor_controller as sensor_controller
+from models.sensorModel import SensorReading
+from utils.sensor_series import SENSOR_SERIES, ROLLUPS, rollup_collection, ensure_sensor_series
+
+MONGO_TEST_URI = os.getenv("MONGO_TEST_URI", "mongodb://localhost:27017")
+TEST_DB = "homegardening_test_sensors"
+
+
+async def _scenario():
+    client = AsyncMongoClient(MONGO_TEST_URI, serverSelectionTimeoutMS=1500, maxPoolSize=20)
+    try:
+        await client.admin.command("ping")
+    except errors.PyMongoError as e:
+        await client.close()
+        pytest.skip(f"mongod non raggiungibile su {MONGO_TEST_URI}: {e}")
+
+    await client.drop_database(TEST_DB)
+    sync_client = MongoClient(MONGO_TEST_URI)
+    ensure_sensor_series(sync_client[TEST_DB])  # time-series + indici, come allo startup
+    sync_client.close()
+    sensor_controller.sensor_readings = client[TEST_DB][SENSOR_SERIES]
+    sensor_controller.sensor_rollups = {r: client[TEST_DB][rollup_collection(r)] for r in ROLLUPS}
+    try:
+        now = datetime.utcnow()
+        readings = [
+            SensorReading(sensor_id="soil_1", sensor_type="soil_moisture", value=v, unit="%",
+                          timestamp=now - timedelta(minutes=10 * i))
+            for i, v in enumerate([40.0, 42.0, 44.0])
+        ] + [SensorReading(sensor_id="temp_1", sensor_type="temperature", value=21.5, unit="°C", timestamp=now)]
+
+        # inserimenti concorrenti sullo stesso pool
+        saved = await asyncio.gather(*(sensor_controller.save_sensor_data(r) for r in readings))
+        assert all(s.status == "success" for s in saved)
+
+        history = await sensor_controller.get_sensor_history(sensor_id="soil_1", hours=1)
+        assert [r["value"] for r in history] == [40.0, 42.0, 44.0]
+        assert history[0]["sensor_id"] == "soil_1" and history[0]["location"] == "garden_zone_1"
+
+        latest = await sensor_controller.get_latest_readings()
+        assert set(latest) == {"soil_moisture", "temperature"}
+        assert latest["soil_moisture"]["value"] == 40.0
+
+        stats = await sensor_controller.get_sensor_stats("soil_1", hours=1)
+        assert stats["count"] == 3 and stats["min_value"] == 40.0 and stats["max_value"] == 44.0
+
+        # rollup aggiornati all'ingestione: stesse statistiche dai bucket orari
+        hourly = await sensor_controller.get_sensor_stats("soil_1", hours=1, resolution="1h")
+        assert hourly["count"] == 3 and hourly["avg_value"] == pytest.approx(42.0)
+        points = await sensor_controller.get_sensor_history(sensor_id="soil_1", hours=1, resolution="1m")
+        assert sum(p["count"] for p in points) == 3
+    finally:
+        await client.drop_database(TEST_DB)
+        await client.close()
+
+
+def test_sensor_controller_async_roundtrip():
+    asyncio.run(_scenario())
@@ -0,0 +1,233 @@
+"""
+Test senza server delle funzioni pure delle letture sensori: cursori di
+paginazione, filtri keyset, intervalli e aggiornamenti dei rollup
+(utils/sensor_series), validazione dei batch, pagine keyset con istanti
+ripetuti (su mongomock se installato) e buffer di scrittura
+(controllers/sensor_controller).
+
+Uso:
+    python -m pytest -q test_sensor_series.py
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+
+import controllers.sensor_controller as sensor_controller
+from controllers.sensor_controller import SensorWriteBuffer, _keyset_page, validate_readings
+from utils.sensor_series import (
+    ROLLUPS, bucket_start, decode_cursor, encode_cursor, flatten_reading, flatten_rollup,
+    keyset_filter, meta_query, pick_resolution, rollup_ops, series_doc,
+)
+
+
+def _doc(sensor_id, value, ts, sensor_type="soil_moisture", location="garden_zone_1"):
+    return series_doc({"sensor_id": sensor_id, "sensor_type": sensor_type, "location": location,
+                       "value": value, "unit": "%", "timestamp": ts})
+
+
+def test_series_doc_roundtrip():
+    ts = datetime(2026, 3, 1, 12, 0)
+    doc = _doc("soil_1", 41.5, ts) | {"_id": ObjectId()}
+    assert doc["meta"] == {"sensor_id": "soil_1", "sensor_type": "soil_moisture", "location": "garden_zone_1"}
+    assert "plant_id" not in doc
+
+    flat = flatten_reading(doc)
+    assert flat["sensor_id"] == "soil_1" and flat["value"] == 41.5 and flat["timestamp"] == ts
+    assert flat["_id"] == str(doc["_id"]) and "meta" not in flat
+
+
+def test_meta_query_skips_empty_filters():
+    assert meta_query(sensor_id="soil_1") == {"meta.sensor_id": "soil_1"}
+    assert meta_query(sensor_type="ph", location="zone", prefix="") == {"sensor_type": "ph", "location": "zone"}
+    assert meta_query() == {}
+
+
+def test_cursor_roundtrip():
+    ts, oid = datetime(2026, 3, 1, 12, 30, 15, 123000), ObjectId()
+    assert decode_cursor(encode_cursor(ts, oid)) == (ts, oid)
+
+
+def test_decode_cursor_normalizes_to_naive_utc():
+    oid = ObjectId()
+    ts = datetime(2026, 3, 1, 14, 0, tzinfo=timezone(timedelta(hours=2)))
+    assert decode_cursor(encode_cursor(ts, oid)) == (datetime(2026, 3, 1, 12, 0), oid)
+
+
+@pytest.mark.parametrize("token", ["", "nope", "2026-03-01T12:00:00_notanobjectid",
+                                   f"notadate_{ObjectId()}"])
+def test_decode_cursor_rejects_invalid_tokens(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token)
+
+
+def test_keyset_filter():
+    ts, oid = datetime(2026, 3, 1), ObjectId()
+    assert keyset_filter("timestamp", (ts, oid), -1) == {
+        "$or": [{"timestamp": {"$lt": ts}}, {"timestamp": ts, "_id": {"$lt": oid}}]
+    }
+    assert keyset_filter("bucket", (ts, oid), 1) == {
+        "$or": [{"bucket": {"$gt": ts}}, {"bucket": ts, "_id": {"$gt": oid}}]
+    }
+
+
+class _AsyncCollection:
+    """Collezione mongomock con l'interfaccia asincrona usata da _keyset_page."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def find(self, query):
+        cursor = self.collection.find(query)
+
+        async def to_list(length=None):
+            return list(cursor)[:length] if length else list(cursor)
+
+        cursor.to_list = to_list
+        return cursor
+
+
+def test_keyset_pages_split_ties_without_gaps():
+    mongomock = pytest.importorskip("mongomock")
+    collection = mongomock.MongoClient().db.readings
+    t0 = datetime(2026, 3, 1, 12)
+    # 3 istanti, 7 letture: pari istante su più sensori
+    docs = [{"_id": ObjectId(), "timestamp": t0 + timedelta(minutes=m), "value": i}
+            for i, m in enumerate([0, 1, 1, 1, 2, 2, 1])]
+    collection.insert_many(docs)
+    expected = sorted(docs, key=lambda d: (d["timestamp"], d["_id"]), reverse=True)
+
+    async def paginate(limit):
+        pages, after = [], None
+        while True:
+            query = {"timestamp": {"$gte": t0}}
+            if after:
+                query.update(keyset_filter("timestamp", after, -1))
+            page = await _keyset_page(_AsyncCollection(collection), query, "timestamp", limit)
+            pages += page
+            if len(page) < limit:
+                return pages
+            after = (page[-1]["timestamp"], page[-1]["_id"])
+
+    for limit in (1, 2, 3, 7, 10):
+        assert [d["_id"] for d in asyncio.run(paginate(limit))] == [d["_id"] for d in expected]
+
+
+def test_bucket_start():
+    ts = datetime(2026, 3, 1, 12, 34, 56, 789000)
+    assert bucket_start(ts, 1) == datetime(2026, 3, 1, 12, 34, 56)
+    assert bucket_start(ts, ROLLUPS["1m"]) == datetime(2026, 3, 1, 12, 34)
+    assert bucket_start(ts, ROLLUPS["1h"]) == datetime(2026, 3, 1, 12)
+    assert bucket_start(ts, ROLLUPS["1d"]) == datetime(2026, 3, 1)
+    aware = datetime(2026, 3, 1, 1, 30, tzinfo=timezone(timedelta(hours=2)))
+    assert bucket_start(aware, ROLLUPS["1d"]) == datetime(2026, 2, 28)
+
+
+@pytest.mark.parametrize("hours, points, expected", [
+    (1, 300, "raw"),
+    (24, 300, "1m"),
+    (720, 300, "1h"),
+    (8760, 300, "1d"),
+    (24, 20, "1h"),
+    (1, 1, "1h"),
+])
+def test_pick_resolution(hours, points, expected):
+    assert pick_resolution(hours, points) == expected
+
+
+def test_rollup_ops_groups_by_sensor_and_bucket():
+    t0 = datetime(2026, 3, 1, 12, 0, 10)
+    docs = [
+        _doc("soil_1", 40.0, t0),
+        _doc("soil_1", 44.0, t0 + timedelta(seconds=30)),
+        _doc("soil_1", 42.0, t0 + timedelta(seconds=20)),  # fuori ordine: non è l'ultima
+        _doc("soil_1", 50.0, t0 + timedelta(minutes=1)),   # intervallo successivo
+        _doc("soil_2", 10.0, t0),
+        _doc("soil_1", None, t0),                          # non numerica: ignorata
+        _doc("soil_1", True, t0),                          # bool: ignorata
+    ]
+    ops = rollup_ops(docs, ROLLUPS["1m"])
+    by_key = {(op._filter["sensor_id"], op._filter["bucket"]): op for op in ops}
+    assert set(by_key) == {
+        ("soil_1", datetime(2026, 3, 1, 12, 0)),
+        ("soil_1", datetime(2026, 3, 1, 12, 1)),
+        ("soil_2", datetime(2026, 3, 1, 12, 0)),
+    }
+
+    op = by_key[("soil_1", datetime(2026, 3, 1, 12, 0))]
+    assert op._upsert
+    assert op._filter == {"sensor_id": "soil_1", "sensor_type": "soil_moisture",
+                          "location": "garden_zone_1", "bucket": datetime(2026, 3, 1, 12, 0)}
+    update = op._doc[0]["$set"]
+    assert update["count"] == {"$add": [{"$ifNull": ["$count", 0]}, 3]}
+    assert update["sum"] == {"$add": [{"$ifNull": ["$sum", 0]}, 126.0]}
+    assert update["min"] == {"$min": ["$min", 40.0]}
+    assert update["max"] == {"$max": ["$max", 44.0]}
+    assert update["last"]["$cond"][1] == 44.0
+    assert update["lastAt"] == {"$max": ["$lastAt", datetime(2026, 3, 1, 12, 0, 40)]}
+
+    assert len(rollup_ops(docs, ROLLUPS["1d"])) == 2
+
+
+def test_flatten_rollup():
+    oid = ObjectId()
+    doc = {"_id": oid, "sensor_id": "soil_1", "sensor_type": "soil_moisture", "location": "z", "unit": "%",
+           "bucket": datetime(2026, 3, 1, 12), "count": 4, "sum": 170.0, "min": 40.0, "max": 45.0, "last": 41.0}
+    point = flatten_rollup(doc, "1h")
+    assert point["_id"] == str(oid) and point["timestamp"] == datetime(2026, 3, 1, 12)
+    assert point["value"] == 42.5 and point["count"] == 4 and point["resolution"] == "1h"
+    assert flatten_rollup({"_id": oid, "count": 0}, "1m")["value"] is None
+
+
+def test_validate_readings_reports_bad_items_by_index():
+    items = [
+        {"sensor_id": "soil_1", "sensor_type": "soil_moisture", "value": 41.0, "unit": "%"},
+        {"sensor_id": "soil_1", "sensor_type": "soil_moisture", "value": "wet", "unit": "%"},
+        {"sensor_type": "temperature", "value": 21.0, "unit": "°C"},
+        {"sensor_id": "temp_1", "sensor_type": "temperature", "value": 21.5, "unit": "°C",
+         "timestamp": "2026-03-01T12:00:00", "location": "greenhouse"},
+        "not a reading",
+    ]
+    valid, errors = validate_readings(items)
+
+    assert [i for i, _ in valid] == [0, 3]
+    assert valid[1][1].timestamp == datetime(2026, 3, 1, 12) and valid[1][1].location == "greenhouse"
+    assert valid[0][1].location == "garden_zone_1"
+    assert [e["index"] for e in errors] == [1, 2, 4]
+    assert errors[0]["error"].startswith("value:")
+    assert errors[1]["error"].startswith("sensor_id:")
+
+
+def test_validate_readings_all_valid():
+    items = [{"sensor_id": f"s{i}", "sensor_type": "ph", "value": 6.5, "unit": "pH"} for i in range(3)]
+    valid, errors = validate_readings(items)
+    assert [i for i, _ in valid] == [0, 1, 2] and errors == []
+
+
+def test_write_buffer_survives_cancelled_caller(monkeypatch):
+    written = []
+
+    class SlowCollection:
+        async def insert_many(self, docs, ordered=False):
+            await asyncio.sleep(0.05)
+            written.extend(docs)
+
+    async def no_rollups(docs):
+        pass
+
+    monkeypatch.setattr(sensor_controller, "sensor_readings", SlowCollection())
+    monkeypatch.setattr(sensor_controller, "update_rollups", no_rollups)
+    buffer = SensorWriteBuffer(max_size=3, flush_ms=60_000)
+
+    async def scenario():
+        request = asyncio.create_task(buffer.add([{"i": 1}, {"i": 2}, {"i": 3}]))  # riempie la coda
+        await asyncio.sleep(0.01)
+        request.cancel()  # client disconnesso durante la scrittura
+        await buffer.add([{"i": 4}])
+        await buffer.close()
+
+    asyncio.run(scenario())
+    assert sorted(d["i"] for d in written) == [1, 2, 3, 4]
+    assert buffer.stats == {"written": 4, "failed": 0, "flushes": 2}
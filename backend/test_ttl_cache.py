@@ -0,0 +1,184 @@
+"""
+Test della cache condivisa (utils/ttl_cache): eviction LRU e per TTL, budget
+in byte, single-flight tra thread e tra coroutine, refresh in background.
+
+Uso:
+    python -m pytest -q test_ttl_cache.py
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.cache_backends import approx_size
+from utils.ttl_cache import TTLCache
+
+
+class FakeClock:
+    """Sostituisce time.time: il tempo avanza solo con advance()."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(time, "time", fake)
+    return fake
+
+
+def test_lru_eviction_over_max_entries():
+    cache = TTLCache("test_lru", ttl=60, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" diventa la più recente
+    cache.set("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiration(clock):
+    cache = TTLCache("test_ttl", ttl=10)
+    cache.set("k", "v")
+    clock.advance(9)
+    assert cache.get("k") == "v"
+    clock.advance(2)
+    assert cache.get("k") is None
+    stats = cache.stats()
+    assert stats["expirations"] == 1 and stats["misses"] == 1
+
+
+def test_stale_value_served_and_refreshed(clock):
+    refreshed = threading.Event()
+
+    def refresher(key, old):
+        refreshed.set()
+        return old + 1
+
+    cache = TTLCache("test_stale", ttl=10, stale_ttl=30, refresher=refresher)
+    cache.set("k", 1)
+    clock.advance(15)
+
+    assert cache.get("k") == 1  # scaduto ma entro stale_ttl: servito subito
+    assert refreshed.wait(2)
+    for _ in range(100):
+        if cache.freshness("k") and cache.freshness("k") > 0:
+            break
+        time.sleep(0.01)
+    assert cache.get("k") == 2
+    assert cache.stats()["staleHits"] == 1
+
+    clock.advance(100)  # oltre ttl + stale_ttl
+    assert cache.get("k") is None
+
+
+def test_byte_budget():
+    value = {"payload": "x" * 1000}
+    size = approx_size([0.0, value])
+    cache = TTLCache("test_bytes", ttl=60, max_entries=0, max_bytes=3 * size)
+    for i in range(10):
+        cache.set(i, dict(value))
+
+    stats = cache.stats()
+    assert stats["entries"] == 3
+    assert stats["bytes"] <= 3 * size
+    assert stats["evictions"] == 7
+    assert all(i in cache for i in (7, 8, 9))
+
+
+def test_none_is_never_cached():
+    cache = TTLCache("test_none", ttl=60)
+    calls = []
+    assert cache.get_or_load("k", lambda: calls.append(1)) is None
+    assert cache.get_or_load("k", lambda: calls.append(1)) is None
+    assert len(calls) == 2
+
+
+def test_thread_single_flight():
+    cache = TTLCache("test_threads", ttl=60)
+    calls = []
+    release = threading.Event()
+
+    def loader():
+        calls.append(1)
+        release.wait(2)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("k", loader)))
+               for _ in range(10)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)  # tutti i thread in attesa del primo caricamento
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert calls == [1]
+    assert results == ["value"] * 10
+    assert cache.stats()["coalesced"] == 9
+
+
+def test_coroutine_single_flight_survives_cancelled_caller():
+    cache = TTLCache("test_coroutines", ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def scenario():
+        first = asyncio.ensure_future(cache.get_or_load_async("k", loader))
+        others = [asyncio.ensure_future(cache.get_or_load_async("k", loader)) for _ in range(9)]
+        await asyncio.sleep(0.01)
+        first.cancel()  # il chiamante se ne va: il caricamento condiviso prosegue
+        return await asyncio.gather(*others)
+
+    assert asyncio.run(scenario()) == ["value"] * 9
+    assert calls == [1]
+    assert cache.get("k") == "value"
+
+
+def test_async_cacheable_predicate():
+    cache = TTLCache("test_cacheable", ttl=60)
+
+    async def loader():
+        return {"partial": ["nasa"]}
+
+    value = asyncio.run(cache.get_or_load_async("k", loader, cacheable=lambda v: not v.get("partial")))
+    assert value == {"partial": ["nasa"]}
+    assert "k" not in cache
+
+
+def test_async_stale_refresh_error_is_retrieved(clock):
+    cache = TTLCache("test_async_stale", ttl=10, stale_ttl=30)
+    cache.set("k", "old")
+    clock.advance(15)
+    unhandled = []
+
+    async def failing():
+        raise RuntimeError("upstream down")
+
+    async def scenario():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, ctx: unhandled.append(ctx))
+        value = await cache.get_or_load_async("k", failing)
+        for _ in range(10):
+            await asyncio.sleep(0)
+        return value
+
+    assert asyncio.run(scenario()) == "old"
+    assert unhandled == []
+    assert cache.stats()["refreshErrors"] == 1
+    assert cache.get("k") == "old"
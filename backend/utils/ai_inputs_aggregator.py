@@ -1,25 +1,35 @@
 import os
-import time
+import asyncio
 from typing import Optional, Dict, Any
 from datetime import datetime
 import math
+import httpx
 
-from utils.nasa_power_service import get_daily_point, compute_et0_hargreaves
-from utils.weather_service import get_weather as get_openmeteo
-from utils.copernicus_soil_service import get_soil_moisture
+from utils.nasa_power_service import get_daily_point, get_daily_point_async, compute_et0_hargreaves
+from utils.weather_service import get_weather as get_openmeteo, get_weather_async as get_openmeteo_async
+from utils.copernicus_soil_service import get_soil_moisture, get_soil_moisture_async
 from utils.fao_profile_service import get_profile
+from utils.ttl_cache import TTLCache
+from utils.spatial_grid import NASA_POWER_GRID, OPEN_METEO_GRID
 
-_AGG_CACHE: Dict[str, Dict[str, Any]] = {}
 _AGG_TTL = int(os.getenv("AI_AGGR_TTL_SECONDS", "900"))  # 15 min
-_GRID_PREC = int(os.getenv("AI_AGGR_GRID_PRECISION", "2"))
+_AGG_CACHE_BACKEND = os.getenv("AI_AGGR_CACHE_BACKEND")  # memory|redis (default: CACHE_BACKEND)
+_AGG_CACHE_URL = os.getenv("AI_AGGR_CACHE_URL")          # default: CACHE_URL
+_AGG_STALE = int(os.getenv("AI_AGGR_STALE_SECONDS", "3600"))  # finestra stale-while-revalidate
+_AGG_DEADLINE = float(os.getenv("AI_AGGR_DEADLINE_SECONDS", "8"))  # deadline complessiva fan-out async
 
-SENTINELS = {-999, -999.0, -9999, -9999.0}
+# Marcatore per le sorgenti annullate allo scadere della deadline
+_TIMED_OUT = object()
 
-def _key(lat: float, lng: float) -> str:
-    return f"{round(lat, _GRID_PREC)}:{round(lng, _GRID_PREC)}"
+SENTINELS = {-999, -999.0, -9999, -9999.0}
 
-def _expired(e: Dict[str, Any]) -> bool:
-    return time.time() > e.get("expires_at", 0)
+def cell_key(lat: float, lng: float) -> str:
+    """
+    Cella dell'aggregatore per un punto: coppia di celle native NASA POWER /
+    Open-Meteo che lo contengono. Punti con la stessa chiave condividono i dati
+    meteo e suolo (e la voce in cache).
+    """
+    return f"{NASA_POWER_GRID.key(lat, lng)}|{OPEN_METEO_GRID.key(lat, lng)}"
 
 def _parse_dt(dt) -> Optional[datetime]:
     if not dt:
@@ -73,12 +83,143 @@ def _ra_extraterrestrial(lat_deg: float, doy: int) -> Optional[float]:
     except Exception:
         return None
 
-def get_inputs(plant: Dict[str, Any], now: Optional[datetime] = None) -> Dict[str, Any]:
+def _no_geo_value() -> Dict[str, Any]:
+    return {
+        "hadGeo": False,
+        "weather": {
+            "temp": None,
+            "humidity": None,
+            "rainNext24h": None,
+            "precipDaily": None,
+            "et0": None,
+            "solarRadiation": None,
+            "wind": None,
+            "soilMoistureApprox": None,
+            "soilMoisture0to7cm": None,
+            "source": "NONE",
+            "fallbacks": {}
+        },
+        "raw": {}
+    }
+
+def _build_value(lat: float, lng: float, now: datetime,
+                 nasa: Dict[str, Any], om: Dict[str, Any], soil: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Aggrega profilo FAO, NASA POWER (giornaliero), Open-Meteo (orario+daily),
-    Copernicus (suolo) e applica fallback/derivazioni.
+    Combina le tre sorgenti applicando fallback/derivazioni.
+    lat/lng sono il centro della cella: il valore non contiene nulla della pianta.
     """
-    now = now or datetime.utcnow()
+    fallbacks = {}
+
+    #  base meteo
+    temp = om.get("temp") if om.get("temp") is not None else nasa.get("temp")
+    humidity = om.get("humidity") if om.get("humidity") is not None else nasa.get("humidity")
+    rainNext24h = om.get("rainNext24h")
+    # OM daily
+    om_tmin = _san(om.get("dailyTempMin"))
+    om_tmax = _san(om.get("dailyTempMax"))
+    om_pday = _san(om.get("precipDaily"))
+    om_wind_mean = _san(om.get("windMean"))
+
+    # NASA avanzati
+    et0 = _san(nasa.get("et0"))
+    solarRadiation = _san(nasa.get("solarRadiation"))
+    wind = _san(nasa.get("wind"))
+    precipDaily = _san(nasa.get("precipDaily"))
+
+    # precipDaily fallback
+    if precipDaily is None:
+        if om_pday is not None:
+            precipDaily = om_pday
+            fallbacks["precipDaily"] = "open-meteo-daily"
+        elif isinstance(rainNext24h, (int, float)):
+            precipDaily = float(rainNext24h)
+            fallbacks["precipDaily"] = "rainNext24h"
+
+    #  ET0 fallback (Hargreaves) se NASA non disponibile
+    if et0 is None:
+        # prendi Tmin/Tmax/Tmean da NASA, altrimenti OM daily
+        tmin = _san(nasa.get("tempMin")) if nasa.get("tempMin") is not None else om_tmin
+        tmax = _san(nasa.get("tempMax")) if nasa.get("tempMax") is not None else om_tmax
+        tmean = _san(nasa.get("temp"))
+        if tmean is None and tmin is not None and tmax is not None:
+            tmean = (tmin + tmax) / 2.0
+        if tmin is not None and tmax is not None and tmean is not None:
+            et0 = compute_et0_hargreaves(lat, tmin, tmax, tmean, now=now)
+            if et0 is not None:
+                fallbacks["et0"] = "hargreaves(nasa/om)"
+
+    #  wind fallback (media OM 6h)
+    if wind is None and om_wind_mean is not None:
+        wind = om_wind_mean
+        fallbacks["wind"] = "open-meteo(6h-mean)"
+
+    # solarRadiation fallback (Ra stimata informativa)
+    if solarRadiation is None:
+        ra = _ra_extraterrestrial(lat, now.timetuple().tm_yday)
+        if ra is not None:
+            solarRadiation = ra
+            fallbacks["solarRadiation"] = "Ra(FAO-56-estimate)"
+
+    # suolo
+    soil_moisture_0_7 = soil.get("soilMoisture0to7cm")
+    soil_moisture_approx = soil_moisture_0_7
+    if soil_moisture_approx is None:
+        soil_moisture_approx = _estimate_soil_moisture_from_air_humidity(humidity)
+        if soil_moisture_approx is not None:
+            fallbacks["soilMoistureApprox"] = "from-air-humidity"
+
+    return {
+        "hadGeo": True,
+        "weather": {
+            "temp": float(temp) if isinstance(temp, (int, float)) else None,
+            "humidity": float(humidity) if isinstance(humidity, (int, float)) else None,
+            "rainNext24h": float(rainNext24h) if isinstance(rainNext24h, (int, float)) else 0.0,
+
+            "soilMoistureApprox": float(soil_moisture_approx) if isinstance(soil_moisture_approx, (int, float)) else None,
+            "soilMoisture0to7cm": float(soil_moisture_0_7) if isinstance(soil_moisture_0_7, (int, float)) else None,
+
+            "precipDaily": float(precipDaily) if isinstance(precipDaily, (int, float)) else None,
+            "et0": float(et0) if isinstance(et0, (int, float)) else None,
+            "solarRadiation": float(solarRadiation) if isinstance(solarRadiation, (int, float)) else None,
+            "wind": float(wind) if isinstance(wind, (int, float)) else None,
+            "source": "AGGR(NASA+OM+Soil)",
+            "fallbacks": fallbacks
+        },
+        "raw": {
+            "nasa": nasa,
+            "openmeteo": om,
+            "soil": soil
+        }
+    }
+
+def _cell_points(key: str):
+    """Centri delle celle NASA POWER e Open-Meteo indicate dalla chiave."""
+    nasa_key, om_key = key.split("|")
+    return NASA_POWER_GRID.center_of_key(nasa_key), OPEN_METEO_GRID.center_of_key(om_key)
+
+def _fetch_value(key: str, now: datetime) -> Dict[str, Any]:
+    """
+    Valore di una cella: solo meteo e suolo, che dipendono dalla chiave (e dal giorno).
+    Profilo FAO e coordinate della pianta si aggiungono per pianta in _with_plant_fields.
+    """
+    (n_lat, n_lng), (lat, lng) = _cell_points(key)
+    nasa = get_daily_point(n_lat, n_lng, now=now) or {}
+    om   = get_openmeteo(lat, lng) or {}
+    soil = get_soil_moisture(lat, lng) or {}
+    return _build_value(lat, lng, now, nasa, om, soil)
+
+def _refresh_value(key: str, old: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Ricostruisce la voce di una cella dalla sola chiave (refresh/pre-warm in background)."""
+    return _fetch_value(key, datetime.utcnow())
+
+# Cache degli input aggregati per cella: LRU+TTL, single-flight, backend configurabile,
+# stale-while-revalidate e pre-warm delle celle più richieste
+_AGG_CACHE = TTLCache("ai_inputs", ttl=_AGG_TTL,
+                      backend_kind=_AGG_CACHE_BACKEND, backend_url=_AGG_CACHE_URL,
+                      stale_ttl=_AGG_STALE, refresher=_refresh_value)
+
+def _plant_inputs(plant: Dict[str, Any], now: datetime):
+    """Parte dell'input che dipende solo dalla pianta (mai in cache)."""
     lat = plant.get("geoLat")
     lng = plant.get("geoLng")
     had_geo = isinstance(lat, (int, float)) and isinstance(lng, (int, float))
@@ -92,129 +233,90 @@ def get_inputs(plant: Dict[str, Any], now: Optional[datetime] = None) -> Dict[st
     last_dt = _parse_dt(plant.get("lastWateredAt"))
     days_since_last = _days_since(last_dt, now)
     baseline = plant.get("wateringIntervalDays") or _baseline_from_stage(plant.get("stage"))
+    return lat, lng, had_geo, profile, days_since_last, baseline
+
+def _with_plant_fields(value: Dict[str, Any], lat, lng, had_geo: bool, profile: Dict[str, Any],
+                       days_since_last, baseline) -> Dict[str, Any]:
+    """Valore della cella (condiviso) + campi della singola pianta."""
+    out = dict(value)
+    out["geo"] = {"lat": float(lat), "lng": float(lng)} if had_geo else None
+    out["profile"] = profile
+    out["daysSinceLast"] = days_since_last
+    out["baselineInterval"] = baseline
+    return out
+
+def get_inputs(plant: Dict[str, Any], now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Aggrega profilo FAO, NASA POWER (giornaliero), Open-Meteo (orario+daily),
+    Copernicus (suolo) e applica fallback/derivazioni.
+    """
+    now = now or datetime.utcnow()
+    lat, lng, had_geo, profile, days_since_last, baseline = _plant_inputs(plant, now)
 
     if not had_geo:
+        return _with_plant_fields(_no_geo_value(), lat, lng, had_geo, profile, days_since_last, baseline)
+
+    key = cell_key(lat, lng)
+    cached = _AGG_CACHE.get_or_load(key, lambda: _fetch_value(key, now))
+    return _with_plant_fields(cached, lat, lng, had_geo, profile, days_since_last, baseline)
+
+async def get_inputs_async(plant: Dict[str, Any], now: Optional[datetime] = None,
+                           client: Optional[httpx.AsyncClient] = None,
+                           deadline: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Versione non bloccante di get_inputs: NASA POWER, Open-Meteo e suolo
+    sono richiesti in parallelo sullo stesso AsyncClient.
+    Allo scadere di 'deadline' (secondi, default AI_AGGR_DEADLINE_SECONDS) le
+    richieste ancora in corso vengono annullate e si procede con i dati
+    disponibili: le sorgenti mancanti (scadute o in errore) sono elencate in
+    'partial' e il risultato parziale non viene messo in cache.
+    Il caricamento di una cella passa dal single-flight della cache: richieste
+    concorrenti per la stessa cella condividono un solo fan-out.
+    """
+    now = now or datetime.utcnow()
+    lat, lng, had_geo, profile, days_since_last, baseline = _plant_inputs(plant, now)
+
+    if not had_geo:
+        return _with_plant_fields(_no_geo_value(), lat, lng, had_geo, profile, days_since_last, baseline)
+
+    key = cell_key(lat, lng)
+    timeout = _AGG_DEADLINE if deadline is None else deadline
+    (n_lat, n_lng), (c_lat, c_lng) = _cell_points(key)
+
+    async def _fan_out(cli: httpx.AsyncClient) -> Dict[str, Any]:
+        tasks = {
+            "nasa": asyncio.create_task(get_daily_point_async(n_lat, n_lng, now=now, client=cli)),
+            "openmeteo": asyncio.create_task(get_openmeteo_async(c_lat, c_lng, client=cli)),
+            "soil": asyncio.create_task(get_soil_moisture_async(c_lat, c_lng, client=cli)),
+        }
+        done, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+        for t in pending:
+            t.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
         return {
-            "hadGeo": False,
-            "geo": None,
-            "profile": profile,
-            "weather": {
-                "temp": None,
-                "humidity": None,
-                "rainNext24h": None,
-                "precipDaily": None,
-                "et0": None,
-                "solarRadiation": None,
-                "wind": None,
-                "soilMoistureApprox": None,
-                "soilMoisture0to7cm": None,
-                "source": "NONE",
-                "fallbacks": {}
-            },
-            "daysSinceLast": days_since_last,
-            "baselineInterval": baseline,
-            "raw": {}
+            name: (t.result() if t in done and t.exception() is None else _TIMED_OUT if t in pending else None)
+            for name, t in tasks.items()
         }
 
-    key = _key(lat, lng)
-    if key in _AGG_CACHE and not _expired(_AGG_CACHE[key]):
-        cached = _AGG_CACHE[key]["value"]
-    else:
-        nasa = get_daily_point(lat, lng, now=now) or {}
-        om   = get_openmeteo(lat, lng) or {}
-        soil = get_soil_moisture(lat, lng) or {}
-
-        fallbacks = {}
-
-        #  base meteo
-        temp = om.get("temp") if om.get("temp") is not None else nasa.get("temp")
-        humidity = om.get("humidity") if om.get("humidity") is not None else nasa.get("humidity")
-        rainNext24h = om.get("rainNext24h")
-        # OM daily
-        om_tmin = _san(om.get("dailyTempMin"))
-        om_tmax = _san(om.get("dailyTempMax"))
-        om_pday = _san(om.get("precipDaily"))
-        om_wind_mean = _san(om.get("windMean"))
-
-        # NASA avanzati
-        et0 = _san(nasa.get("et0"))
-        solarRadiation = _san(nasa.get("solarRadiation"))
-        wind = _san(nasa.get("wind"))
-        precipDaily = _san(nasa.get("precipDaily"))
-
-        # precipDaily fallback
-        if precipDaily is None:
-            if om_pday is not None:
-                precipDaily = om_pday
-                fallbacks["precipDaily"] = "open-meteo-daily"
-            elif isinstance(rainNext24h, (int, float)):
-                precipDaily = float(rainNext24h)
-                fallbacks["precipDaily"] = "rainNext24h"
-
-        #  ET0 fallback (Hargreaves) se NASA non disponibile
-        if et0 is None:
-            # prendi Tmin/Tmax/Tmean da NASA, altrimenti OM daily
-            tmin = _san(nasa.get("tempMin")) if nasa.get("tempMin") is not None else om_tmin
-            tmax = _san(nasa.get("tempMax")) if nasa.get("tempMax") is not None else om_tmax
-            tmean = _san(nasa.get("temp"))
-            if tmean is None and tmin is not None and tmax is not None:
-                tmean = (tmin + tmax) / 2.0
-            if tmin is not None and tmax is not None and tmean is not None:
-                et0 = compute_et0_hargreaves(lat, tmin, tmax, tmean, now=now)
-                if et0 is not None:
-                    fallbacks["et0"] = "hargreaves(nasa/om)"
-
-        #  wind fallback (media OM 6h)
-        if wind is None and om_wind_mean is not None:
-            wind = om_wind_mean
-            fallbacks["wind"] = "open-meteo(6h-mean)"
-
-        # solarRadiation fallback (Ra stimata informativa)
-        if solarRadiation is None:
-            ra = _ra_extraterrestrial(lat, now.timetuple().tm_yday)
-            if ra is not None:
-                solarRadiation = ra
-                fallbacks["solarRadiation"] = "Ra(FAO-56-estimate)"
-
-        # suolo
-        soil_moisture_0_7 = soil.get("soilMoisture0to7cm")
-        soil_moisture_approx = soil_moisture_0_7
-        if soil_moisture_approx is None:
-            soil_moisture_approx = _estimate_soil_moisture_from_air_humidity(humidity)
-            if soil_moisture_approx is not None:
-                fallbacks["soilMoistureApprox"] = "from-air-humidity"
-
-        value = {
-            "hadGeo": True,
-            "geo": {"lat": lat, "lng": lng},
-            "profile": profile,
-            "weather": {
-                "temp": float(temp) if isinstance(temp, (int, float)) else None,
-                "humidity": float(humidity) if isinstance(humidity, (int, float)) else None,
-                "rainNext24h": float(rainNext24h) if isinstance(rainNext24h, (int, float)) else 0.0,
-
-                "soilMoistureApprox": float(soil_moisture_approx) if isinstance(soil_moisture_approx, (int, float)) else None,
-                "soilMoisture0to7cm": float(soil_moisture_0_7) if isinstance(soil_moisture_0_7, (int, float)) else None,
-
-                "precipDaily": float(precipDaily) if isinstance(precipDaily, (int, float)) else None,
-                "et0": float(et0) if isinstance(et0, (int, float)) else None,
-                "solarRadiation": float(solarRadiation) if isinstance(solarRadiation, (int, float)) else None,
-                "wind": float(wind) if isinstance(wind, (int, float)) else None,
-                "source": "AGGR(NASA+OM+Soil)",
-                "fallbacks": fallbacks
-            },
-            "raw": {
-                "nasa": nasa,
-                "openmeteo": om,
-                "soil": soil
-            }
-        }
-        _AGG_CACHE[key] = {"value": value, "expires_at": time.time() + _AGG_TTL}
-        cached = value
+    async def _load() -> Dict[str, Any]:
+        # il task di caricamento (o di refresh di una voce stale) può sopravvivere
+        # alla richiesta: se il client del chiamante è già chiuso se ne apre uno proprio
+        if client is None or client.is_closed:
+            async with httpx.AsyncClient() as cli:
+                results = await _fan_out(cli)
+        else:
+            results = await _fan_out(client)
+
+        sources = {name: (r if isinstance(r, dict) else {}) for name, r in results.items()}
+        value = _build_value(c_lat, c_lng, now, sources["nasa"], sources["openmeteo"], sources["soil"])
+        missing = [name for name, r in results.items() if not isinstance(r, dict)]
+        if missing:
+            value["partial"] = missing
+        return value
 
-    cached = dict(cached)
-    cached["daysSinceLast"] = days_since_last
-    cached["baselineInterval"] = baseline
-    return cached
+    # valore fresco, stale (ricaricato in background) o caricato una sola volta per cella
+    value = await _AGG_CACHE.get_or_load_async(key, _load, cacheable=lambda v: not v.get("partial"))
+    return _with_plant_fields(value, lat, lng, had_geo, profile, days_since_last, baseline)
 
-aggregate_inputs = get_inputs
\ No newline at end of file
+aggregate_inputs = get_inputs
+aggregate_inputs_async = get_inputs_async
\ No newline at end of file
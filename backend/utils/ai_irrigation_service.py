@@ -1,35 +1,12 @@
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 import math
+import numpy as np
 
-# Helpers: fuzzy membership
+# Helpers: fuzzy membership + base di regole compilata (utils/fuzzy_rules.json)
+from utils.fuzzy_rulebase import load_rulebase
 
-def tri(x, a, b, c):
-    """Triangolare."""
-    if x is None:
-        return 0.0
-    if x <= a or x >= c:
-        return 0.0
-    if x == b:
-        return 1.0
-    if x < b:
-        return (x - a) / (b - a + 1e-9)
-    return (c - x) / (c - b + 1e-9)
-
-def trap(x, a, b, c, d):
-    """Trapezoidale."""
-    if x is None:
-        return 0.0
-    if x <= a or x >= d:
-        return 0.0
-    if b <= x <= c:
-        return 1.0
-    if a < x < b:
-        return (x - a) / (b - a + 1e-9)
-    return (d - x) / (d - c + 1e-9)
-
-def clamp01(v):
-    return max(0.0, min(1.0, float(v)))
+RULEBASE = load_rulebase()
 
 # Baseline per stage (fallback)
 def baseline_from_stage(stage: Optional[str]) -> int:
@@ -74,65 +51,14 @@ def _days_since_last(last_dt: Optional[datetime], now: datetime) -> Optional[int
 # Fuzzification
 def fuzzify_inputs(signals: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
     """
-    Ritorna membership per:
+    Ritorna membership per le variabili della base di regole (default):
     - soil: dry, moist, wet
     - rain: low, medium, high
     - ratio (days/baseline): early, due, overdue
     - temp: low, moderate, high
     - et0: low, moderate, high (se disponibile)
     """
-    soil = signals.get("soilMoisture")  # 0..100
-    rain = signals.get("rainNext24h")   # mm
-    ratio = signals.get("ratio")        # daysSinceLast / baselineInterval
-    temp  = signals.get("temp")         # °C
-    et0   = signals.get("et0")          # mm/day approx
-
-    out = {}
-
-    # Suolo (in %)
-    out["soil"] = {
-        "dry":  trap(soil, 0, 15, 30, 45),
-        "moist":tri(soil, 35, 55, 75),
-        "wet":  trap(soil, 70, 80, 100, 110),
-    }
-
-    # Pioggia (mm / 24h)
-    out["rain"] = {
-        "low":    trap(rain, -1, 0, 1.5, 2.5),
-        "medium": tri(rain, 2.0, 3.5, 5.0),
-        "high":   trap(rain, 4.0, 6.0, 10.0, 20.0),
-    }
-
-    # Rapporto giorni/intervallo
-    out["ratio"] = {
-        "early":   trap(ratio, -0.1, 0.0, 0.6, 0.8),
-        "due":     tri(ratio, 0.8, 1.0, 1.2),
-        "overdue": trap(ratio, 1.0, 1.3, 2.0, 3.0),
-    }
-
-    # Temperatura (°C)
-    out["temp"] = {
-        "low":      trap(temp, -5, 0, 10, 15),
-        "moderate": tri(temp, 15, 22, 28),
-        "high":     trap(temp, 26, 30, 36, 42),
-    }
-
-    # ET0 (mm/day) se presente
-    if isinstance(et0, (int, float)):
-        out["et0"] = {
-            "low":      trap(et0, -0.1, 0.0, 1.5, 2.0),
-            "moderate": tri(et0, 1.5, 3.0, 4.5),
-            "high":     trap(et0, 4.0, 5.0, 7.0, 9.0),
-        }
-    else:
-        out["et0"] = {}
-
-    # clamp
-    for grp in out.values():
-        for k, v in list(grp.items()):
-            grp[k] = clamp01(v)
-
-    return out
+    return RULEBASE.memberships(*RULEBASE.fuzzify(signals))
 
 # Rule base
 def evaluate_rules(deg: Dict[str, Dict[str, float]]) -> list:
@@ -140,88 +66,7 @@ def evaluate_rules(deg: Dict[str, Dict[str, float]]) -> list:
     Ritorna lista di regole attivate: [{id, action, weight, because}, ...]
     action ∈ {"irrigate_today","irrigate_tomorrow","skip"}
     """
-    soil = deg.get("soil", {})
-    rain = deg.get("rain", {})
-    ratio = deg.get("ratio", {})
-    temp = deg.get("temp", {})
-    et0  = deg.get("et0", {})
-
-    rules = []
-
-    # R1: rain high OR soil wet -> skip
-    r1 = max(rain.get("high", 0), soil.get("wet", 0))
-    if r1 > 0:
-        rules.append({
-            "id": "R1",
-            "action": "skip",
-            "weight": r1,
-            "because": "Pioggia alta o suolo già bagnato"
-        })
-
-    # R2: rain medium AND soil moist -> irrigate_tomorrow
-    r2 = min(rain.get("medium", 0), soil.get("moist", 0))
-    if r2 > 0:
-        rules.append({
-            "id": "R2",
-            "action": "irrigate_tomorrow",
-            "weight": r2,
-            "because": "Pioggia media e suolo umido → meglio rimandare"
-        })
-
-    # R3: overdue AND rain low AND (soil NOT wet) -> irrigate_today
-    not_wet = 1.0 - soil.get("wet", 0)
-    r3 = min(ratio.get("overdue", 0), rain.get("low", 0), not_wet)
-    if r3 > 0:
-        rules.append({
-            "id": "R3",
-            "action": "irrigate_today",
-            "weight": r3,
-            "because": "Intervallo superato, poca pioggia e suolo non bagnato"
-        })
-
-    # R4: due AND rain low AND (soil NOT wet) -> irrigate_tomorrow
-    r4 = min(ratio.get("due", 0), rain.get("low", 0), not_wet)
-    if r4 > 0:
-        rules.append({
-            "id": "R4",
-            "action": "irrigate_tomorrow",
-            "weight": r4,
-            "because": "Intervallo in arrivo, poca pioggia e suolo non bagnato"
-        })
-
-    # R5: temp high AND soil dry -> irrigate_today
-    r5 = min(temp.get("high", 0), soil.get("dry", 0))
-    if r5 > 0:
-        rules.append({
-            "id": "R5",
-            "action": "irrigate_today",
-            "weight": r5,
-            "because": "Fa caldo e il suolo è secco"
-        })
-
-    # R6 (opzionale): et0 high AND soil dry -> irrigate_today
-    if et0:
-        r6 = min(et0.get("high", 0), soil.get("dry", 0))
-        if r6 > 0:
-            rules.append({
-                "id": "R6",
-                "action": "irrigate_today",
-                "weight": r6,
-                "because": "Evapotraspirazione elevata e suolo secco"
-            })
-
-    # Se nessuna regola ha dato peso, default: skip (peso minimo)
-    if not rules:
-        rules.append({
-            "id": "R0",
-            "action": "skip",
-            "weight": 0.2,
-            "because": "Nessuna condizione critica"
-        })
-
-    # ordina per peso desc
-    rules.sort(key=lambda r: r["weight"], reverse=True)
-    return rules
+    return RULEBASE.fired(RULEBASE.weights(RULEBASE.flatten(deg)))
 
 def aggregate_scores(rules: list) -> Dict[str, float]:
     scores = {"irrigate_today": 0.0, "irrigate_tomorrow": 0.0, "skip": 0.0}
@@ -243,7 +88,7 @@ def build_reason(rules: list, action: str) -> str:
     for r in rules:
         if r["action"] == action:
             return r["because"]
-    return "Regole neutre → nessun intervento urgente"
+    return RULEBASE.neutral_reason
 
 # API principale
 def compute(*, plant: Dict[str, Any], weather: Optional[Dict[str, Any]], now: datetime) -> Dict[str, Any]:
@@ -281,11 +126,11 @@ def compute(*, plant: Dict[str, Any], weather: Optional[Dict[str, Any]], now: da
         "et0": et0,
     }
 
-    deg = fuzzify_inputs(signals)
-    rules = evaluate_rules(deg)
-    scores = aggregate_scores(rules)
-    action, conf = choose_action(scores)
-    reason = build_reason(rules, action)
+    mu, present = RULEBASE.fuzzify(signals)
+    weights = RULEBASE.weights(mu)
+    scores, best, conf, reason_idx = RULEBASE.decide(weights)
+    action = RULEBASE.actions[best]
+    reason = RULEBASE.reason_text(reason_idx, best)
 
     # nextDate (indicativa)
     if action == "irrigate_today":
@@ -312,9 +157,113 @@ def compute(*, plant: Dict[str, Any], weather: Optional[Dict[str, Any]], now: da
             "et0": et0,
         },
         "tech": {  # Dettagli tecnici per il modal
-            "memberships": deg,      # {soil:{dry:..}, rain:{..}, ratio:{..}, temp:{..}, et0:{..}}
-            "rules": rules,          # [{id, action, weight, because}]
-            "actionScores": scores,  # {"irrigate_today":w,..}
+            "memberships": RULEBASE.memberships(mu, present),  # {soil:{dry:..}, rain:{..}, ...}
+            "rules": RULEBASE.fired(weights),                  # [{id, action, weight, because}]
+            "actionScores": dict(zip(RULEBASE.actions, scores)),  # {"irrigate_today":w,..}
         }
     }
-    return result
\ No newline at end of file
+    return result
+
+# Motore batch (vettoriale)
+#
+# Stessa base di regole di compute(), valutata su array NumPy di N piante.
+# NaN equivale a "segnale mancante" (None).
+
+def fuzzy_batch(columns: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Inferenza fuzzy per N piante; columns: segnale → array (vedi RULEBASE.signal_names()).
+    Ritorna array: memberships (N, slot), present (N, variabili), weights (N, regole),
+    scores (N, azioni), action (indice in RULEBASE.actions), confidence (arrotondata
+    come choose_action), reason (indice in RULEBASE.rules, -1 = regola di default).
+    """
+    mu, present = RULEBASE.fuzzify_arrays(columns)
+    w = RULEBASE.weights_arrays(mu)
+    return {"memberships": mu, "present": present, "weights": w, **RULEBASE.decide_arrays(w)}
+
+_OUTPUT_SIGNALS = ("daysSinceLast", "baselineInterval", "rainNext24h", "temp", "humidity", "soilMoisture", "et0")
+
+def _batchable(v) -> bool:
+    """None o numero finito/infinito (non bool, non NaN): gestibile da fuzzy_batch."""
+    return v is None or (isinstance(v, (int, float)) and not isinstance(v, bool) and v == v)
+
+def compute_batch(plants: List[Dict[str, Any]], weathers: List[Optional[Dict[str, Any]]],
+                  now: datetime, detail: bool = True) -> List[Dict[str, Any]]:
+    """
+    Come compute() per N piante (weathers allineato a plants), con l'inferenza
+    fuzzy calcolata in blocco da fuzzy_batch e la sezione 'tech' omessa.
+    Con detail=True usa il ciclo su compute(): i dettagli (dict di membership e
+    regole per pianta) costano quanto l'intera valutazione scalare e il percorso
+    vettoriale non è più veloce (vedi benchmarks/bench_fuzzy_batch.py).
+    Le righe con segnali non numerici o NaN passano da compute().
+    """
+    if detail:
+        return [compute(plant=p, weather=w, now=now) for p, w in zip(plants, weathers)]
+
+    n = len(plants)
+    names = RULEBASE.signal_names()
+    signals = []
+    cols = np.full((len(names), n), math.nan)
+    scalar = []
+    for i, (plant, weather) in enumerate(zip(plants, weathers)):
+        baseline = plant.get("wateringIntervalDays")
+        if not isinstance(baseline, int):
+            baseline = baseline_from_stage(plant.get("stage"))
+        last = plant.get("lastWateredAt")
+        days = _days_since_last(last, now) if isinstance(last, datetime) else None
+        soil = _extract_soil_moisture(weather)
+        rain = weather.get("rainNext24h") if weather else None
+        temp = weather.get("temp") if weather else None
+        et0  = weather.get("et0") if weather else None
+        hum  = weather.get("humidity") if weather else None
+        ratio = None
+        if isinstance(days, int) and baseline and baseline > 0:
+            ratio = days / float(baseline)
+
+        sig = {
+            "daysSinceLast": days,
+            "baselineInterval": baseline,
+            "ratio": ratio,
+            "soilMoisture": soil,
+            "rainNext24h": rain,
+            "temp": temp,
+            "humidity": hum,
+            "et0": et0,
+        }
+        row = [sig.get(k) for k in names]
+        if all(_batchable(v) for v in row):
+            cols[:, i] = [math.nan if v is None else float(v) for v in row]
+        else:
+            scalar.append(i)
+        signals.append(sig)
+
+    fz = fuzzy_batch(dict(zip(names, cols)))
+    actions = fz["action"].tolist()
+    confidence = fz["confidence"].tolist()
+    reasons = fz["reason"].tolist()
+
+    scalar_set = set(scalar)
+    next_dates: Dict[Any, str] = {}  # poche date distinte: isoformat una volta sola
+    results = []
+    for i in range(n):
+        if i in scalar_set:
+            result = compute(plant=plants[i], weather=weathers[i], now=now)
+            result.pop("tech", None)
+            results.append(result)
+            continue
+        sig = signals[i]
+        action = RULEBASE.actions[actions[i]]
+        reason = RULEBASE.reason_text(reasons[i], actions[i])
+
+        step = 0 if action == "irrigate_today" else 1 if action == "irrigate_tomorrow" else max(1, sig["baselineInterval"] // 2)
+        next_date = next_dates.get(step)
+        if next_date is None:
+            next_date = next_dates[step] = (now + timedelta(days=step)).isoformat()
+
+        results.append({
+            "recommendation": action,
+            "reason": reason,
+            "nextDate": next_date,
+            "confidence": confidence[i],
+            "signals": {k: sig[k] for k in _OUTPUT_SIGNALS},
+        })
+    return results
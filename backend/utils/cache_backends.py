@@ -0,0 +1,280 @@
+"""
+Backend di memorizzazione per TTLCache (vedi ttl_cache).
+- memory: dizionario LRU+TTL nel processo (default)
+- redis: key-value di rete condiviso tra i worker uvicorn (Redis o compatibile),
+  valori serializzati con orjson / msgpack / json
+
+Selezione via ENV (default globali, i servizi possono sovrascriverli):
+  CACHE_BACKEND=memory|redis
+  CACHE_URL=redis://localhost:6379/0
+  CACHE_SERIALIZER=orjson|msgpack|json
+"""
+
+import os
+import sys
+import time
+import json
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Hashable, Tuple
+
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_URL = os.getenv("CACHE_URL", "redis://localhost:6379/0")
+CACHE_SERIALIZER = os.getenv("CACHE_SERIALIZER", "orjson").lower()
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "hg:cache")
+
+try:
+    import orjson
+except ImportError:  # opzionale
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # opzionale
+    msgpack = None
+
+try:
+    import redis
+except ImportError:  # opzionale: serve solo con CACHE_BACKEND=redis
+    redis = None
+
+
+def approx_size(value: Any) -> int:
+    """Stima (ricorsiva) dei byte occupati da dict/list/tuple di valori semplici."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(approx_size(v) for v in value)
+    return size
+
+
+class CacheBackend:
+    """
+    Interfaccia comune dei backend.
+    get ritorna (trovato, valore); le scadenze sono gestite dal backend.
+    """
+
+    name = "base"
+    blocking = False  # True se le operazioni fanno I/O (da non eseguire sull'event loop)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        raise NotImplementedError
+
+    def set(self, key: Hashable, value: Any, ttl: float):
+        raise NotImplementedError
+
+    def delete(self, key: Hashable):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def contains(self, key: Hashable) -> bool:
+        return self.get(key)[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+class MemoryBackend(CacheBackend):
+    """LRU + TTL nel processo, con budget su numero di voci e byte stimati."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 0, max_bytes: int = 0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> (value, expires_at, size)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            value, expires_at, size = entry
+            if time.time() > expires_at:
+                del self._data[key]
+                self._bytes -= size
+                self.expirations += 1
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key: Hashable, value: Any, ttl: float):
+        size = approx_size(value) if self.max_bytes else 0
+        expires_at = time.time() + ttl
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            self._evict()
+
+    def _evict(self):
+        """Da chiamare con il lock: rimuove le voci meno usate oltre budget."""
+        while self._data and (
+            (self.max_entries and len(self._data) > self.max_entries)
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            _, (_, _, size) = self._data.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def contains(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and time.time() <= entry[1]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "entries": len(self._data),
+                "bytes": self._bytes if self.max_bytes else None,
+                "maxEntries": self.max_entries or None,
+                "maxBytes": self.max_bytes or None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class Serializer:
+    """dumps/loads verso bytes con la libreria scelta (fallback: json)."""
+
+    def __init__(self, kind: str = CACHE_SERIALIZER):
+        if kind == "orjson" and orjson is not None:
+            self.kind = "orjson"
+            self.dumps = lambda v: orjson.dumps(v, option=orjson.OPT_NON_STR_KEYS)
+            self.loads = orjson.loads
+        elif kind == "msgpack" and msgpack is not None:
+            self.kind = "msgpack"
+            self.dumps = lambda v: msgpack.packb(v, use_bin_type=True)
+            self.loads = lambda b: msgpack.unpackb(b, raw=False, strict_map_key=False)
+        else:
+            self.kind = "json"
+            self.dumps = lambda v: json.dumps(v, separators=(",", ":")).encode()
+            self.loads = json.loads
+
+
+class RedisBackend(CacheBackend):
+    """
+    Backend key-value di rete (API redis-py: get/set(px=...)/delete/scan_iter).
+    Le scadenze usano il TTL nativo; l'eviction è delegata alla maxmemory-policy del server.
+    Accetta un client già costruito (es. fakeredis nei test). Il client è
+    sincrono: dalle coroutine TTLCache lo usa in un thread (vedi 'blocking').
+    """
+
+    name = "redis"
+    blocking = True
+
+    def __init__(self, client, namespace: str, serializer: Optional[Serializer] = None,
+                 prefix: str = CACHE_KEY_PREFIX):
+        self.client = client
+        self.namespace = f"{prefix}:{namespace}:"
+        self.serializer = serializer or Serializer()
+        self.errors = 0
+
+    def _k(self, key: Hashable) -> str:
+        return self.namespace + str(key)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        try:
+            data = self.client.get(self._k(key))
+        except Exception:
+            # backend non raggiungibile → come un miss (i servizi rifanno la chiamata)
+            self.errors += 1
+            return False, None
+        if data is None:
+            return False, None
+        try:
+            return True, self.serializer.loads(data)
+        except Exception:
+            # valore corrotto o scritto con un altro serializzatore → miss (verrà riscritto)
+            self.errors += 1
+            return False, None
+
+    def set(self, key: Hashable, value: Any, ttl: float):
+        try:
+            self.client.set(self._k(key), self.serializer.dumps(value), px=max(1, int(ttl * 1000)))
+        except Exception:
+            self.errors += 1
+
+    def delete(self, key: Hashable):
+        try:
+            self.client.delete(self._k(key))
+        except Exception:
+            self.errors += 1
+
+    def clear(self):
+        try:
+            keys = list(self.client.scan_iter(match=self.namespace + "*"))
+            if keys:
+                self.client.delete(*keys)
+        except Exception:
+            self.errors += 1
+
+    def contains(self, key: Hashable) -> bool:
+        try:
+            return bool(self.client.exists(self._k(key)))
+        except Exception:
+            self.errors += 1
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "serializer": self.serializer.kind,
+            "namespace": self.namespace,
+            "errors": self.errors,
+        }
+
+
+# Un solo client di rete per URL, condiviso dalle cache del processo
+_CLIENTS: Dict[str, Any] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def _redis_client(url: str):
+    if redis is None:
+        raise RuntimeError("CACHE_BACKEND=redis richiede il pacchetto 'redis'")
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(url)
+        if client is None:
+            client = _CLIENTS[url] = redis.Redis.from_url(url, socket_timeout=1.0)
+        return client
+
+
+def make_backend(namespace: str, kind: Optional[str] = None, url: Optional[str] = None,
+                 max_entries: int = 0, max_bytes: int = 0) -> CacheBackend:
+    """
+    Costruisce il backend configurato (kind/url, default da ENV).
+    max_entries/max_bytes valgono solo per il backend in memoria.
+    """
+    kind = (kind or CACHE_BACKEND).lower()
+    if kind == "memory":
+        return MemoryBackend(max_entries=max_entries, max_bytes=max_bytes)
+    if kind == "redis":
+        return RedisBackend(_redis_client(url or CACHE_URL), namespace)
+    raise ValueError(f"CACHE_BACKEND non supportato: {kind}")
@@ -1,25 +1,17 @@
 import os
-import time
 from typing import Optional, Dict, Any
 import httpx
 from datetime import datetime
 
-# Cache in memoria
-_SOIL_CACHE: Dict[str, Dict[str, Any]] = {}
+from utils.open_meteo_service import get_forecast, get_forecast_async
+from utils.ttl_cache import TTLCache
+from utils.spatial_grid import OPEN_METEO_GRID
 
 # Configurabili via ENV
 _SOIL_TTL_SECONDS = int(os.getenv("SOIL_TTL_SECONDS", "1800"))          # 30 min
-_SOIL_GRID_PRECISION = int(os.getenv("SOIL_GRID_PRECISION", "2"))       # 0.01° ≈ ~1km
 
-OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
-HOURLY_VARS = "soil_moisture_0_to_7cm,soil_moisture_7_to_28cm"
-
-def _grid_key(lat: float, lng: float, precision: int = None) -> str:
-    p = _SOIL_GRID_PRECISION if precision is None else precision
-    return f"{round(lat, p)}:{round(lng, p)}"
-
-def _expired(entry: Dict[str, Any]) -> bool:
-    return time.time() > entry.get("expires_at", 0)
+# Cache per cella nativa Open-Meteo (LRU+TTL, thread-safe)
+_SOIL_CACHE = TTLCache("soil", ttl=_SOIL_TTL_SECONDS)
 
 def _parse_om_time(t: str) -> Optional[datetime]:
     """Gestisce anche eventuale suffisso 'Z'."""
@@ -57,46 +49,7 @@ def _to_percent(vol: Optional[float]) -> Optional[float]:
     pct = max(0.0, min(100.0, float(vol) * 100.0))
     return round(pct, 1)
 
-def get_soil_moisture(lat: float, lng: float) -> Optional[Dict[str, Any]]:
-    """
-    Ritorna l'umidità del suolo derivata da ERA5-Land via Open-Meteo (senza token):
-      {
-        "soilMoisture0to7cm": <float %> | None,
-        "soilMoisture7to28cm": <float %> | None,
-        "source": "OPEN-METEO/ERA5-LAND",
-        "raw": {
-          "unit": "m3/m3",
-          "value0to7": <float m3/m3> | None,
-          "value7to28": <float m3/m3> | None,
-          "time": <string ISO> | None
-        }
-      }
-    Se errore → None (l'aggregator farà fallback su stima da RH aria).
-    """
-    # Guardia geo
-    if lat is None or lng is None:
-        return None
-
-    key = _grid_key(lat, lng)
-    if key in _SOIL_CACHE and not _expired(_SOIL_CACHE[key]):
-        return _SOIL_CACHE[key]["value"]
-
-    params = {
-        "latitude": lat,
-        "longitude": lng,
-        "hourly": HOURLY_VARS,
-        "forecast_days": 2,
-        "timezone": "UTC",
-    }
-
-    try:
-        with httpx.Client(timeout=6.0) as cli:
-            r = cli.get(OPEN_METEO_URL, params=params)
-            r.raise_for_status()
-            j = r.json()
-    except Exception:
-        return None
-
+def _parse_soil(j: Dict[str, Any]) -> Dict[str, Any]:
     hourly = j.get("hourly", {}) or {}
     times = hourly.get("time", []) or []
     sm0_list = hourly.get("soil_moisture_0_to_7cm", []) or []
@@ -122,7 +75,7 @@ def get_soil_moisture(lat: float, lng: float) -> Optional[Dict[str, Any]]:
     if times and 0 <= idx < len(times):
         t_str = times[idx]
 
-    value = {
+    return {
         "soilMoisture0to7cm": _to_percent(raw0),
         "soilMoisture7to28cm": _to_percent(raw7),
         "source": "OPEN-METEO/ERA5-LAND",
@@ -134,8 +87,41 @@ def get_soil_moisture(lat: float, lng: float) -> Optional[Dict[str, Any]]:
         }
     }
 
-    _SOIL_CACHE[key] = {
-        "value": value,
-        "expires_at": time.time() + _SOIL_TTL_SECONDS,
-    }
-    return value
\ No newline at end of file
+def get_soil_moisture(lat: float, lng: float) -> Optional[Dict[str, Any]]:
+    """
+    Ritorna l'umidità del suolo derivata da ERA5-Land via Open-Meteo (senza token):
+      {
+        "soilMoisture0to7cm": <float %> | None,
+        "soilMoisture7to28cm": <float %> | None,
+        "source": "OPEN-METEO/ERA5-LAND",
+        "raw": {
+          "unit": "m3/m3",
+          "value0to7": <float m3/m3> | None,
+          "value7to28": <float m3/m3> | None,
+          "time": <string ISO> | None
+        }
+      }
+    Se errore → None (l'aggregator farà fallback su stima da RH aria).
+    La risposta Open-Meteo è condivisa con weather_service (vedi open_meteo_service).
+    """
+    # Guardia geo
+    if lat is None or lng is None:
+        return None
+
+    def _load():
+        j = get_forecast(lat, lng)
+        return _parse_soil(j) if j is not None else None
+
+    return _SOIL_CACHE.get_or_load(OPEN_METEO_GRID.key(lat, lng), _load)
+
+async def get_soil_moisture_async(lat: float, lng: float,
+                                  client: Optional[httpx.AsyncClient] = None) -> Optional[Dict[str, Any]]:
+    """Come get_soil_moisture, ma non bloccante (eventualmente su un AsyncClient condiviso)."""
+    if lat is None or lng is None:
+        return None
+
+    async def _load():
+        j = await get_forecast_async(lat, lng, client=client)
+        return _parse_soil(j) if j is not None else None
+
+    return await _SOIL_CACHE.get_or_load_async(OPEN_METEO_GRID.key(lat, lng), _load)
@@ -0,0 +1,379 @@
+"""
+Base di regole fuzzy dichiarata come dati (JSON o YAML) e compilata all'avvio.
+
+Il file descrive:
+  - actions:   azioni possibili (l'ordine decide i pareggi)
+  - variables: per ogni variabile il segnale di input e gli insiemi fuzzy
+               ["tri", a, b, c] / ["trap", a, b, c, d]; "optional": true se
+               la variabile va ignorata quando il segnale non è numerico
+  - rules:     {"id", "if": {"all"|"any": ["var.set", "not var.set", ...]},
+                "then", "because"}; all = min, any = max
+  - default:   regola usata se nessuna è attiva (id, then, weight, because)
+
+Prima della compilazione il file viene validato: nomi di variabili e insiemi
+devono essere identificatori, i parametri numeri finiti non decrescenti
+(finiscono come costanti nel sorgente generato, vedi RuleBase._generate).
+
+La compilazione assegna a ogni insieme (e ad ogni negazione usata) un indice
+in un vettore piatto di membership; ogni regola diventa (operatore, indici).
+La valutazione non costruisce dict né stringhe: servono solo per i dettagli.
+
+File di default: utils/fuzzy_rules.json, sovrascrivibile via ENV:
+  FUZZY_RULES_PATH=/percorso/regole.json|.yaml
+"""
+
+import os
+import json
+import math
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Tuple
+
+import numpy as np
+
+try:
+    import yaml
+except ImportError:  # opzionale: serve solo per regole in YAML
+    yaml = None
+
+
+DEFAULT_RULES_PATH = Path(__file__).with_name("fuzzy_rules.json")
+FUZZY_RULES_PATH = os.getenv("FUZZY_RULES_PATH", str(DEFAULT_RULES_PATH))
+
+
+# Funzioni di membership (scalari e su array)
+
+def tri(x, a, b, c):
+    """Triangolare."""
+    if x is None:
+        return 0.0
+    if x <= a or x >= c:
+        return 0.0
+    if x == b:
+        return 1.0
+    if x < b:
+        return (x - a) / (b - a + 1e-9)
+    return (c - x) / (c - b + 1e-9)
+
+def trap(x, a, b, c, d):
+    """Trapezoidale."""
+    if x is None:
+        return 0.0
+    if x <= a or x >= d:
+        return 0.0
+    if b <= x <= c:
+        return 1.0
+    if a < x < b:
+        return (x - a) / (b - a + 1e-9)
+    return (d - x) / (d - c + 1e-9)
+
+def clamp01(v):
+    return max(0.0, min(1.0, float(v)))
+
+def tri_np(x: np.ndarray, a, b, c) -> np.ndarray:
+    """Triangolare su array (NaN → 0), stessi casi di tri()."""
+    with np.errstate(invalid="ignore"):
+        up = (x - a) / (b - a + 1e-9)
+        down = (c - x) / (c - b + 1e-9)
+        out = np.where(x < b, up, down)
+        out = np.where(x == b, 1.0, out)
+        out = np.where((x <= a) | (x >= c) | np.isnan(x), 0.0, out)
+    return out
+
+def trap_np(x: np.ndarray, a, b, c, d) -> np.ndarray:
+    """Trapezoidale su array (NaN → 0), stessi casi di trap()."""
+    with np.errstate(invalid="ignore"):
+        up = (x - a) / (b - a + 1e-9)
+        down = (d - x) / (d - c + 1e-9)
+        out = np.where((a < x) & (x < b), up, down)
+        out = np.where((b <= x) & (x <= c), 1.0, out)
+        out = np.where((x <= a) | (x >= d) | np.isnan(x), 0.0, out)
+    return out
+
+SHAPES = {
+    "tri": (tri, tri_np, 3),
+    "trap": (trap, trap_np, 4),
+}
+
+
+def _expr_tri(x: str, a, b, c) -> str:
+    """Espressione Python equivalente a tri(x, a, b, c) (x non None)."""
+    return (f"0.0 if ({x} <= {a!r} or {x} >= {c!r}) else 1.0 if {x} == {b!r} "
+            f"else ({x} - {a!r}) / {b - a + 1e-9!r} if {x} < {b!r} else ({c!r} - {x}) / {c - b + 1e-9!r}")
+
+def _expr_trap(x: str, a, b, c, d) -> str:
+    """Espressione Python equivalente a trap(x, a, b, c, d) (x non None)."""
+    return (f"0.0 if ({x} <= {a!r} or {x} >= {d!r}) else 1.0 if {b!r} <= {x} <= {c!r} "
+            f"else ({x} - {a!r}) / {b - a + 1e-9!r} if {a!r} < {x} < {b!r} else ({d!r} - {x}) / {d - c + 1e-9!r}")
+
+_EXPR = {"tri": _expr_tri, "trap": _expr_trap}
+
+
+def _is_number(v) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v)
+
+def _is_name(v) -> bool:
+    return isinstance(v, str) and v.isidentifier()
+
+
+class RuleBase:
+    """
+    Base di regole compilata.
+    Layout del vettore di membership: prima gli insiemi nell'ordine del file
+    (variabile per variabile), poi i complementi (1 - μ) usati dai 'not'.
+    """
+
+    def __init__(self, spec: Dict[str, Any], source: str = "<dict>"):
+        self.source = source
+        self.version = spec.get("version")
+        self.actions: Tuple[str, ...] = tuple(spec.get("actions") or ())
+        if not self.actions:
+            raise ValueError(f"{source}: 'actions' vuoto")
+
+        # variabili → slot del vettore piatto
+        self.variables: List[Tuple[str, str, bool, Tuple[str, ...]]] = []  # (nome, segnale, opzionale, insiemi)
+        self.slots: Dict[str, int] = {}
+        self._mf = []      # (indice variabile, forma, parametri)
+        for k, (var, vspec) in enumerate((spec.get("variables") or {}).items()):
+            if not _is_name(var):
+                raise ValueError(f"{source}: nome di variabile non valido: {var!r}")
+            signal = vspec.get("signal", var)
+            if not isinstance(signal, str) or not signal:
+                raise ValueError(f"{source}: variabile '{var}': segnale non valido: {signal!r}")
+            sets = vspec.get("sets") or {}
+            if not sets:
+                raise ValueError(f"{source}: variabile '{var}' senza insiemi")
+            for name, shape in sets.items():
+                if not _is_name(name):
+                    raise ValueError(f"{source}: variabile '{var}': nome di insieme non valido: {name!r}")
+                kind, *params = shape if isinstance(shape, list) and shape else (None,)
+                if kind not in SHAPES or len(params) != SHAPES[kind][2]:
+                    raise ValueError(f"{source}: insieme '{var}.{name}' non valido: {shape}")
+                if not all(_is_number(p) for p in params) or list(params) != sorted(params):
+                    raise ValueError(f"{source}: insieme '{var}.{name}': i parametri devono essere "
+                                     f"numeri finiti non decrescenti: {shape}")
+                self.slots[f"{var}.{name}"] = len(self._mf)
+                self._mf.append((k, kind, tuple(params)))
+            self.variables.append((var, signal, bool(vspec.get("optional")), tuple(sets)))
+        self._signals = tuple(v[1] for v in self.variables)
+        self._optional = tuple(k for k, v in enumerate(self.variables) if v[2])
+
+        # regole → (operatore, indici); i 'not' diventano slot complemento
+        self._complements: List[int] = []
+        complement_slot: Dict[int, int] = {}
+        self.rules: List[Tuple[str, str, str]] = []  # (id, azione, motivazione)
+        self.plan: List[Tuple[str, Tuple[int, ...]]] = []  # ("min"|"max", indici)
+        rule_action = []
+        for r in spec.get("rules") or []:
+            rid, action = r.get("id"), r.get("then")
+            if action not in self.actions:
+                raise ValueError(f"{source}: regola {rid}: azione '{action}' sconosciuta")
+            cond = r.get("if") or {}
+            if len(cond) != 1 or next(iter(cond)) not in ("all", "any") or not next(iter(cond.values())):
+                raise ValueError(f"{source}: regola {rid}: 'if' deve essere {{all|any: [termini]}}")
+            op, terms = next(iter(cond.items()))
+            idx = []
+            for term in terms:
+                if not isinstance(term, str):
+                    raise ValueError(f"{source}: regola {rid}: termine non valido: {term!r}")
+                negate = term.startswith("not ")
+                name = term[4:].strip() if negate else term.strip()
+                if name not in self.slots:
+                    raise ValueError(f"{source}: regola {rid}: termine '{name}' sconosciuto")
+                i = self.slots[name]
+                if negate:
+                    if i not in complement_slot:
+                        complement_slot[i] = len(self._mf) + len(self._complements)
+                        self._complements.append(i)
+                    i = complement_slot[i]
+                idx.append(i)
+            self.plan.append(("min" if op == "all" else "max", tuple(idx)))
+            self.rules.append((rid, action, r.get("because", "")))
+            rule_action.append(self.actions.index(action))
+        if not self.rules:
+            raise ValueError(f"{source}: nessuna regola definita")
+
+        self._rule_action = np.array(rule_action)
+        self._rules_by_action = tuple(
+            tuple(k for k, a in enumerate(rule_action) if a == ai) for ai in range(len(self.actions))
+        )
+
+        d = spec.get("default") or {}
+        if d.get("then", self.actions[-1]) not in self.actions:
+            raise ValueError(f"{source}: default: azione '{d.get('then')}' sconosciuta")
+        if not _is_number(d.get("weight", 0.0)) or not 0.0 <= d.get("weight", 0.0) <= 1.0:
+            raise ValueError(f"{source}: default: 'weight' deve essere un numero in [0, 1]")
+        self.default_rule = (d.get("id", "R0"), d.get("then", self.actions[-1]), d.get("because", ""))
+        self.default_weight = float(d.get("weight", 0.0))
+        self._default_action = self.actions.index(self.default_rule[1])
+        self.neutral_reason = spec.get("neutralReason", "")
+
+        self.code = self._generate()
+        ns: Dict[str, Any] = {}
+        exec(compile(self.code, f"<fuzzy rules {source}>", "exec"), ns)
+        self.fuzzify, self.weights, self._scores = ns["fuzzify"], ns["weights"], ns["scores"]
+
+    def _generate(self) -> str:
+        """
+        Sorgente Python delle tre funzioni di valutazione, con costanti e indici
+        già risolti (nessun lookup per nome né chiamata per insieme):
+          fuzzify(signals) -> (mu, present)
+          weights(mu) -> [peso per regola]
+          scores(w) -> [punteggio per azione] (max-aggregation, default se nessuna attiva)
+        """
+        lines = ["def fuzzify(signals):"]
+        n_mf = len(self._mf)
+        for k, (var, signal, optional, _) in enumerate(self.variables):
+            slots = [i for i, (vk, _, _) in enumerate(self._mf) if vk == k]
+            lines.append(f"    x = signals.get({signal!r})")
+            if optional:
+                lines.append(f"    p{k} = isinstance(x, (int, float))")
+                lines.append(f"    if not p{k}:")
+            else:
+                lines.append(f"    p{k} = True")
+                lines.append("    if x is None:")
+            lines.append("        " + " = ".join(f"m{i}" for i in slots) + " = 0.0")
+            lines.append("    else:")
+            for i in slots:
+                _, kind, params = self._mf[i]
+                # clamp01 solo se fuori da [0, 1] (o NaN), stesso risultato
+                lines.append(f"        m{i} = {_EXPR[kind]('x', *params)}")
+                lines.append(f"        if not 0.0 <= m{i} <= 1.0:")
+                lines.append(f"            m{i} = max(0.0, min(1.0, float(m{i})))")
+        mu = [f"m{i}" for i in range(n_mf)] + [f"1.0 - m{j}" for j in self._complements]
+        present = "".join(f"p{k}, " for k in range(len(self.variables)))
+        lines.append(f"    return [{', '.join(mu)}], ({present.rstrip()})")
+
+        terms = []
+        for op, idx in self.plan:
+            args = ", ".join(f"mu[{i}]" for i in idx)
+            terms.append(f"mu[{idx[0]}]" if len(idx) == 1 else f"{op}({args})")
+        lines += ["", "def weights(mu):", f"    return [{', '.join(terms)}]"]
+
+        lines += ["", "def scores(w):", f"    if {' or '.join(f'w[{k}] > 0' for k in range(len(self.rules)))}:"]
+        agg = []
+        for ks in self._rules_by_action:
+            agg.append("0.0" if not ks else f"w[{ks[0]}]" if len(ks) == 1
+                       else f"max({', '.join(f'w[{k}]' for k in ks)})")
+        lines.append(f"        return [{', '.join(agg)}]")
+        default = ["0.0"] * len(self.actions)
+        default[self._default_action] = repr(self.default_weight)
+        lines.append(f"    return [{', '.join(default)}]")
+        return "\n".join(lines) + "\n"
+
+    # Valutazione scalare
+
+    # fuzzify(signals) -> (mu, present) e weights(mu) -> [pesi] sono generate da _generate()
+
+    def decide(self, weights: List[float]) -> Tuple[List[float], int, float, int]:
+        """
+        Aggregazione max per azione, azione scelta e confidenza (come choose_action),
+        indice della regola motivazione (-1 = default).
+        """
+        scores = self._scores(weights)
+        best = max(scores)
+        best_i = scores.index(best)
+        second = sorted(scores)[-2] if len(scores) > 1 else 0.0
+        denom = best + second + 1e-9
+        confidence = float(round(best / denom if denom > 0 else best, 3))
+        reason = -1
+        for k in self._rules_by_action[best_i]:
+            if weights[k] == best and best > 0:
+                reason = k
+                break
+        return scores, best_i, confidence, reason
+
+    # Dettagli (stesse strutture di fuzzify_inputs / evaluate_rules)
+
+    def memberships(self, mu: List[float], present: Tuple[bool, ...]) -> Dict[str, Dict[str, float]]:
+        out, i = {}, 0
+        for k, (var, _, _, sets) in enumerate(self.variables):
+            out[var] = dict(zip(sets, mu[i:i + len(sets)])) if present[k] else {}
+            i += len(sets)
+        return out
+
+    def flatten(self, deg: Dict[str, Dict[str, float]]) -> List[float]:
+        """Da membership annidate (come fuzzify_inputs) al vettore piatto."""
+        mu = [0.0] * len(self._mf)
+        for name, i in self.slots.items():
+            var, s = name.split(".", 1)
+            mu[i] = (deg.get(var) or {}).get(s, 0)
+        mu.extend([1.0 - mu[j] for j in self._complements])
+        return mu
+
+    def fired(self, weights: List[float]) -> List[Dict[str, Any]]:
+        """Regole attive [{id, action, weight, because}] per peso decrescente (R0 se nessuna)."""
+        rules = [
+            {"id": rid, "action": act, "weight": w, "because": because}
+            for w, (rid, act, because) in zip(weights, self.rules)
+            if w > 0
+        ]
+        if not rules:
+            rid, act, because = self.default_rule
+            rules.append({"id": rid, "action": act, "weight": self.default_weight, "because": because})
+        rules.sort(key=lambda r: r["weight"], reverse=True)
+        return rules
+
+    def reason_text(self, reason: int, action: int) -> str:
+        if reason >= 0:
+            return self.rules[reason][2]
+        if action == self._default_action:
+            return self.default_rule[2]
+        return self.neutral_reason
+
+    # Valutazione vettoriale (N piante)
+
+    def signal_names(self) -> Tuple[str, ...]:
+        return self._signals
+
+    def fuzzify_arrays(self, columns: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Matrice (N, slot) di membership da colonne per segnale (float, NaN = mancante)
+        e matrice (N, variabili) di presenza.
+        """
+        cols = [np.asarray(columns[s], dtype=float) for s in self._signals]
+        present = np.stack([
+            ~np.isnan(c) if k in self._optional else np.ones(c.shape, dtype=bool)
+            for k, c in enumerate(cols)
+        ], axis=1)
+        mu = np.stack([np.clip(SHAPES[kind][1](cols[k], *p), 0.0, 1.0) for k, kind, p in self._mf], axis=1)
+        if self._complements:
+            mu = np.concatenate([mu, 1.0 - mu[:, self._complements]], axis=1)
+        return mu, present
+
+    def weights_arrays(self, mu: np.ndarray) -> np.ndarray:
+        return np.stack([
+            (np.min if op == "min" else np.max)(mu[:, list(idx)], axis=1) for op, idx in self.plan
+        ], axis=1)
+
+    def decide_arrays(self, w: np.ndarray) -> Dict[str, np.ndarray]:
+        n = w.shape[0]
+        none_active = ~(w > 0).any(axis=1)
+        scores = np.stack([
+            np.max(w[:, list(ks)], axis=1) if ks else np.zeros(n) for ks in self._rules_by_action
+        ], axis=1)
+        scores[none_active, self._default_action] = self.default_weight
+
+        # argmax = primo massimo nell'ordine di actions (come il sort stabile di choose_action)
+        action = np.argmax(scores, axis=1)
+        best = scores[np.arange(n), action]
+        second = np.sort(scores, axis=1)[:, -2] if scores.shape[1] > 1 else np.zeros(n)
+        conf = best / (best + second + 1e-9)
+        confidence = np.array([round(c, 3) for c in conf.tolist()], dtype=float)
+
+        # motivazione: prima regola (in ordine di file) dell'azione scelta con peso = punteggio
+        match = (self._rule_action[None, :] == action[:, None]) & (w == best[:, None]) & (w > 0)
+        reason = np.where(match.any(axis=1), np.argmax(match, axis=1), -1)
+        return {"scores": scores, "action": action, "confidence": confidence, "reason": reason}
+
+
+def load_rulebase(path: Optional[str] = None) -> RuleBase:
+    """Legge e compila il file di regole (JSON, o YAML se PyYAML è installato)."""
+    path = Path(path or FUZZY_RULES_PATH)
+    text = path.read_text(encoding="utf-8")
+    if path.suffix.lower() in (".yaml", ".yml"):
+        if yaml is None:
+            raise RuntimeError("Regole in YAML richiedono il pacchetto 'pyyaml'")
+        spec = yaml.safe_load(text)
+    else:
+        spec = json.loads(text)
+    return RuleBase(spec, source=str(path))
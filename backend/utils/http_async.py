@@ -0,0 +1,17 @@
+from typing import Optional, Dict, Any
+import httpx
+
+
+async def get_json(url: str, params: Optional[Dict[str, Any]] = None, timeout: float = 6.0,
+                   client: Optional[httpx.AsyncClient] = None) -> Any:
+    """
+    GET asincrono che ritorna il JSON della risposta (solleva su errore HTTP).
+    Se 'client' è passato lo riusa (connessioni condivise), altrimenti ne apre uno dedicato.
+    """
+    if client is None:
+        async with httpx.AsyncClient(timeout=timeout) as cli:
+            r = await cli.get(url, params=params)
+    else:
+        r = await client.get(url, params=params, timeout=timeout)
+    r.raise_for_status()
+    return r.json()
@@ -4,8 +4,16 @@ import httpx
 from datetime import datetime, timezone
 import math
 
+from utils.http_async import get_json
+from utils.ttl_cache import TTLCache
+from utils.spatial_grid import NASA_POWER_GRID
+
 NASA_POWER_BASE = os.getenv("NASA_POWER_BASE_URL", "https://power.larc.nasa.gov")
 NASA_TIMEOUT = float(os.getenv("NASA_POWER_TIMEOUT", "6"))
+NASA_TTL_SECONDS = int(os.getenv("NASA_POWER_TTL_SECONDS", "10800"))  # 3h (dato giornaliero)
+
+# Cache per cella nativa NASA POWER e giorno (la richiesta è fatta sul centro cella)
+_NASA_CACHE = TTLCache("nasa_power", ttl=NASA_TTL_SECONDS)
 
 SENTINELS = {-999, -999.0, -9999, -9999.0}
 
@@ -56,55 +64,82 @@ def _first_value(d: Optional[Dict[str, Any]]) -> Optional[float]:
 def _san(v):
     return None if (v is None or v in SENTINELS) else float(v)
 
+def _daily_point_request(lat: float, lng: float, now: datetime):
+    ymd = now.strftime("%Y%m%d")
+    params = ",".join([
+        "T2M", "T2M_MIN", "T2M_MAX",
+        "RH2M", "WS2M",
+        "ALLSKY_SFC_SW_DWN",
+        "PRECTOTCORR"
+    ])
+    url = (
+        f"{NASA_POWER_BASE}/api/temporal/daily/point"
+        f"?parameters={params}&start={ymd}&end={ymd}"
+        f"&latitude={lat}&longitude={lng}&community=AG&format=JSON"
+    )
+    return url, ymd
+
+def _parse_daily_point(j: Dict[str, Any], lat: float, now: datetime, ymd: str) -> Dict[str, Any]:
+    data = j.get("properties", {}).get("parameter", {})
+    t_mean = _san(_first_value(data.get("T2M")))
+    t_min  = _san(_first_value(data.get("T2M_MIN")))
+    t_max  = _san(_first_value(data.get("T2M_MAX")))
+    rh     = _san(_first_value(data.get("RH2M")))
+    ws     = _san(_first_value(data.get("WS2M")))
+    rs     = _san(_first_value(data.get("ALLSKY_SFC_SW_DWN")))  # MJ/m2/day
+    pr     = _san(_first_value(data.get("PRECTOTCORR")))        # mm/day
+
+    et0 = None
+    if t_min is not None and t_max is not None and t_mean is not None:
+        et0 = compute_et0_hargreaves(lat, t_min, t_max, t_mean, now=now)
+
+    return {
+        "temp": t_mean if isinstance(t_mean, float) else None,
+        "tempMin": t_min if isinstance(t_min, float) else None,
+        "tempMax": t_max if isinstance(t_max, float) else None,
+        "humidity": rh if isinstance(rh, float) else None,
+        "wind": ws if isinstance(ws, float) else None,
+        "solarRadiation": rs if isinstance(rs, float) else None,
+        "precipDaily": pr if isinstance(pr, float) else None,
+        "et0": et0 if isinstance(et0, float) else None,
+        "source": "NASA_POWER",
+        "ymd": ymd,
+    }
+
 def get_daily_point(lat: float, lng: float, now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
     """
     Chiama NASA POWER (community=AG) per il giorno 'now' (UTC) e restituisce parametri giornalieri
     + calcola ET0 con Hargreaves quando possibile.
+    Le piante nella stessa cella nativa (NASA_POWER_GRID) condividono la stessa richiesta.
     """
-    try:
-        now = now or datetime.utcnow().replace(tzinfo=timezone.utc)
-        ymd = now.strftime("%Y%m%d")
-        params = ",".join([
-            "T2M", "T2M_MIN", "T2M_MAX",
-            "RH2M", "WS2M",
-            "ALLSKY_SFC_SW_DWN",
-            "PRECTOTCORR"
-        ])
-        url = (
-            f"{NASA_POWER_BASE}/api/temporal/daily/point"
-            f"?parameters={params}&start={ymd}&end={ymd}"
-            f"&latitude={lat}&longitude={lng}&community=AG&format=JSON"
-        )
-
-        with httpx.Client(timeout=NASA_TIMEOUT) as cli:
-            r = cli.get(url)
-            r.raise_for_status()
-            j = r.json()
-
-        data = j.get("properties", {}).get("parameter", {})
-        t_mean = _san(_first_value(data.get("T2M")))
-        t_min  = _san(_first_value(data.get("T2M_MIN")))
-        t_max  = _san(_first_value(data.get("T2M_MAX")))
-        rh     = _san(_first_value(data.get("RH2M")))
-        ws     = _san(_first_value(data.get("WS2M")))
-        rs     = _san(_first_value(data.get("ALLSKY_SFC_SW_DWN")))  # MJ/m2/day
-        pr     = _san(_first_value(data.get("PRECTOTCORR")))        # mm/day
-
-        et0 = None
-        if t_min is not None and t_max is not None and t_mean is not None:
-            et0 = compute_et0_hargreaves(lat, t_min, t_max, t_mean, now=now)
-
-        return {
-            "temp": t_mean if isinstance(t_mean, float) else None,
-            "tempMin": t_min if isinstance(t_min, float) else None,
-            "tempMax": t_max if isinstance(t_max, float) else None,
-            "humidity": rh if isinstance(rh, float) else None,
-            "wind": ws if isinstance(ws, float) else None,
-            "solarRadiation": rs if isinstance(rs, float) else None,
-            "precipDaily": pr if isinstance(pr, float) else None,
-            "et0": et0 if isinstance(et0, float) else None,
-            "source": "NASA_POWER",
-            "ymd": ymd,
-        }
-    except Exception:
-        return None
\ No newline at end of file
+    now = now or datetime.utcnow().replace(tzinfo=timezone.utc)
+    c_lat, c_lng = NASA_POWER_GRID.snap(lat, lng)
+    url, ymd = _daily_point_request(c_lat, c_lng, now)
+
+    def _load():
+        try:
+            with httpx.Client(timeout=NASA_TIMEOUT) as cli:
+                r = cli.get(url)
+                r.raise_for_status()
+                j = r.json()
+            return _parse_daily_point(j, c_lat, now, ymd)
+        except Exception:
+            return None
+
+    return _NASA_CACHE.get_or_load(f"{NASA_POWER_GRID.key(lat, lng)}:{ymd}", _load)
+
+async def get_daily_point_async(lat: float, lng: float, now: Optional[datetime] = None,
+                                client: Optional[httpx.AsyncClient] = None) -> Optional[Dict[str, Any]]:
+    """Come get_daily_point, ma non bloccante (eventualmente su un AsyncClient condiviso)."""
+    now = now or datetime.utcnow().replace(tzinfo=timezone.utc)
+    c_lat, c_lng = NASA_POWER_GRID.snap(lat, lng)
+    url, ymd = _daily_point_request(c_lat, c_lng, now)
+
+    async def _load():
+        try:
+            j = await get_json(url, timeout=NASA_TIMEOUT, client=client)
+            return _parse_daily_point(j, c_lat, now, ymd)
+        except Exception:
+            return None
+
+    return await _NASA_CACHE.get_or_load_async(f"{NASA_POWER_GRID.key(lat, lng)}:{ymd}", _load)
@@ -0,0 +1,85 @@
+"""
+Accesso unificato all'endpoint forecast di Open-Meteo.
+Una sola richiesta per cella nativa (OPEN_METEO_GRID, fatta sul centro cella) con
+tutte le variabili orarie/giornaliere usate da weather_service (meteo) e
+copernicus_soil_service (suolo): i due servizi derivano i propri valori dalla
+stessa risposta in cache.
+"""
+
+import os
+from typing import Optional, Dict, Any
+import httpx
+
+from utils.http_async import get_json
+from utils.ttl_cache import TTLCache
+from utils.spatial_grid import OPEN_METEO_GRID
+
+
+# Config da ENV
+_FORECAST_TTL_SECONDS = int(os.getenv("OPEN_METEO_TTL_SECONDS", "1800"))     # 30 min
+OPEN_METEO_URL = os.getenv("OPEN_METEO_BASE_URL", "https://api.open-meteo.com") + "/v1/forecast"
+OPEN_METEO_TIMEOUT = float(os.getenv("OPEN_METEO_TIMEOUT", "6"))
+
+# Cache della risposta grezza (LRU+TTL, thread-safe, single-flight)
+_FORECAST_CACHE = TTLCache("open_meteo", ttl=_FORECAST_TTL_SECONDS)
+
+HOURLY_VARS = ",".join([
+    # meteo
+    "temperature_2m", "relativehumidity_2m", "precipitation", "windspeed_10m",
+    # suolo (ERA5-Land)
+    "soil_moisture_0_to_7cm", "soil_moisture_7_to_28cm",
+])
+DAILY_VARS = "temperature_2m_min,temperature_2m_max,precipitation_sum"
+
+def _forecast_params(lat: float, lng: float) -> Dict[str, Any]:
+    lat, lng = OPEN_METEO_GRID.snap(lat, lng)
+    return {
+        "latitude": lat,
+        "longitude": lng,
+        "current_weather": "true",
+        "hourly": HOURLY_VARS,
+        "daily": DAILY_VARS,
+        "forecast_days": 2,
+        "timezone": "UTC",
+    }
+
+def get_forecast(lat: float, lng: float) -> Optional[Dict[str, Any]]:
+    """
+    Ritorna il JSON forecast di Open-Meteo per la cella nativa di (lat, lng):
+      - current_weather
+      - hourly: HOURLY_VARS (meteo + suolo)
+      - daily: DAILY_VARS
+    Se errore → None.
+    """
+    if lat is None or lng is None:
+        return None
+
+    def _load():
+        try:
+            with httpx.Client(timeout=OPEN_METEO_TIMEOUT) as cli:
+                r = cli.get(OPEN_METEO_URL, params=_forecast_params(lat, lng))
+                r.raise_for_status()
+                return r.json()
+        except Exception:
+            return None
+
+    return _FORECAST_CACHE.get_or_load(OPEN_METEO_GRID.key(lat, lng), _load)
+
+async def get_forecast_async(lat: float, lng: float,
+                             client: Optional[httpx.AsyncClient] = None) -> Optional[Dict[str, Any]]:
+    """
+    Come get_forecast, ma non bloccante.
+    Meteo e suolo richiesti in parallelo per la stessa cella condividono
+    un'unica richiesta HTTP.
+    """
+    if lat is None or lng is None:
+        return None
+
+    async def _load():
+        try:
+            return await get_json(OPEN_METEO_URL, params=_forecast_params(lat, lng),
+                                  timeout=OPEN_METEO_TIMEOUT, client=client)
+        except Exception:
+            return None
+
+    return await _FORECAST_CACHE.get_or_load_async(OPEN_METEO_GRID.key(lat, lng), _load)
@@ -0,0 +1,251 @@
+"""
+Letture dei sensori in una collezione time-series MongoDB ('sensor_series').
+
+Documento salvato:
+    { timestamp, meta: { sensor_id, sensor_type, location }, value, unit, plant_id }
+
+MongoDB raggruppa in bucket le letture con lo stesso 'meta' e timestamp vicini
+(granularità SENSOR_SERIES_GRANULARITY, default 'minutes': un sensore scrive
+circa una volta al minuto), comprimendo i campi ripetuti. Le API continuano a
+esporre il formato piatto di SensorReading (vedi flatten_reading).
+
+ENV:
+  SENSOR_SERIES_COLLECTION     nome della collezione (default: sensor_series)
+  SENSOR_SERIES_GRANULARITY    seconds | minutes | hours (default: minutes)
+  SENSOR_SERIES_RETENTION_DAYS scadenza automatica delle letture (default: 0 = mai)
+
+Rollup (collezioni '<SENSOR_SERIES>_1m', '_1h', '_1d'): un documento per
+sensore e intervallo con count/sum/min/max/last, aggiornato in modo incrementale
+a ogni scrittura (vedi rollup_ops). Storico e statistiche su finestre lunghe
+leggono i rollup invece delle letture grezze (vedi pick_resolution).
+  SENSOR_ROLLUP_POINTS         punti desiderati per grafico con resolution=auto (default: 300)
+  SENSOR_ROLLUP_1M_RETENTION_DAYS  scadenza dei rollup al minuto (default: 30, 0 = mai)
+"""
+
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, UpdateOne, errors
+
+
+SENSOR_SERIES = os.getenv("SENSOR_SERIES_COLLECTION", "sensor_series")
+SENSOR_SERIES_GRANULARITY = os.getenv("SENSOR_SERIES_GRANULARITY", "minutes")
+SENSOR_SERIES_RETENTION_DAYS = int(os.getenv("SENSOR_SERIES_RETENTION_DAYS", "0"))
+
+META_FIELDS = ("sensor_id", "sensor_type", "location")
+
+# Risoluzioni dei rollup (secondi per intervallo), dalla più fine
+ROLLUPS = {"1m": 60, "1h": 3600, "1d": 86400}
+SENSOR_ROLLUP_POINTS = int(os.getenv("SENSOR_ROLLUP_POINTS", "300"))
+SENSOR_ROLLUP_1M_RETENTION_DAYS = int(os.getenv("SENSOR_ROLLUP_1M_RETENTION_DAYS", "30"))
+
+
+def series_doc(reading: Dict[str, Any]) -> Dict[str, Any]:
+    """Lettura piatta (SensorReading.dict() o documento legacy) -> documento time-series."""
+    doc = {
+        "timestamp": reading["timestamp"],
+        "meta": {k: reading.get(k) for k in META_FIELDS},
+        "value": reading.get("value"),
+        "unit": reading.get("unit"),
+    }
+    if reading.get("plant_id") is not None:
+        doc["plant_id"] = reading["plant_id"]
+    return doc
+
+
+def flatten_reading(doc: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Documento time-series -> formato piatto delle API (con _id stringa)."""
+    if not doc:
+        return doc
+    out = {k: v for k, v in doc.items() if k != "meta"}
+    out.update(doc.get("meta") or {})
+    if "_id" in out:
+        out["_id"] = str(out["_id"])
+    return out
+
+
+def meta_query(sensor_id: Optional[str] = None, sensor_type: Optional[str] = None,
+               location: Optional[str] = None, prefix: str = "meta.") -> Dict[str, Any]:
+    """Filtri sui campi del metaField (meta.<campo>; prefix="" per i rollup)."""
+    values = {"sensor_id": sensor_id, "sensor_type": sensor_type, "location": location}
+    return {f"{prefix}{k}": v for k, v in values.items() if v}
+
+
+def encode_cursor(ts: datetime, _id) -> str:
+    """Chiave di paginazione (timestamp, _id) dell'ultimo elemento restituito."""
+    return f"{ts.isoformat()}_{_id}"
+
+
+def decode_cursor(token: str):
+    """Inverso di encode_cursor; ValueError se il token non è valido."""
+    ts, _, oid = token.rpartition("_")
+    if not ObjectId.is_valid(oid):
+        raise ValueError(f"cursore non valido: {token}")
+    dt = datetime.fromisoformat(ts)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt, ObjectId(oid)
+
+
+def keyset_filter(time_field: str, after, direction: int) -> Dict[str, Any]:
+    """Elementi successivi a 'after' = (timestamp, _id) nell'ordine (time_field, _id) 'direction'."""
+    ts, oid = after
+    op = "$gt" if direction > 0 else "$lt"
+    return {"$or": [{time_field: {op: ts}}, {time_field: ts, "_id": {op: oid}}]}
+
+
+def rollup_collection(resolution: str) -> str:
+    return f"{SENSOR_SERIES}_{resolution}"
+
+
+def bucket_start(ts: datetime, seconds: int) -> datetime:
+    """Inizio dell'intervallo di 'seconds' secondi che contiene ts (UTC naive)."""
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    epoch = int((ts - datetime(1970, 1, 1)).total_seconds())
+    return datetime.utcfromtimestamp(epoch - epoch % seconds)
+
+
+def pick_resolution(hours: int, points: int = SENSOR_ROLLUP_POINTS) -> str:
+    """
+    Rollup più grossolano che dà ancora almeno 'points' punti nella finestra
+    (es. 720 ore, 300 punti -> '1h'); 'raw' se anche il minuto è troppo grossolano.
+    """
+    for resolution, seconds in reversed(ROLLUPS.items()):
+        if hours * 3600 / seconds >= points:
+            return resolution
+    return "raw"
+
+
+def rollup_ops(docs: List[Dict[str, Any]], seconds: int) -> List[UpdateOne]:
+    """
+    Aggiornamenti incrementali di un rollup per documenti time-series appena scritti:
+    le letture dello stesso sensore e intervallo sono accorpate in un solo upsert
+    (update a pipeline: count/sum sommati, min/max, 'last' = valore più recente).
+    """
+    groups: Dict[tuple, Dict[str, Any]] = {}
+    for doc in docs:
+        value = doc.get("value")
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            continue
+        meta = doc.get("meta") or {}
+        ts = bucket_start(doc["timestamp"], 1)
+        key = (meta.get("sensor_id"), meta.get("sensor_type"), meta.get("location"), bucket_start(ts, seconds))
+        g = groups.get(key)
+        if g is None:
+            groups[key] = {"count": 1, "sum": value, "min": value, "max": value, "last": value, "lastAt": ts,
+                           "unit": doc.get("unit")}
+            continue
+        g["count"] += 1
+        g["sum"] += value
+        g["min"] = min(g["min"], value)
+        g["max"] = max(g["max"], value)
+        if ts >= g["lastAt"]:
+            g["last"], g["lastAt"] = value, ts
+
+    ops = []
+    for (sensor_id, sensor_type, location, bucket), g in groups.items():
+        ops.append(UpdateOne(
+            {"sensor_id": sensor_id, "sensor_type": sensor_type, "location": location, "bucket": bucket},
+            [{"$set": {
+                "unit": {"$ifNull": ["$unit", g["unit"]]},
+                "count": {"$add": [{"$ifNull": ["$count", 0]}, g["count"]]},
+                "sum": {"$add": [{"$ifNull": ["$sum", 0]}, g["sum"]]},
+                "min": {"$min": ["$min", g["min"]]},
+                "max": {"$max": ["$max", g["max"]]},
+                "last": {"$cond": [
+                    {"$or": [{"$eq": [{"$ifNull": ["$lastAt", None]}, None]}, {"$lte": ["$lastAt", g["lastAt"]]}]},
+                    g["last"], "$last",
+                ]},
+                "lastAt": {"$max": ["$lastAt", g["lastAt"]]},
+            }}],
+            upsert=True,
+        ))
+    return ops
+
+
+def apply_rollups(database, docs: List[Dict[str, Any]]):
+    """Versione sincrona di update_rollups (simulatore, migrazione). 'database' è un Database pymongo."""
+    for resolution, seconds in ROLLUPS.items():
+        ops = rollup_ops(docs, seconds)
+        if ops:
+            try:
+                database[rollup_collection(resolution)].bulk_write(ops, ordered=False)
+            except errors.PyMongoError as e:
+                print(f"[WARN] {rollup_collection(resolution)}: {e}")
+
+
+def flatten_rollup(doc: Dict[str, Any], resolution: str) -> Dict[str, Any]:
+    """Documento di rollup -> punto dello storico (value = media dell'intervallo)."""
+    count = doc.get("count") or 0
+    return {
+        "_id": str(doc["_id"]),
+        "sensor_id": doc.get("sensor_id"),
+        "sensor_type": doc.get("sensor_type"),
+        "location": doc.get("location"),
+        "unit": doc.get("unit"),
+        "timestamp": doc.get("bucket"),
+        "value": doc.get("sum", 0) / count if count else None,
+        "min": doc.get("min"),
+        "max": doc.get("max"),
+        "last": doc.get("last"),
+        "count": count,
+        "resolution": resolution,
+    }
+
+
+def ensure_sensor_series(database):
+    """
+    Crea la collezione time-series (se manca) e gli indici per i filtri di
+    get_sensor_history: sensore, tipo+posizione, posizione(+tipo), sempre con timestamp.
+    'database' è un Database pymongo sincrono.
+    """
+    try:
+        if SENSOR_SERIES not in database.list_collection_names(filter={"name": SENSOR_SERIES}):
+            options = {}
+            if SENSOR_SERIES_RETENTION_DAYS > 0:
+                options["expireAfterSeconds"] = SENSOR_SERIES_RETENTION_DAYS * 24 * 3600
+            database.create_collection(
+                SENSOR_SERIES,
+                timeseries={"timeField": "timestamp", "metaField": "meta",
+                            "granularity": SENSOR_SERIES_GRANULARITY},
+                **options,
+            )
+    except errors.CollectionInvalid:
+        pass  # creata nel frattempo da un altro processo
+    except errors.PyMongoError as e:
+        print(f"[WARN] {SENSOR_SERIES} collection: {e}")
+        return
+
+    series = database[SENSOR_SERIES]
+    try:
+        series.create_index([("meta.sensor_id", ASCENDING), ("timestamp", DESCENDING)], name="idx_sensor_ts")
+        series.create_index([("meta.sensor_type", ASCENDING), ("meta.location", ASCENDING),
+                             ("timestamp", DESCENDING)], name="idx_type_location_ts")
+        # anche per l'ultima lettura per (posizione, tipo): $sort + $group/$first
+        series.create_index([("meta.location", ASCENDING), ("meta.sensor_type", ASCENDING),
+                             ("timestamp", DESCENDING)], name="idx_location_type_ts")
+    except errors.PyMongoError as e:
+        print(f"[WARN] {SENSOR_SERIES} indexes: {e}")
+
+    ensure_sensor_rollups(database)
+
+
+def ensure_sensor_rollups(database):
+    """Indici dei rollup: unicità per (sensore, intervallo) e filtri dello storico."""
+    for resolution in ROLLUPS:
+        rollup = database[rollup_collection(resolution)]
+        try:
+            rollup.create_index([("sensor_id", ASCENDING), ("sensor_type", ASCENDING), ("location", ASCENDING),
+                                 ("bucket", DESCENDING)], unique=True, name="uniq_sensor_bucket")
+            rollup.create_index([("sensor_id", ASCENDING), ("bucket", DESCENDING)], name="idx_sensor_bucket")
+            rollup.create_index([("sensor_type", ASCENDING), ("location", ASCENDING), ("bucket", DESCENDING)],
+                                name="idx_type_location_bucket")
+            rollup.create_index([("location", ASCENDING), ("bucket", DESCENDING)], name="idx_location_bucket")
+            if resolution == "1m" and SENSOR_ROLLUP_1M_RETENTION_DAYS > 0:
+                rollup.create_index("bucket", expireAfterSeconds=SENSOR_ROLLUP_1M_RETENTION_DAYS * 24 * 3600,
+                                    name="ttl_bucket")
+        except errors.PyMongoError as e:
+            print(f"[WARN] {rollup_collection(resolution)} indexes: {e}")
@@ -4,10 +4,17 @@ import time
 import os
 from datetime import datetime
 import math
+import sys
+from pathlib import Path
 from typing import Optional
 from pymongo import MongoClient
 from dotenv import load_dotenv
 
+# Aggiungi la root del backend al path per importare i moduli
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.sensor_series import SENSOR_SERIES, series_doc, ensure_sensor_series, apply_rollups
+
 # Carica variabili da .env
 load_dotenv()
 
@@ -18,7 +25,7 @@ class SensorSimulator:
     def __init__(self, mongo_uri=None, db_name=None):
         self.mongo_uri = mongo_uri or os.getenv("MONGO_URI", "mongodb://localhost:27017/")
         self.db_name = db_name or os.getenv("MONGO_DB", "homegardening")
-        self.collection_name = "sensor_data"
+        self.collection_name = SENSOR_SERIES  # time-series condivisa con /api/sensors
 
         # Connessione MongoDB
         try:
@@ -27,6 +34,7 @@ class SensorSimulator:
             self.collection = self.db[self.collection_name]
             # Test connessione
             self.client.server_info()
+            ensure_sensor_series(self.db)
             print(f"Connesso a MongoDB: {self.db_name}")
         except Exception as e:
             print(f"Errore connessione MongoDB: {e}")
@@ -118,7 +126,9 @@ class SensorSimulator:
         }
 
         try:
-            result = self.collection.insert_one(data)
+            doc = series_doc(data)
+            result = self.collection.insert_one(doc)
+            apply_rollups(self.db, [doc])
             print(f" {sensor_id} ({config['type']}): {value} {config['unit']} - ID: {result.inserted_id}")
             return True
 
@@ -0,0 +1,84 @@
+"""
+Griglie native dei provider meteo.
+Ogni coppia (lat, lng) viene ricondotta alla cella del provider (indice intero
+di riga/colonna su una griglia regolare, come un geohash a precisione fissa):
+tutte le piante nella stessa cella condividono chiave di cache e richiesta
+upstream, fatta sul centro cella.
+
+Dimensioni cella (gradi lat,lng) configurabili via ENV:
+  NASA_POWER_CELL_DEG   default 0.5,0.625  (griglia MERRA-2 di NASA POWER)
+  OPEN_METEO_CELL_DEG   default 0.1,0.1    (ERA5-Land / modelli forecast ~10 km)
+"""
+
+import os
+import math
+from typing import Dict, Any, Iterable, Tuple
+
+
+def _cell_deg(env: str, default: str) -> Tuple[float, float]:
+    dlat, dlng = (float(x) for x in os.getenv(env, default).split(","))
+    return dlat, dlng
+
+
+class ProviderGrid:
+    """Griglia regolare lat/lng con origine in (-90, -180)."""
+
+    def __init__(self, name: str, dlat: float, dlng: float):
+        self.name = name
+        self.dlat = dlat
+        self.dlng = dlng
+
+    def cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        """Indici (riga, colonna) della cella che contiene il punto."""
+        lat = min(max(lat, -90.0), 90.0)
+        lng = ((lng + 180.0) % 360.0) - 180.0
+        i = min(int(math.floor((lat + 90.0) / self.dlat)), int(math.ceil(180.0 / self.dlat)) - 1)
+        j = int(math.floor((lng + 180.0) / self.dlng))
+        return i, j
+
+    def center(self, i: int, j: int) -> Tuple[float, float]:
+        """Centro della cella (i, j), arrotondato per ottenere URL stabili."""
+        lat = -90.0 + (i + 0.5) * self.dlat
+        lng = -180.0 + (j + 0.5) * self.dlng
+        return round(min(lat, 90.0), 4), round(lng, 4)
+
+    def key(self, lat: float, lng: float) -> str:
+        i, j = self.cell(lat, lng)
+        return f"{self.name}:{i}:{j}"
+
+    def snap(self, lat: float, lng: float) -> Tuple[float, float]:
+        """Coordinate del centro della cella che contiene il punto."""
+        return self.center(*self.cell(lat, lng))
+
+    def center_of_key(self, key: str) -> Tuple[float, float]:
+        _, i, j = key.split(":")
+        return self.center(int(i), int(j))
+
+
+NASA_POWER_GRID = ProviderGrid("nasa", *_cell_deg("NASA_POWER_CELL_DEG", "0.5,0.625"))
+OPEN_METEO_GRID = ProviderGrid("om", *_cell_deg("OPEN_METEO_CELL_DEG", "0.1,0.1"))
+
+
+def dedup_report(points: Iterable[Tuple[float, float]], legacy_precision: int = 2) -> Dict[str, Any]:
+    """
+    Quante richieste upstream servono per un insieme di coordinate:
+      - legacy: arrotondamento a 'legacy_precision' decimali (vecchia chiave)
+      - per provider: celle native distinte
+    dedupRatio = punti / chiavi distinte (quante piante condividono una fetch).
+    """
+    pts = [(float(lat), float(lng)) for lat, lng in points]
+    n = len(pts)
+
+    def _summary(keys) -> Dict[str, Any]:
+        distinct = len(set(keys))
+        return {"distinctKeys": distinct, "dedupRatio": round(n / distinct, 2) if distinct else None}
+
+    return {
+        "points": n,
+        "legacy": {"precision": legacy_precision,
+                   **_summary(f"{round(a, legacy_precision)}:{round(b, legacy_precision)}" for a, b in pts)},
+        "nasaPower": {"cellDeg": [NASA_POWER_GRID.dlat, NASA_POWER_GRID.dlng],
+                      **_summary(NASA_POWER_GRID.key(a, b) for a, b in pts)},
+        "openMeteo": {"cellDeg": [OPEN_METEO_GRID.dlat, OPEN_METEO_GRID.dlng],
+                      **_summary(OPEN_METEO_GRID.key(a, b) for a, b in pts)},
+    }
@@ -0,0 +1,379 @@
+"""
+Cache condivisa dai servizi esterni (aggregatore AI, meteo, suolo).
+- LRU + TTL: le voci scadute vengono rimosse alla lettura, quelle meno usate
+  quando si supera il budget (numero di voci e/o byte stimati)
+- single-flight: più richieste concorrenti per la stessa chiave mancante
+  eseguono il loader una sola volta (thread e coroutine)
+- stale-while-revalidate: per 'stale_ttl' secondi dopo la scadenza il valore
+  viene ancora servito e ricaricato in background
+- pre-warm: le chiavi più richieste (conteggio accessi per chiave) vengono
+  rinfrescate prima della scadenza da un thread periodico
+- contatori hit/miss/stale/eviction/expiration per cache
+- memorizzazione delegata a un backend (in processo o di rete, vedi cache_backends)
+Thread-safe: usata sia dagli endpoint sync (threadpool FastAPI) sia da quelli async.
+"""
+
+import os
+import time
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable, Awaitable, Hashable, List, Tuple
+
+from utils.cache_backends import CacheBackend, make_backend
+
+
+# Budget di default (per singola cache, backend in memoria), configurabili via ENV
+_DEFAULT_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "4096"))
+_DEFAULT_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", "0"))  # 0 = nessun limite in byte
+
+# Refresh in background e pre-warm
+_REFRESH_WORKERS = int(os.getenv("CACHE_REFRESH_WORKERS", "4"))
+_PREWARM_INTERVAL = float(os.getenv("CACHE_PREWARM_INTERVAL_SECONDS", "60"))
+_PREWARM_TOP = int(os.getenv("CACHE_PREWARM_TOP", "50"))               # chiavi più richieste da tenere calde
+_PREWARM_LEAD = float(os.getenv("CACHE_PREWARM_LEAD_SECONDS", "120"))  # anticipo sulla scadenza
+_MAX_TRACKED_KEYS = int(os.getenv("CACHE_MAX_TRACKED_KEYS", "10000"))
+
+# Tutte le cache create, per le statistiche
+_CACHES: Dict[str, "TTLCache"] = {}
+
+# Pool condiviso per i ricaricamenti in background (creato al primo uso)
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=_REFRESH_WORKERS, thread_name_prefix="cache-refresh")
+        return _EXECUTOR
+
+
+class _Call:
+    """Caricamento in corso per una chiave (single-flight sync)."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class TTLCache:
+    """
+    Cache LRU con scadenza per voce.
+    I valori None non vengono mai memorizzati (i servizi li usano per "errore").
+    Nel backend ogni voce è [fresh_until, valore] e vive ttl + stale_ttl secondi.
+    'refresher(key, old_value)' (opzionale) ricostruisce un valore dalla sola chiave:
+    serve al pre-warm, che non ha a disposizione il loader di una richiesta.
+    """
+
+    def __init__(self, name: str, ttl: float, max_entries: Optional[int] = None,
+                 max_bytes: Optional[int] = None, backend: Optional[CacheBackend] = None,
+                 backend_kind: Optional[str] = None, backend_url: Optional[str] = None,
+                 stale_ttl: float = 0,
+                 refresher: Optional[Callable[[Hashable, Any], Any]] = None):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.refresher = refresher
+        self.backend = backend or make_backend(
+            name, kind=backend_kind, url=backend_url,
+            max_entries=_DEFAULT_MAX_ENTRIES if max_entries is None else max_entries,
+            max_bytes=_DEFAULT_MAX_BYTES if max_bytes is None else max_bytes,
+        )
+
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Hashable, asyncio.Future] = {}
+        self._access: Counter = Counter()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.coalesced = 0  # miss serviti da un caricamento già in corso
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.prewarmed = 0
+
+        _CACHES[name] = self
+
+    # accesso diretto
+
+    def _read(self, key: Hashable) -> Tuple[str, Any]:
+        """Ritorna ("fresh"|"stale"|"miss", valore) aggiornando contatori e accessi."""
+        found, entry = self.backend.get(key)
+        state, value = "miss", None
+        if found:
+            fresh_until, value = entry
+            state = "fresh" if time.time() <= fresh_until else "stale"
+        with self._lock:
+            if state == "fresh":
+                self.hits += 1
+            elif state == "stale":
+                self.stale_hits += 1
+            else:
+                self.misses += 1
+            self._access[key] += 1
+            if len(self._access) > _MAX_TRACKED_KEYS:
+                # tieni solo la metà più richiesta
+                self._access = Counter(dict(self._access.most_common(_MAX_TRACKED_KEYS // 2)))
+        return state, value
+
+    def get(self, key: Hashable, loader: Optional[Callable[[], Any]] = None) -> Any:
+        """
+        Valore fresco o, entro stale_ttl, scaduto; None se assente.
+        Su un valore scaduto avvia il ricaricamento in background con 'loader'
+        (o con il refresher della cache, se definito).
+        """
+        state, value = self._read(key)
+        if state == "stale":
+            self.refresh_in_background(key, loader, value)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if value is None:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        self.backend.set(key, [time.time() + ttl, value], ttl + self.stale_ttl)
+
+    def delete(self, key: Hashable):
+        self.backend.delete(key)
+
+    def clear(self):
+        self.backend.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.backend.contains(key)
+
+    def freshness(self, key: Hashable) -> Optional[float]:
+        """Secondi di validità residua (negativi se scaduta ma servibile), None se assente."""
+        found, entry = self.backend.get(key)
+        return round(entry[0] - time.time(), 1) if found else None
+
+    # single-flight
+
+    def _claim(self, key: Hashable) -> Tuple[bool, _Call]:
+        """Registra (o ritrova) il caricamento in corso per key: (leader, call)."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                return False, call
+            call = self._calls[key] = _Call()
+            return True, call
+
+    def _lead(self, key: Hashable, call: _Call, loader: Callable[[], Any], recheck: bool = True):
+        try:
+            found, entry = self.backend.get(key) if recheck else (False, None)
+            if found and time.time() <= entry[0]:
+                # un altro leader ha completato tra il miss e questo punto
+                call.value = entry[1]
+            else:
+                call.value = loader()
+                self.set(key, call.value)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.value
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Ritorna il valore in cache o lo calcola con loader().
+        Thread concorrenti sulla stessa chiave attendono il primo caricamento;
+        un valore scaduto (entro stale_ttl) è servito subito e ricaricato in background.
+        """
+        state, value = self._read(key)
+        if state == "fresh":
+            return value
+        if state == "stale":
+            self.refresh_in_background(key, loader, value)
+            return value
+
+        leader, call = self._claim(key)
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+        return self._lead(key, call, loader)
+
+    async def get_or_load_async(self, key: Hashable, loader: Callable[[], Awaitable[Any]],
+                                cacheable: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Come get_or_load per coroutine: le richieste concorrenti (stesso event loop)
+        condividono un unico task. L'annullamento di un chiamante non interrompe
+        il caricamento per gli altri. Un valore scaduto è servito subito e il task
+        prosegue in background.
+        'cacheable(valore)' (opzionale) decide se il valore caricato va memorizzato:
+        quelli scartati (es. parziali) sono restituiti solo ai chiamanti in attesa.
+        """
+        state, value = await self._offload(self._read, key)
+        if state == "fresh":
+            return value
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            task = self._tasks.get(key)
+            if task is None or task.get_loop() is not loop:
+                task = self._tasks[key] = loop.create_task(self._load_async(key, loader, cacheable))
+                task.add_done_callback(lambda t: self._task_done(key, t, background=(state == "stale")))
+                if state == "stale":
+                    self.refreshes += 1
+            else:
+                self.coalesced += 1
+        if state == "stale":
+            return value
+        return await asyncio.shield(task)
+
+    async def _offload(self, fn: Callable[..., Any], *args) -> Any:
+        """Esegue fn in un thread se il backend fa I/O bloccante (es. Redis), altrimenti subito."""
+        if self.backend.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def _load_async(self, key: Hashable, loader: Callable[[], Awaitable[Any]],
+                          cacheable: Optional[Callable[[Any], bool]] = None) -> Any:
+        try:
+            value = await loader()
+            if value is not None and (cacheable is None or cacheable(value)):
+                await self._offload(self.set, key, value)
+            return value
+        finally:
+            with self._lock:
+                if self._tasks.get(key) is asyncio.current_task():
+                    del self._tasks[key]
+
+    def _task_done(self, key: Hashable, task: asyncio.Future, background: bool):
+        """Recupera sempre l'eccezione del task: un refresh in background non ha nessuno che lo attenda."""
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is None:
+            return
+        if background:
+            with self._lock:
+                self.refresh_errors += 1
+        print(f"[WARN] cache {self.name} {key}: {error!r}")
+
+    # refresh in background / pre-warm
+
+    def refresh_in_background(self, key: Hashable, loader: Optional[Callable[[], Any]] = None,
+                              old_value: Any = None) -> bool:
+        """
+        Ricarica key su un thread del pool (una sola volta per chiave).
+        Ritorna False se c'è già un caricamento in corso o nessun loader disponibile.
+        """
+        if loader is None:
+            if self.refresher is None:
+                return False
+            loader = lambda: self.refresher(key, old_value)
+        with self._lock:
+            if key in self._calls:
+                return False
+            call = self._calls[key] = _Call()
+            self.refreshes += 1
+
+        def _job():
+            try:
+                self._lead(key, call, loader, recheck=False)
+            except Exception:
+                with self._lock:
+                    self.refresh_errors += 1
+
+        _executor().submit(_job)
+        return True
+
+    def hot_keys(self, n: int = 10) -> List[Tuple[Hashable, int]]:
+        """Le n chiavi più richieste con il numero di accessi."""
+        with self._lock:
+            return self._access.most_common(n)
+
+    def prewarm(self, top: int = _PREWARM_TOP, lead: float = _PREWARM_LEAD) -> int:
+        """
+        Rinfresca in background le 'top' chiavi più richieste che scadono entro
+        'lead' secondi (o già scadute). Poi dimezza i conteggi, così il set caldo
+        segue la domanda recente. Ritorna quante chiavi sono state messe in refresh.
+        """
+        if self.refresher is None:
+            return 0
+        started = 0
+        for key, _ in self.hot_keys(top):
+            found, entry = self.backend.get(key)
+            if not found or entry[0] - time.time() > lead:
+                continue
+            if self.refresh_in_background(key, old_value=entry[1]):
+                started += 1
+        with self._lock:
+            self.prewarmed += started
+            self._access = Counter({k: c // 2 for k, c in self._access.items() if c // 2})
+        return started
+
+    # statistiche
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            counters = {
+                "ttlSeconds": self.ttl,
+                "staleTtlSeconds": self.stale_ttl,
+                "hits": self.hits,
+                "staleHits": self.stale_hits,
+                "misses": self.misses,
+                "hitRatio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else None,
+                "coalesced": self.coalesced,
+                "refreshes": self.refreshes,
+                "refreshErrors": self.refresh_errors,
+                "prewarmed": self.prewarmed,
+                "trackedKeys": len(self._access),
+            }
+        return {**self.backend.stats(), **counters}
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Statistiche di tutte le cache registrate."""
+    return {name: c.stats() for name, c in _CACHES.items()}
+
+
+def cache_hot_keys(name: str, n: int = 20) -> Optional[List[Dict[str, Any]]]:
+    """Conteggio accessi per chiave della cache 'name' (None se non esiste)."""
+    cache = _CACHES.get(name)
+    if cache is None:
+        return None
+    return [{"key": str(k), "accesses": c, "freshnessSeconds": cache.freshness(k)}
+            for k, c in cache.hot_keys(n)]
+
+
+# Thread periodico di pre-warm
+
+_PREWARM_STOP = threading.Event()
+_PREWARM_THREAD: Optional[threading.Thread] = None
+
+
+def _prewarm_loop(interval: float):
+    while not _PREWARM_STOP.wait(interval):
+        for cache in list(_CACHES.values()):
+            try:
+                cache.prewarm()
+            except Exception as e:
+                print(f"[WARN] cache prewarm {cache.name}: {e}")
+
+
+def start_prewarm(interval: float = _PREWARM_INTERVAL):
+    """Avvia (una sola volta) il thread di pre-warm; interval <= 0 lo disabilita."""
+    global _PREWARM_THREAD
+    if interval <= 0 or (_PREWARM_THREAD is not None and _PREWARM_THREAD.is_alive()):
+        return
+    _PREWARM_STOP.clear()
+    _PREWARM_THREAD = threading.Thread(target=_prewarm_loop, args=(interval,),
+                                       name="cache-prewarm", daemon=True)
+    _PREWARM_THREAD.start()
+
+
+def stop_prewarm():
+    _PREWARM_STOP.set()
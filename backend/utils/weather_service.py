@@ -1,21 +1,17 @@
 import os
-import time
 from typing import Optional, Dict, Any, List
 import httpx
 from datetime import datetime
 
-_WEATHER_CACHE: Dict[str, Dict[str, Any]] = {}
+from utils.open_meteo_service import get_forecast, get_forecast_async
+from utils.ttl_cache import TTLCache
+from utils.spatial_grid import OPEN_METEO_GRID
 
 # Config da ENV
 _WEATHER_TTL_SECONDS = int(os.getenv("WEATHER_TTL_SECONDS", "1800"))
-_WEATHER_GRID_PRECISION = int(os.getenv("WEATHER_GRID_PRECISION", "2"))
 
-def _grid_key(lat: float, lng: float, precision: int = None) -> str:
-    p = _WEATHER_GRID_PRECISION if precision is None else precision
-    return f"{round(lat, p)}:{round(lng, p)}"
-
-def _expired(entry: Dict[str, Any]) -> bool:
-    return time.time() > entry.get("expires_at", 0)
+# Cache per cella nativa Open-Meteo (LRU+TTL, thread-safe)
+_WEATHER_CACHE = TTLCache("weather", ttl=_WEATHER_TTL_SECONDS)
 
 def _parse_om_time(t: str) -> Optional[datetime]:
     """Gestisce eventuale suffisso 'Z' (ISO UTC)."""
@@ -50,45 +46,7 @@ def _avg(arr: List[float]) -> Optional[float]:
         return None
     return sum(arr) / len(arr)
 
-def get_weather(lat: float, lng: float) -> Optional[Dict[str, Any]]:
-    """
-    Usa Open-Meteo:
-      - current_weather: temperatura
-      - hourly: precipitation, relativehumidity_2m, temperature_2m, windspeed_10m
-      - daily: temperature_2m_min, temperature_2m_max, precipitation_sum
-    Ritorna:
-      {
-        temp, humidity, rainNext24h, windMean,
-        dailyTempMin, dailyTempMax, precipDaily
-      }
-    """
-    #Verifica: lat/lng non validi
-    if lat is None or lng is None:
-        return None
-
-    key = _grid_key(lat, lng)
-    if key in _WEATHER_CACHE and not _expired(_WEATHER_CACHE[key]):
-        return _WEATHER_CACHE[key]["value"]
-
-    url = "https://api.open-meteo.com/v1/forecast"
-    params = {
-        "latitude": lat,
-        "longitude": lng,
-        "current_weather": "true",
-        "hourly": "temperature_2m,relativehumidity_2m,precipitation,windspeed_10m",
-        "daily": "temperature_2m_min,temperature_2m_max,precipitation_sum",
-        "forecast_days": 2,
-        "timezone": "UTC",
-    }
-
-    try:
-        with httpx.Client(timeout=6.0) as cli:
-            r = cli.get(url, params=params)
-            r.raise_for_status()
-            j = r.json()
-    except Exception:
-        return None
-
+def _parse_weather(j: Dict[str, Any]) -> Dict[str, Any]:
     #current
     temp = j.get("current_weather", {}).get("temperature")
 
@@ -128,7 +86,7 @@ def get_weather(lat: float, lng: float) -> Optional[Dict[str, Any]]:
     daily_tmax = _first(daily.get("temperature_2m_max"))
     daily_prcp = _first(daily.get("precipitation_sum"))
 
-    value = {
+    return {
         "temp": float(temp) if isinstance(temp, (int, float)) else None,
         "humidity": round(humidity, 1) if isinstance(humidity, (int, float)) else None,
         "rainNext24h": round(rainNext24h, 1),
@@ -138,8 +96,36 @@ def get_weather(lat: float, lng: float) -> Optional[Dict[str, Any]]:
         "precipDaily": float(daily_prcp) if isinstance(daily_prcp, (int, float)) else None,
     }
 
-    _WEATHER_CACHE[key] = {
-        "value": value,
-        "expires_at": time.time() + _WEATHER_TTL_SECONDS,
-    }
-    return value
\ No newline at end of file
+def get_weather(lat: float, lng: float) -> Optional[Dict[str, Any]]:
+    """
+    Usa Open-Meteo (richiesta condivisa con il suolo, vedi open_meteo_service):
+      - current_weather: temperatura
+      - hourly: precipitation, relativehumidity_2m, temperature_2m, windspeed_10m
+      - daily: temperature_2m_min, temperature_2m_max, precipitation_sum
+    Ritorna:
+      {
+        temp, humidity, rainNext24h, windMean,
+        dailyTempMin, dailyTempMax, precipDaily
+      }
+    """
+    #Verifica: lat/lng non validi
+    if lat is None or lng is None:
+        return None
+
+    def _load():
+        j = get_forecast(lat, lng)
+        return _parse_weather(j) if j is not None else None
+
+    return _WEATHER_CACHE.get_or_load(OPEN_METEO_GRID.key(lat, lng), _load)
+
+async def get_weather_async(lat: float, lng: float,
+                            client: Optional[httpx.AsyncClient] = None) -> Optional[Dict[str, Any]]:
+    """Come get_weather, ma non bloccante (eventualmente su un AsyncClient condiviso)."""
+    if lat is None or lng is None:
+        return None
+
+    async def _load():
+        j = await get_forecast_async(lat, lng, client=client)
+        return _parse_weather(j) if j is not None else None
+
+    return await _WEATHER_CACHE.get_or_load_async(OPEN_METEO_GRID.key(lat, lng), _load)